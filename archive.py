@@ -0,0 +1,146 @@
+import asyncio
+import discord
+import gzip
+import json
+import os
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+from campaign_registry import ResolvedCampaign, registry
+from event_log import log_event
+from scheduler import scheduler
+
+ARCHIVE_DIRECTORY = os.getenv("RPG_ARCHIVE_DIR", "archives")
+ARCHIVE_CONCURRENCY = 3
+# Messages are compressed and written in batches of this size, so at most one batch per channel is in memory.
+ARCHIVE_BATCH = 500
+
+
+class ChannelArchive(NamedTuple):
+    channel_name: str
+    messages: int
+    resumed: bool
+
+
+class ArchiveResult(NamedTuple):
+    directory: str
+    channels: List[ChannelArchive]
+    size: int
+    seconds: float
+
+    @property
+    def messages(self) -> int:
+        return sum(channel.messages for channel in self.channels)
+
+
+def campaign_archive_directory(campaign: ResolvedCampaign) -> str:
+    return os.path.join(ARCHIVE_DIRECTORY, str(campaign.record.guild_id), str(campaign.record.category_id))
+
+
+def message_record(message: discord.Message) -> Dict[str, Any]:
+    """One JSONL line. Attachments are kept as references (their CDN URLs), not downloaded."""
+    return {"id": message.id,
+            "author_id": message.author.id,
+            "author": message.author.name,
+            "created_at": message.created_at.isoformat(),
+            "edited_at": message.edited_at.isoformat() if message.edited_at else None,
+            "content": message.content,
+            "attachments": [{"id": attachment.id, "filename": attachment.filename, "url": attachment.url,
+                             "size": attachment.size} for attachment in message.attachments],
+            "embeds": [embed.to_dict() for embed in message.embeds],
+            "reply_to": message.reference.message_id if message.reference else None}
+
+
+class ChannelExport:
+    """The archive of one channel: <channel id>.jsonl.gz and the checkpoint <channel id>.json beside it.
+    Every batch is appended as a complete gzip member (a sequence of them is still one valid .gz file),
+    and the checkpoint records the last exported message and the file size after it. A resumed export
+    first cuts off anything written after the last checkpoint, then continues after that message."""
+
+    def __init__(self, directory: str, channel: discord.TextChannel) -> None:
+        self.channel = channel
+        self.path = os.path.join(directory, f"{channel.id}.jsonl.gz")
+        self.checkpoint_path = os.path.join(directory, f"{channel.id}.json")
+        self.last_message_id: Optional[int] = None
+        self.size = 0
+        self.messages = 0
+
+    def load_checkpoint(self) -> bool:
+        try:
+            with open(self.checkpoint_path) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except FileNotFoundError:
+            return False
+        self.last_message_id = checkpoint["last_message_id"]
+        self.size = checkpoint["size"]
+        self.messages = checkpoint["messages"]
+        return True
+
+    def write_batch(self, lines: List[str], last_message_id: int) -> None:
+        with open(self.path, "ab") as archive_file:
+            archive_file.truncate(self.size)
+            archive_file.write(gzip.compress("".join(lines).encode()))
+            archive_file.flush()
+            os.fsync(archive_file.fileno())
+            self.size = archive_file.tell()
+        self.last_message_id = last_message_id
+        self.messages += len(lines)
+        checkpoint = {"channel": self.channel.name, "last_message_id": last_message_id, "size": self.size,
+                      "messages": self.messages}
+        with open(self.checkpoint_path + ".tmp", "w") as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+        os.replace(self.checkpoint_path + ".tmp", self.checkpoint_path)
+
+    async def run(self) -> ChannelArchive:
+        resumed = await asyncio.to_thread(self.load_checkpoint)
+        after = discord.Object(self.last_message_id) if self.last_message_id else None
+        exported_before = self.messages
+        lines: List[str] = []
+        async for message in self.channel.history(limit=None, after=after, oldest_first=True):
+            lines.append(json.dumps(message_record(message), ensure_ascii=False) + "\n")
+            if len(lines) == ARCHIVE_BATCH:
+                await asyncio.to_thread(self.write_batch, lines, message.id)
+                lines = []
+        if lines:
+            await asyncio.to_thread(self.write_batch, lines, message.id)
+        return ChannelArchive(self.channel.name, self.messages - exported_before, resumed)
+
+
+def archived_channels(server: discord.Guild, campaign: ResolvedCampaign) -> List[discord.TextChannel]:
+    """The campaign's text channels, plus any registered player log channel that was moved out of the category."""
+    channels = {channel.id: channel for channel in campaign.category.text_channels}
+    for channel_id in registry.player_channels.get(campaign.record.category_id, {}).values():
+        channel = server.get_channel(channel_id)
+        if isinstance(channel, discord.TextChannel):
+            channels.setdefault(channel.id, channel)
+    return list(channels.values())
+
+
+async def archive_campaign(server: discord.Guild, campaign: ResolvedCampaign) -> ArchiveResult:
+    """Exports the history of every campaign text channel to a gzipped JSONL file per channel, at most
+    ARCHIVE_CONCURRENCY channels at a time. Running it again only exports the messages sent since."""
+    directory = campaign_archive_directory(campaign)
+    os.makedirs(directory, exist_ok=True)
+    semaphore = scheduler.request_limit(server, ARCHIVE_CONCURRENCY)
+    start = time.perf_counter()
+
+    async def export(channel: discord.TextChannel) -> ChannelArchive:
+        async with semaphore:
+            return await ChannelExport(directory, channel).run()
+
+    exports = await asyncio.gather(*(export(channel) for channel in archived_channels(server, campaign)))
+    size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)
+               if name.endswith(".jsonl.gz"))
+    result = ArchiveResult(directory, list(exports), size, time.perf_counter() - start)
+    log_event("campaign_archived", guild_id=server.id, campaign=campaign.category.name,
+              category_id=campaign.category.id, directory=directory, messages=result.messages,
+              channels=len(result.channels), size=size, seconds=round(result.seconds, 3))
+    return result
+
+
+def describe_archive(campaign_name: str, result: ArchiveResult) -> str:
+    resumed = sum(channel.resumed for channel in result.channels)
+    summary = (f"Archived {result.messages} messages from {len(result.channels)} channels of {campaign_name} "
+               f"to {result.directory} ({result.size / 1024:.1f} KiB) in {result.seconds:.1f}s.")
+    if resumed:
+        summary += f" {resumed} channels continued from their previous export."
+    return summary
@@ -0,0 +1,95 @@
+import discord
+from typing import Dict, FrozenSet, Optional, Set, Tuple
+from campaign_registry import CampaignRecord, registry, resolve_campaign
+from member_index import LOW_MEMORY_MODE
+
+
+class AuthCache:
+    """Caches what the command checks need, so that each check is a set lookup on role IDs:
+    the role IDs of every (guild, member), the IDs of roles looked up by name, and the case-folded
+    category names of every guild. All entries are invalidated incrementally by the events in main.py.
+    Without a member cache (low-memory mode) discord sends no member events, so member roles are then read
+    from the member every time instead of being cached."""
+
+    def __init__(self, cache_members: bool = not LOW_MEMORY_MODE) -> None:
+        self.cache_members = cache_members
+        self.member_roles: Dict[Tuple[int, int], FrozenSet[int]] = {}
+        self.named_roles: Dict[Tuple[int, str], FrozenSet[int]] = {}
+        self.category_names: Dict[int, Dict[str, Set[int]]] = {}
+
+    def role_ids(self, member: discord.Member) -> FrozenSet[int]:
+        key = (member.guild.id, member.id)
+        role_ids = self.member_roles.get(key)
+        if role_ids is None:
+            role_ids = frozenset(role.id for role in member.roles)
+            if self.cache_members:
+                self.member_roles[key] = role_ids
+        return role_ids
+
+    def roles_named(self, server: discord.Guild, role_name: str) -> FrozenSet[int]:
+        key = (server.id, role_name)
+        role_ids = self.named_roles.get(key)
+        if role_ids is None:
+            role_ids = frozenset(role.id for role in server.roles if role.name == role_name)
+            self.named_roles[key] = role_ids
+        return role_ids
+
+    def has_role(self, member: discord.Member, role_name: str) -> bool:
+        if not self.role_ids(member).isdisjoint(self.roles_named(member.guild, role_name)):
+            return True
+        # Denials are rechecked against the live member, in case its role event has not arrived yet.
+        self.member_changed(member)
+        self.named_roles.pop((member.guild.id, role_name), None)
+        return not self.role_ids(member).isdisjoint(self.roles_named(member.guild, role_name))
+
+    def is_campaign_dm(self, member: discord.Member, campaign_name: str) -> bool:
+        record: Optional[CampaignRecord] = registry.get(member.guild.id, campaign_name)
+        if record is None:
+            campaign = resolve_campaign(member.guild, campaign_name)
+            if campaign is None:
+                return False
+            record = campaign.record
+        # The campaign's own DM role is all that matters, so no other campaign of the guild is looked at.
+        if record.dm_role_id in self.role_ids(member):
+            return True
+        self.member_changed(member)
+        return record.dm_role_id in self.role_ids(member)
+
+    def category_exists(self, server: discord.Guild, name: str) -> bool:
+        names = self.category_names.get(server.id)
+        if names is None:
+            names = {}
+            for category in server.categories:
+                names.setdefault(category.name.casefold(), set()).add(category.id)
+            self.category_names[server.id] = names
+        return name.casefold() in names
+
+    def member_changed(self, member: discord.Member) -> None:
+        self.member_roles.pop((member.guild.id, member.id), None)
+
+    def roles_changed(self, server: discord.Guild) -> None:
+        for key in [key for key in self.named_roles if key[0] == server.id]:
+            del self.named_roles[key]
+
+    # The category updates are keyed by ID and therefore idempotent: the commands apply their own changes right
+    # away, and the gateway events that follow for the same changes are no-ops.
+    def category_added(self, server: discord.Guild, category_id: int, name: str) -> None:
+        names = self.category_names.get(server.id)
+        if names is not None:
+            names.setdefault(name.casefold(), set()).add(category_id)
+
+    def category_removed(self, server: discord.Guild, category_id: int, name: str) -> None:
+        names = self.category_names.get(server.id)
+        if names is not None and name.casefold() in names:
+            names[name.casefold()].discard(category_id)
+            if not names[name.casefold()]:
+                del names[name.casefold()]
+
+    def forget_guild(self, server: discord.Guild) -> None:
+        self.category_names.pop(server.id, None)
+        self.roles_changed(server)
+        for key in [key for key in self.member_roles if key[0] == server.id]:
+            del self.member_roles[key]
+
+
+auth_cache = AuthCache()
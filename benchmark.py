@@ -0,0 +1,207 @@
+"""Runs every bot command against fake guilds of different sizes and records the number of REST calls,
+the wall-clock time and the peak memory of each run.
+
+    python benchmark.py [--output benchmark_results.json] [--latency 0.05] [--rate-limit 50] [--low-memory]
+
+It also records what discord.py's member and message caches cost at startup for STARTUP_MEMBERS members,
+with the default settings and in low-memory mode (RPG_LOW_MEMORY), by parsing synthetic gateway payloads.
+
+The results are written as sorted, indented JSON so that regressions show up in a plain diff.
+Memory is traced during every run, which slows down the CPU-heavy parts; compare timings between runs
+of this script rather than against production."""
+import argparse
+import asyncio
+import json
+import os
+import time
+import tracemalloc
+from typing import Any, Awaitable, Callable, Dict, List
+
+os.environ.setdefault("RPG_REGISTRY_PATH", ":memory:")
+
+import discord
+from discord.state import ConnectionState
+
+import main
+from campaign_management import build_channel_overwrites, hidden_overwrites
+from auth_cache import auth_cache
+from campaign_registry import CampaignRecord, registry
+from fake_guild import FakeApi, FakeCategoryChannel, FakeContext, FakeGuild, FakeTextChannel, FakeVoiceChannel
+from member_index import member_index
+from templates import ChannelType, DM_PERMS, PLAYER_PERMS
+
+MEMBER_COUNTS = [10, 1000, 50000]
+CAMPAIGN_COUNTS = [10, 100, 500]
+PLAYERS_PER_COMMAND = 8
+BROADCAST_SIZE = 100
+STARTUP_MEMBERS = 100000
+CACHED_MESSAGES = 1000
+
+
+def add_campaign(guild: FakeGuild, campaign_name: str) -> None:
+    """Adds a complete, registered campaign to the guild without any REST calls."""
+    player_role = guild.add_role(f"{campaign_name} Player", PLAYER_PERMS)
+    dm_role = guild.add_role(f"{campaign_name} Dungeon Master", DM_PERMS)
+    category = guild.add_channel(FakeCategoryChannel, campaign_name, overwrites=hidden_overwrites(guild))
+    for position, (name, channel_type, overwrites) in enumerate(build_channel_overwrites(guild, player_role,
+                                                                                          dm_role)):
+        channel_class = FakeTextChannel if channel_type == ChannelType.TEXT else FakeVoiceChannel
+        guild.add_channel(channel_class, name, category, overwrites, position)
+    registry.add_campaign(CampaignRecord(guild.id, campaign_name, category.id, player_role.id, dm_role.id))
+
+
+def build_guild(member_count: int, campaign_count: int, api: FakeApi) -> FakeContext:
+    guild = FakeGuild(f"Bench {member_count}/{campaign_count}", api)
+    dungeon_master = guild.add_role("Dungeon Master")
+    broadcast_role = guild.add_role("Bench Broadcast")
+    for index in range(member_count):
+        member = guild.add_member(f"player{index}", closed_dms=index % 10 == 9)
+        if index < BROADCAST_SIZE:
+            member.roles.append(broadcast_role)
+
+    for index in range(campaign_count):
+        add_campaign(guild, f"Campaign {index}")
+
+    author = guild.add_member("benchmaster")
+    author.roles.append(dungeon_master)
+    channel = guild.add_channel(FakeTextChannel, "bot-commands")
+    return FakeContext(guild, author, channel)
+
+
+def command_runs(context: FakeContext) -> List[Any]:
+    """The commands to benchmark, in order. Later commands work on the campaign the earlier ones created."""
+    guild = context.guild
+    players = tuple(member.name for member in guild.members[:min(PLAYERS_PER_COMMAND, len(guild.members) - 1)])
+
+    def role(name: str) -> Any:
+        return next(role for role in guild.roles if role.name == name)
+
+    return [
+        ("campaign_create", lambda: main.campaign_create.callback(context, "Bench Campaign")),
+        ("campaign_rename", lambda: main.campaign_rename.callback(context, "Bench Campaign", "Bench Renamed")),
+        ("player_add", lambda: main.player_add.callback(context, "Bench Renamed", *players)),
+        ("player_remove", lambda: main.player_remove.callback(context, "Bench Renamed", *players)),
+        ("role_colour", lambda: main.role_colour.callback(context, role("Bench Renamed Player"), "ff0000")),
+        ("role_send_message", lambda: main.role_send_message.callback(context, role("Bench Broadcast"),
+                                                                      "Benchmark message")),
+        ("campaign_delete", lambda: main.campaign_delete.callback(context, "Bench Renamed")),
+    ]
+
+
+async def measure(api: FakeApi, run: Callable[[], Awaitable[None]]) -> Dict[str, Any]:
+    api.reset()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    await run()
+    wall_time = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    return {"api_calls": api.calls,
+            "routes": dict(sorted(api.routes.items())),
+            "rate_limited": api.rate_limited,
+            "rate_limit_wait": round(api.rate_limit_wait, 3),
+            "wall_time": round(wall_time, 4),
+            "peak_memory": peak}
+
+
+def member_payload(index: int) -> Dict[str, Any]:
+    return {"user": {"id": str(10 ** 17 + index), "username": f"player{index}", "discriminator": "0",
+                     "global_name": None, "avatar": None},
+            "roles": [], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False, "flags": 0}
+
+
+def message_payload(index: int) -> Dict[str, Any]:
+    return {"id": str(10 ** 17 + index), "channel_id": "2", "author": member_payload(index)["user"],
+            "content": "A typical message of about a hundred characters, as players write them during a session.",
+            "timestamp": "2024-01-01T00:00:00+00:00", "edited_timestamp": None, "tts": False,
+            "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [], "embeds": [],
+            "pinned": False, "type": 0}
+
+
+def measure_startup(member_count: int, low_memory: bool) -> Dict[str, Any]:
+    """Feeds discord.py the guild and member payloads it receives at startup, then fills the message cache,
+    using the cache settings main.py picks. By default every member is chunked in and cached; in low-memory
+    mode members are never requested, so only the guild itself is parsed."""
+    intents = discord.Intents.default()
+    intents.members = True
+    options = dict(member_cache_flags=discord.MemberCacheFlags.none(), max_messages=None) if low_memory else {}
+    state = ConnectionState(dispatch=lambda *_, **__: None, handlers={}, hooks={}, http=None, intents=intents,
+                            **options)
+    members = [] if low_memory else [member_payload(index) for index in range(member_count)]
+    guild_data = {"id": "1", "name": "Startup", "owner_id": "1", "roles": [], "member_count": member_count,
+                  "channels": [{"id": "2", "type": 0, "name": "campaign-general", "position": 0,
+                                "permission_overwrites": []}]}
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    guild = discord.Guild(data=guild_data, state=state)
+    # Chunks arrive 1000 members at a time, each parsed and cached the same way as these.
+    guild._from_data(dict(guild_data, members=members))
+    startup_time = time.perf_counter() - start
+    if state._messages is not None:
+        channel = guild.get_channel(2)
+        for index in range(CACHED_MESSAGES):
+            state._messages.append(discord.Message(state=state, channel=channel, data=message_payload(index)))
+    steady_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {"command": "startup", "mode": "low_memory" if low_memory else "default", "members": member_count,
+            "campaigns": 0, "cached_members": len(guild.members),
+            "cached_messages": len(state._messages or ()), "gateway_chunks": -(-len(members) // 1000),
+            "wall_time": round(startup_time, 4), "steady_memory": steady_memory}
+
+
+async def run_benchmarks(member_counts: List[int], campaign_counts: List[int], latency: float,
+                         rate_limit: int) -> List[Dict[str, Any]]:
+    results = []
+    tracemalloc.start()
+    for member_count in member_counts:
+        for campaign_count in campaign_counts:
+            api = FakeApi(latency, rate_limit)
+            context = build_guild(member_count, campaign_count, api)
+            for command, run in command_runs(context):
+                result = await measure(api, run)
+                result.update(command=command, members=member_count, campaigns=campaign_count)
+                results.append(result)
+                print(f"{command:>18} {member_count:>6} members {campaign_count:>4} campaigns: "
+                      f"{result['api_calls']:>5} calls {result['wall_time']:>8.3f}s "
+                      f"{result['peak_memory'] / 1024:>9.1f} KiB")
+    tracemalloc.stop()
+    return results
+
+
+def run_startup_benchmarks(member_count: int) -> List[Dict[str, Any]]:
+    results = []
+    for low_memory in (False, True):
+        result = measure_startup(member_count, low_memory)
+        results.append(result)
+        print(f"{'startup ' + result['mode']:>26} {member_count:>6} members: {result['cached_members']:>6} "
+              f"members cached {result['wall_time']:>8.3f}s {result['steady_memory'] / 1024 / 1024:>8.1f} MiB")
+    return results
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per REST call.")
+    parser.add_argument("--rate-limit", type=int, default=None, help="Simulated REST calls allowed per second.")
+    parser.add_argument("--members", type=int, nargs="+", default=MEMBER_COUNTS)
+    parser.add_argument("--campaigns", type=int, nargs="+", default=CAMPAIGN_COUNTS)
+    parser.add_argument("--startup-members", type=int, default=STARTUP_MEMBERS)
+    parser.add_argument("--low-memory", action="store_true",
+                        help="Run the commands the way they run with RPG_LOW_MEMORY set.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    if arguments.low_memory:
+        member_index.low_memory = True
+        auth_cache.cache_members = False
+    benchmark_results = run_startup_benchmarks(arguments.startup_members)
+    benchmark_results += asyncio.run(run_benchmarks(arguments.members, arguments.campaigns,
+                                                   arguments.latency, arguments.rate_limit))
+    benchmark_results.sort(key=lambda result: (result["command"], result["members"], result["campaigns"],
+                                               result.get("mode", "")))
+    with open(arguments.output, "w") as output:
+        json.dump(benchmark_results, output, indent=2, sort_keys=True)
+        output.write("\n")
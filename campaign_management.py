@@ -1,185 +1,400 @@
+import asyncio
 import discord
-from enum import Enum
-from typing import Union, List, Tuple
-
-
-class ChannelType(Enum):
-    TEXT = 1
-    VOICE = 2
-
-
-CanRead = bool
-CanWrite = bool
-Channels = List[Tuple[str, ChannelType, CanRead, CanWrite]]
-
-CAMPAIGN_CHANNELS: Channels = [("campaign-chronicle", ChannelType.TEXT, True, False),
-                               ("campaign-general", ChannelType.TEXT, True, True),
-                               ("reactions", ChannelType.TEXT, True, True),
-                               ("dm-notes", ChannelType.TEXT, False, False),
-                               ("bot-commands", ChannelType.TEXT, False, False),
-                               ("session-voice", ChannelType.VOICE, True, True),
-                               ("other-voice", ChannelType.VOICE, True, True)]
-
-PLAYER_PERMS = discord.Permissions(read_messages=True,
-                                   send_messages=True,
-                                   connect=True,
-                                   use_external_emojis=True,
-                                   change_nickname=True,
-                                   speak=True,
-                                   stream=True,
-                                   embed_links=True,
-                                   attach_files=True,
-                                   add_reactions=True)
-
-DM_PERMS = discord.Permissions(read_messages=True,
-                               send_messages=True,
-                               mention_everyone=True,
-                               connect=True,
-                               use_external_emojis=True,
-                               change_nickname=True,
-                               speak=True,
-                               stream=True,
-                               embed_links=True,
-                               attach_files=True,
-                               add_reactions=True,
-                               priority_speaker=True,
-                               mute_members=True,
-                               move_members=True,
-                               deafen_members=True)
-
-
-async def set_role_perms(channel: Union[discord.TextChannel, discord.VoiceChannel],
-                         permissions_role: discord.Role, is_voice: bool,
-                         send_privilege: bool, read_privilege: bool) -> None:
-    """An auxiliary function that handles the assignment of permissions to a role in the given channel."""
-    await channel.set_permissions(permissions_role,
-                                  overwrite=None)
-    if not is_voice:
-        await channel.set_permissions(permissions_role,
-                                      view_channel=True,
-                                      read_message_history=True,
-                                      send_messages=send_privilege,
-                                      read_messages=read_privilege)
-    else:
-        await channel.set_permissions(permissions_role,
-                                      view_channel=True,
-                                      connect=True,
-                                      speak=True,
-                                      stream=True)
-
-
-async def make_text_channel(server: discord.Guild, name: str,
-                            parent_category: discord.CategoryChannel,
-                            player_role: discord.Role,
-                            dungeon_master_role: discord.Role,
-                            player_write: bool, player_read: bool):
-    """Creates a Discord Text Channel, setting permissions for the player and dungeon master roles accordingly."""
-    channel = await server.create_text_channel(name, overwrites=None)
-    await channel.edit(category=parent_category)
-    await channel.edit(sync_permissions=True)
-
-    await set_role_perms(channel, player_role, False, player_write, player_read)
-    await set_role_perms(channel, dungeon_master_role, False, True, True)
+import functools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Mapping, NamedTuple, Optional, Union, List, Tuple
+from archive import archive_campaign, describe_archive
+from auth_cache import auth_cache
+from interaction_context import send_please_wait
+from campaign_registry import CampaignRecord, ResolvedCampaign, registry, resolve_campaign
+from event_log import log_event
+from member_index import member_index
+from player_management import rename_player_channels
+from scheduler import RequestLimit, scheduler
+from journal import CREATE, DELETE, DONE, FAILED, ROLLED_BACK, RUNNING, Operation, journal
+from templates import (DEFAULT_TEMPLATE, DUNGEON_MASTER, EVERYONE, PLAYER, ChannelType, CompiledTemplate,
+                       TemplateError, template_cache)
+
+
+Overwrites = Dict[Union[discord.Role, discord.Member], discord.PermissionOverwrite]
+
+PROVISIONING_CONCURRENCY = 4
+
+
+class ProvisionedCampaign(NamedTuple):
+    category: discord.CategoryChannel
+    player_role: discord.Role
+    dm_role: discord.Role
+    channels: List[Union[discord.TextChannel, discord.VoiceChannel]]
+    api_calls: int
+
+
+def bind_overwrites(server: discord.Guild, player_role: discord.Role, dm_role: discord.Role,
+                    overwrites: Mapping[str, discord.PermissionOverwrite]) -> Overwrites:
+    """Maps the role slots of compiled template overwrites onto a campaign's actual roles."""
+    targets = {EVERYONE: server.default_role, PLAYER: player_role, DUNGEON_MASTER: dm_role}
+    return {targets[slot]: overwrite for slot, overwrite in overwrites.items()}
+
+
+def hidden_overwrites(server: discord.Guild, template: CompiledTemplate = DEFAULT_TEMPLATE) -> Overwrites:
+    """The overwrites hiding a campaign category (and its synced channels) from @everyone."""
+    return {server.default_role: template.category_overwrites[EVERYONE]}
+
+
+def build_channel_overwrites(server: discord.Guild, player_role: discord.Role, dm_role: discord.Role,
+                             template: CompiledTemplate = DEFAULT_TEMPLATE
+                             ) -> List[Tuple[str, ChannelType, Overwrites]]:
+    """Binds the template's channels to a campaign's roles, giving the complete overwrite map of every channel,
+    so that each channel can be created with its final permissions in a single call."""
+    return [(channel.name, channel.channel_type, bind_overwrites(server, player_role, dm_role, channel.overwrites))
+            for channel in template.channels]
+
+
+async def load_guild_template(channel: discord.abc.Messageable,
+                              server: discord.Guild) -> Optional[CompiledTemplate]:
+    """The guild's campaign template, or None after reporting why its template file is invalid."""
+    try:
+        return template_cache.template_for(server)
+    except (OSError, TemplateError) as error:
+        await channel.send(f"Error: The campaign template of this server could not be loaded. {error}")
+        return None
 
 
-async def make_voice_channel(server, name: str,
-                             parent_category: discord.CategoryChannel,
-                             player_role: discord.Role,
-                             dungeon_master_role: discord.Role):
-    """Creates a Discord Voice Channel, setting permissions for the player and dungeon master roles accordingly."""
-    channel = await server.create_voice_channel(name, overwrites=None)
-    await channel.edit(category=parent_category)
-    await channel.edit(sync_permissions=True)
+async def gather_all(*awaitables: Awaitable[Any]) -> List[Any]:
+    """Like asyncio.gather, but waits for every awaitable before raising the first error, so that no journaled
+    step is still running once an operation has been marked as failed."""
+    results = await asyncio.gather(*awaitables, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
+async def provision_campaign(server: discord.Guild, operation: Operation, dungeon_master: Optional[discord.Member],
+                             template: CompiledTemplate,
+                             semaphore: Optional[RequestLimit] = None) -> ProvisionedCampaign:
+    """Creates the roles, category and channels of a campaign.
+    Every channel is created with its category and overwrites in one call, and the objects are
+    created concurrently (at most PROVISIONING_CONCURRENCY at a time within the guild's request budget, unless
+    a limit shared with other work is given). Each created object is journaled right away, so a resumed
+    operation reuses the objects it already created instead of creating them again."""
+    campaign_name = operation.campaign_name
+    semaphore = semaphore or scheduler.request_limit(server, PROVISIONING_CONCURRENCY)
+    api_calls = 0
+
+    async def step(name: str, lookup: Callable[[int], Any], create: Callable[[], Awaitable[Any]]) -> Any:
+        nonlocal api_calls
+        if operation.is_done(name):
+            existing = lookup(operation.steps[name])
+            if existing is not None:
+                return existing
+        async with semaphore:
+            created = await create()
+        api_calls += 1
+        journal.record(operation, name, created.id)
+        log_event("campaign_object_created", guild_id=server.id, campaign=campaign_name, operation_id=operation.id,
+                  step=name, object_id=created.id)
+        return created
+
+    async def create_roles() -> Tuple[discord.Role, discord.Role]:
+        # Sequential on purpose, so the Dungeon Master role always ends up above the Player role.
+        player = await step("player_role", server.get_role,
+                            lambda: server.create_role(name=f"{campaign_name} Player",
+                                                       permissions=template.player_permissions))
+        dm = await step("dm_role", server.get_role,
+                        lambda: server.create_role(name=f"{campaign_name} Dungeon Master",
+                                                   permissions=template.dm_permissions))
+        return player, dm
+
+    (player_role, dm_role), category = await gather_all(
+        create_roles(),
+        step("category", server.get_channel,
+             lambda: server.create_category(campaign_name, overwrites=hidden_overwrites(server, template))))
+
+    async def create_channel(position: int, name: str, channel_type: ChannelType,
+                             overwrites: Overwrites) -> Union[discord.TextChannel, discord.VoiceChannel]:
+        if channel_type == ChannelType.TEXT:
+            return await server.create_text_channel(name, category=category,
+                                                    overwrites=overwrites, position=position)
+        return await server.create_voice_channel(name, category=category,
+                                                 overwrites=overwrites, position=position)
+
+    channels = await gather_all(*(step(f"channel:{name}", server.get_channel,
+                                       functools.partial(create_channel, position, name, channel_type, overwrites))
+                                  for position, (name, channel_type, overwrites)
+                                  in enumerate(build_channel_overwrites(server, player_role, dm_role, template))))
+
+    if dungeon_master is not None and not operation.is_done("dm_assigned"):
+        async with semaphore:
+            await dungeon_master.add_roles(dm_role)
+        api_calls += 1
+        journal.record(operation, "dm_assigned", dungeon_master.id)
+        log_event("dungeon_master_assigned", guild_id=server.id, campaign=campaign_name, member_id=dungeon_master.id,
+                  role_id=dm_role.id)
+
+    return ProvisionedCampaign(category, player_role, dm_role, list(channels), api_calls)
+
+
+def register_created_campaign(server: discord.Guild, operation: Operation,
+                              provisioned: ProvisionedCampaign) -> ResolvedCampaign:
+    """Registers a provisioned campaign and completes its creation operation."""
+    record = CampaignRecord(server.id, operation.campaign_name, provisioned.category.id,
+                            provisioned.player_role.id, provisioned.dm_role.id)
+    registry.add_campaign(record)
+    auth_cache.category_added(server, provisioned.category.id, operation.campaign_name)
+    journal.record(operation, "registered", provisioned.category.id)
+    journal.set_state(operation, DONE)
+    log_event("campaign_created", guild_id=server.id, campaign=operation.campaign_name, operation_id=operation.id,
+              category_id=provisioned.category.id, player_role_id=provisioned.player_role.id,
+              dm_role_id=provisioned.dm_role.id)
+    return ResolvedCampaign(record, provisioned.category, provisioned.player_role, provisioned.dm_role)
+
+
+async def run_create_operation(channel: discord.abc.Messageable, server: discord.Guild,
+                               operation: Operation) -> None:
+    """Runs (or resumes) a journaled campaign creation."""
+    campaign_name = operation.campaign_name
+    template = await load_guild_template(channel, server)
+    if template is None:
+        journal.set_state(operation, FAILED)
+        return None
+    journal.set_state(operation, RUNNING)
+    try:
+        dungeon_master = await member_index.get(server, operation.author_id)
+        provisioned = await provision_campaign(server, operation, dungeon_master, template)
+    except discord.HTTPException as error:
+        journal.set_state(operation, FAILED)
+        log_event("campaign_create_failed", logging.WARNING, guild_id=server.id, campaign=campaign_name,
+                  operation_id=operation.id, status=error.status, error=error.text)
+        await channel.send(f"Error: Creating {campaign_name} failed ({error.status} {error.text}). "
+                           f"Use R!campaign_resume {operation.id} to continue where it stopped, or "
+                           f"R!campaign_rollback {operation.id} to remove what was already created.")
+        return None
 
-    await set_role_perms(channel, player_role, True, False, False)
-    await set_role_perms(channel, dungeon_master_role, True, False, False)
+    register_created_campaign(server, operation, provisioned)
+    await channel.send(f"The campaign {campaign_name} was successfully created! "
+                       f"({provisioned.api_calls} API calls)")
 
 
 async def create_campaign(message: discord.Message, campaign_name) -> None:
     """Creates the category and all chat channels for a D&D Campaign.
     The message author is then promoted to the Campaign's Dungeon Master Role."""
-    await message.channel.send(f"Creating {campaign_name} for {message.author.name}. Please wait until "
-                               f"an error or success message is returned.")
+    await send_please_wait(message.channel, f"Creating {campaign_name} for {message.author.name}. Please wait "
+                                            f"until an error or success message is returned.")
 
     # ToDo: Fix typing here.
     server = message.guild
     if server is None:
         await message.channel.send("Error while trying to create the campaign category.")
         return
+    if await load_guild_template(message.channel, server) is None:
+        return None
 
-    new_category = await server.create_category(campaign_name)
-
-    await new_category.set_permissions(server.default_role, view_channel=False)
-    await new_category.set_permissions(server.default_role, read_messages=False)
-
-    player_role = await server.create_role(name=f"{campaign_name} Player", permissions=PLAYER_PERMS)
-    dm_role = await server.create_role(name=f"{campaign_name} Dungeon Master", permissions=DM_PERMS)
-
-    for name, channel_type, player_read, player_write in CAMPAIGN_CHANNELS:
-        if channel_type == ChannelType.TEXT:
-            await make_text_channel(server, name, new_category, player_role, dm_role, player_write, player_read)
-        else:
-            await make_voice_channel(server, name, new_category, player_role, dm_role)
+    operation = journal.begin(server.id, CREATE, campaign_name, message.author.id, message.channel.id)
+    await run_create_operation(message.channel, server, operation)
+
+
+def lookup_step_object(server: discord.Guild, step: str, object_id: int) -> Any:
+    if step.endswith("_role"):
+        return server.get_role(object_id)
+    return server.get_channel(object_id)
+
+
+async def delete_step_object(server: discord.Guild, operation: Operation, step: str) -> None:
+    """Deletes the object of a journaled step, treating an object that is already gone as deleted."""
+    to_delete = lookup_step_object(server, step, operation.steps[step])
+    if to_delete is not None:
+        try:
+            await to_delete.delete()
+        except discord.NotFound:
+            pass
+        log_event("campaign_object_deleted", guild_id=server.id, campaign=operation.campaign_name,
+                  operation_id=operation.id, step=step, object_id=to_delete.id)
+        if step == "category":
+            auth_cache.category_removed(server, to_delete.id, to_delete.name)
+
+
+async def run_delete_operation(channel: discord.abc.Messageable, server: discord.Guild,
+                               operation: Operation) -> bool:
+    """Runs (or resumes) a journaled campaign deletion. Every object was planned up front, so the remaining
+    steps are exactly the objects that still have to be deleted."""
+    journal.set_state(operation, RUNNING)
+    semaphore = scheduler.request_limit(server, PROVISIONING_CONCURRENCY)
+
+    async def delete(step: str) -> None:
+        async with semaphore:
+            await delete_step_object(server, operation, step)
+            journal.record(operation, step)
+
+    try:
+        await gather_all(*(delete(step) for step in operation.steps
+                               if step.startswith("channel:") and not operation.is_done(step)))
+        for step in ("category", "player_role", "dm_role"):
+            if not operation.is_done(step):
+                await delete(step)
+    except discord.HTTPException as error:
+        journal.set_state(operation, FAILED)
+        log_event("campaign_delete_failed", logging.WARNING, guild_id=server.id, campaign=operation.campaign_name,
+                  operation_id=operation.id, status=error.status, error=error.text)
+        await channel.send(f"Error: Deleting {operation.campaign_name} failed ({error.status} {error.text}). "
+                           f"Use R!campaign_resume {operation.id} to finish the deletion.")
+        return False
+
+    record = registry.by_category.get(operation.steps["category"])
+    if record is not None:
+        registry.remove_campaign(record)
+    journal.record(operation, "unregistered")
+    journal.set_state(operation, DONE)
+    log_event("campaign_deleted", guild_id=server.id, campaign=operation.campaign_name, operation_id=operation.id,
+              category_id=operation.steps["category"])
+    return True
+
+
+async def delete_campaign(message: discord.Message, campaign_name: str, archive_first: bool = False) -> None:
+    """Deletes the given campaign category, along with all the channels and roles.
+    With archive_first, the history of its text channels is archived first, and nothing is deleted if that fails."""
+    await send_please_wait(message.channel, f"Attempting to delete {campaign_name}. Please wait until "
+                                            f"an error or success message is returned.")
+    campaign = resolve_campaign(message.guild, campaign_name)
+    # ToDo: Decide if this should stop the deletion or simply ignore the deletion of the roles.
+    if campaign is None:
+        await message.channel.send(f"No campaign by the name of {campaign_name} exists, or its Player or "
+                                   f"Dungeon Master role is missing. Did you write the name correctly?")
+        return None
 
-    await message.author.add_roles(dm_role)
-    await message.channel.send(f"The campaign {campaign_name} was successfully created!")
+    if archive_first:
+        try:
+            result = await archive_campaign(message.guild, campaign)
+        except (discord.HTTPException, OSError) as error:
+            await message.channel.send(f"Error: Archiving {campaign_name} failed ({error}), so nothing was deleted. "
+                                       f"Run the command again to continue the archive where it stopped.")
+            return None
+        await message.channel.send(describe_archive(campaign_name, result))
+
+    operation = journal.begin(message.guild.id, DELETE, campaign_name, message.author.id, message.channel.id)
+    for channel in campaign.category.channels:
+        journal.plan(operation, f"channel:{channel.id}", channel.id)
+    journal.plan(operation, "category", campaign.category.id)
+    journal.plan(operation, "player_role", campaign.player_role.id)
+    journal.plan(operation, "dm_role", campaign.dm_role.id)
+    journal.plan(operation, "unregistered", campaign.category.id)
+
+    if await run_delete_operation(message.channel, message.guild, operation):
+        # Using author.send in case the author decided to delete the channel they were in.
+        await message.author.send(f"Campaign {campaign_name} deleted successfully!")
+
+
+async def rollback_create_operation(channel: discord.abc.Messageable, server: discord.Guild,
+                                    operation: Operation) -> None:
+    """Removes everything a failed campaign creation created, newest first. Undone steps are journaled too,
+    so an interrupted rollback can simply be started again."""
+    try:
+        for step in reversed(list(operation.steps)):
+            if not operation.is_done(step):
+                continue
+            if step == "registered":
+                record = registry.by_category.get(operation.steps[step])
+                if record is not None:
+                    registry.remove_campaign(record)
+            elif step != "dm_assigned":
+                # The Dungeon Master assignment goes away with the role itself.
+                await delete_step_object(server, operation, step)
+            journal.undo(operation, step)
+    except discord.HTTPException as error:
+        log_event("campaign_rollback_failed", logging.WARNING, guild_id=server.id, campaign=operation.campaign_name,
+                  operation_id=operation.id, status=error.status, error=error.text)
+        await channel.send(f"Error: Rolling back {operation.campaign_name} failed ({error.status} {error.text}). "
+                           f"Use R!campaign_rollback {operation.id} to try again.")
+        return None
 
+    journal.set_state(operation, ROLLED_BACK)
+    log_event("campaign_rolled_back", guild_id=server.id, campaign=operation.campaign_name, operation_id=operation.id)
+    await channel.send(f"The partially created campaign {operation.campaign_name} was removed.")
 
-async def delete_campaign(message: discord.Message, campaign_name: str) -> None:
-    """Deletes the given campaign category, along with all the channels and roles."""
-    await message.channel.send(f"Attempting to delete {campaign_name}. Please wait until "
-                               f"an error or success message is returned.")
-    category = discord.utils.get(message.guild.categories, name=campaign_name)
-    if category is None:
-        await message.channel.send(f"No campaign by the name of {campaign_name} exists, "
-                                   f"did you write the name correctly?")
-        return None
 
-    player_role = discord.utils.get(message.guild.roles, name=f"{campaign_name} Player")
-    dm_role = discord.utils.get(message.guild.roles, name=f"{campaign_name} Dungeon Master")
-    # ToDo: Decide if this should stop the deletion or simply ignore the deletion of the roles.
-    if player_role is None or dm_role is None:
-        await message.channel.send(f"The {campaign_name} Player role or {campaign_name} Dungeon Master "
-                                   f"role does not exist.")
-        return None
+async def resume_operation(channel: discord.abc.Messageable, server: discord.Guild, operation: Operation) -> None:
+    if operation.kind == CREATE:
+        await run_create_operation(channel, server, operation)
+    elif await run_delete_operation(channel, server, operation):
+        await channel.send(f"Campaign {operation.campaign_name} deleted successfully!")
 
-    for text_channel in category.text_channels:
-        await text_channel.delete()
-    for voice_channel in category.voice_channels:
-        await voice_channel.delete()
 
-    # ToDo: Think about adding try ... except to blocks similar to these. ^ Also deals with that.
-    await category.delete()
-    await player_role.delete()
-    await dm_role.delete()
-    # Using author.send in case the author decided to delete the channel they were in. Could probably check for it.
-    await message.author.send(f"Campaign {campaign_name} deleted successfully!")
+async def rollback_operation(channel: discord.abc.Messageable, server: discord.Guild, operation: Operation) -> None:
+    if operation.kind == CREATE:
+        await rollback_create_operation(channel, server, operation)
+    else:
+        await channel.send(f"Deleted channels and roles cannot be restored. Use R!campaign_resume {operation.id} "
+                           f"to finish deleting {operation.campaign_name} instead.")
 
 
 async def rename_campaign(message: discord.Message, campaign_name: str, new_name: str) -> None:
-    """Renames the given campaign category and its roles."""
-    await message.channel.send(f"Attempting to rename {campaign_name} into {new_name}, please wait until an error "
-                               f"or success message is returned.")
+    """Renames the given campaign category and its roles concurrently, and brings the names of its player log
+    channels up to date alongside. If any of the three renames fails, the others are undone again, so the
+    registry and caches only ever change, all at once, after the whole campaign was renamed."""
+    await send_please_wait(message.channel, f"Attempting to rename {campaign_name} into {new_name}, please wait "
+                                            f"until an error or success message is returned.")
     server = message.guild
 
     if server is None:
         await message.channel.send("Something went wrong while trying to rename the campaign category.")
         return None
 
-    campaign_category = discord.utils.get(server.channels, name=campaign_name)
-    if campaign_category is None:
-        await message.channel.send(f"A campaign category by the name of {campaign_name} was not found.")
+    campaign = resolve_campaign(server, campaign_name)
+    if campaign is None:
+        await message.channel.send(f"A campaign category by the name of {campaign_name}, or its Player or "
+                                   f"Dungeon Master role, was not found.")
         return None
-
-    player_role = discord.utils.get(server.roles, name=f"{campaign_name} Player")
-    dungeon_master_role = discord.utils.get(server.roles, name=f"{campaign_name} Dungeon Master")
-
-    if player_role is None or dungeon_master_role is None:
-        await message.channel.send(f"A Player or Dungeon Master role for {campaign_name} does not exist.")
+    campaign_category, player_role, dungeon_master_role = campaign.category, campaign.player_role, campaign.dm_role
+
+    start = time.perf_counter()
+    semaphore = scheduler.request_limit(server, PROVISIONING_CONCURRENCY)
+    renames = [(campaign_category, campaign_category.name, new_name),
+               (player_role, player_role.name, f"{new_name} Player"),
+               (dungeon_master_role, dungeon_master_role.name, f"{new_name} Dungeon Master")]
+
+    async def rename(to_rename: Union[discord.CategoryChannel, discord.Role], name: str) -> None:
+        async with semaphore:
+            await to_rename.edit(name=name)
+
+    results, (channels_renamed, channels_failed) = await asyncio.gather(
+        asyncio.gather(*(rename(to_rename, name) for to_rename, _, name in renames), return_exceptions=True),
+        rename_player_channels(server, campaign, semaphore))
+
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        undone = await asyncio.gather(*(rename(to_rename, old_name)
+                                        for (to_rename, old_name, _), result in zip(renames, results)
+                                        if not isinstance(result, BaseException)), return_exceptions=True)
+        error = errors[0]
+        if not isinstance(error, discord.HTTPException):
+            raise error
+        log_event("campaign_rename_failed", logging.WARNING, guild_id=server.id, campaign=campaign_name,
+                  new_name=new_name, category_id=campaign_category.id, status=error.status, error=error.text)
+        if any(isinstance(result, BaseException) for result in undone):
+            await message.channel.send(f"Error: Renaming {campaign_name} failed ({error.status} {error.text}), "
+                                       f"and some of its names could not be changed back. Run the command again "
+                                       f"to finish the rename.")
+        else:
+            await message.channel.send(f"Error: Renaming {campaign_name} failed ({error.status} {error.text}), "
+                                       f"nothing was renamed.")
         return None
 
-    await campaign_category.edit(name=new_name)
-    await player_role.edit(name=f"{new_name} Player")
-    await dungeon_master_role.edit(name=f"{new_name} Dungeon Master")
-
-    await message.channel.send(f"{campaign_name} was successfully renamed to {new_name}.")
+    old_category_name = renames[0][1]
+    registry.rename_campaign(campaign.record, new_name)
+    auth_cache.category_removed(server, campaign_category.id, old_category_name)
+    auth_cache.category_added(server, campaign_category.id, new_name)
+    elapsed = time.perf_counter() - start
+    # Logged under both names, so that R!log_tail finds the rename from either one.
+    for logged_name in (campaign_name, new_name):
+        log_event("campaign_renamed", guild_id=server.id, campaign=logged_name, old_name=old_category_name,
+                  new_name=new_name, category_id=campaign_category.id, player_role_id=player_role.id,
+                  dm_role_id=dungeon_master_role.id, player_channels_renamed=channels_renamed,
+                  seconds=round(elapsed, 3))
+
+    summary = f"{campaign_name} was successfully renamed to {new_name} in {elapsed:.1f}s."
+    if channels_renamed:
+        summary += f" {channels_renamed} player log channels were renamed after their players."
+    if channels_failed:
+        summary += f" {channels_failed} player log channels could not be renamed."
+    await message.channel.send(summary)
@@ -0,0 +1,215 @@
+import discord
+import sqlite3
+from os import getenv
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from prefix_index import PrefixIndex
+
+REGISTRY_PATH = getenv("RPG_REGISTRY_PATH", "campaigns.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaigns (
+    category_id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    player_role_id INTEGER NOT NULL,
+    dm_role_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS player_channels (
+    category_id INTEGER NOT NULL REFERENCES campaigns(category_id) ON DELETE CASCADE,
+    member_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    PRIMARY KEY (category_id, member_id)
+);
+"""
+
+
+class CampaignRecord(NamedTuple):
+    guild_id: int
+    name: str
+    category_id: int
+    player_role_id: int
+    dm_role_id: int
+
+
+class ResolvedCampaign(NamedTuple):
+    record: CampaignRecord
+    category: discord.CategoryChannel
+    player_role: discord.Role
+    dm_role: discord.Role
+
+
+def name_key(campaign_name: str) -> str:
+    return campaign_name.casefold()
+
+
+class CampaignRegistry:
+    """Maps every campaign to the IDs of its category, roles and player log channels.
+    SQLite is the persistent store; all reads are served from an in-memory mirror."""
+
+    def __init__(self, path: str) -> None:
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+        self.by_name: Dict[Tuple[int, str], CampaignRecord] = {}
+        self.by_category: Dict[int, CampaignRecord] = {}
+        self.player_channels: Dict[int, Dict[int, int]] = {}
+        self.name_prefixes: Dict[int, PrefixIndex] = {}
+        self._load()
+
+    def _load(self) -> None:
+        for row in self.connection.execute("SELECT guild_id, name, category_id, player_role_id, dm_role_id "
+                                           "FROM campaigns"):
+            self._remember(CampaignRecord(*row))
+        for category_id, member_id, channel_id in self.connection.execute(
+                "SELECT category_id, member_id, channel_id FROM player_channels"):
+            self.player_channels.setdefault(category_id, {})[member_id] = channel_id
+
+    def _remember(self, record: CampaignRecord) -> None:
+        self.by_name[(record.guild_id, name_key(record.name))] = record
+        self.by_category[record.category_id] = record
+        self.name_prefixes.setdefault(record.guild_id, PrefixIndex()).add(record.name)
+
+    def _forget(self, record: CampaignRecord) -> None:
+        self.by_name.pop((record.guild_id, name_key(record.name)), None)
+        self.by_category.pop(record.category_id, None)
+        self.player_channels.pop(record.category_id, None)
+        self.name_prefixes.get(record.guild_id, PrefixIndex()).remove(record.name)
+
+    def get(self, guild_id: int, campaign_name: str) -> Optional[CampaignRecord]:
+        return self.by_name.get((guild_id, name_key(campaign_name)))
+
+    def complete(self, guild_id: int, prefix: str, limit: int = 25) -> List[str]:
+        """Names of the guild's campaigns starting with prefix, for autocompletion."""
+        return self.name_prefixes.get(guild_id, PrefixIndex()).search(prefix, limit)
+
+    def campaigns(self, guild_id: int) -> List[CampaignRecord]:
+        return [record for record in self.by_category.values() if record.guild_id == guild_id]
+
+    def add_campaign(self, record: CampaignRecord) -> None:
+        """Registers a campaign, replacing any earlier campaign of the same name in the guild."""
+        replaced = self.get(record.guild_id, record.name)
+        with self.connection:
+            if replaced is not None and replaced.category_id != record.category_id:
+                self.connection.execute("DELETE FROM campaigns WHERE category_id = ?", (replaced.category_id,))
+            self.connection.execute("INSERT OR REPLACE INTO campaigns VALUES (?, ?, ?, ?, ?)",
+                                    (record.category_id, record.guild_id, record.name,
+                                     record.player_role_id, record.dm_role_id))
+        if replaced is not None:
+            self._forget(replaced)
+        self._remember(record)
+
+    def remove_campaign(self, record: CampaignRecord) -> None:
+        with self.connection:
+            self.connection.execute("DELETE FROM campaigns WHERE category_id = ?", (record.category_id,))
+        self._forget(record)
+
+    def rename_campaign(self, record: CampaignRecord, new_name: str) -> CampaignRecord:
+        renamed = record._replace(name=new_name)
+        with self.connection:
+            self.connection.execute("UPDATE campaigns SET name = ? WHERE category_id = ?",
+                                    (new_name, record.category_id))
+        self.by_name.pop((record.guild_id, name_key(record.name)), None)
+        self.name_prefixes[record.guild_id].remove(record.name)
+        self._remember(renamed)
+        return renamed
+
+    def get_player_channel(self, record: CampaignRecord, member_id: int) -> Optional[int]:
+        return self.player_channels.get(record.category_id, {}).get(member_id)
+
+    def set_player_channel(self, record: CampaignRecord, member_id: int, channel_id: int) -> None:
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO player_channels VALUES (?, ?, ?)",
+                                    (record.category_id, member_id, channel_id))
+        self.player_channels.setdefault(record.category_id, {})[member_id] = channel_id
+
+    def remove_player_channel(self, record: CampaignRecord, member_id: int) -> None:
+        with self.connection:
+            self.connection.execute("DELETE FROM player_channels WHERE category_id = ? AND member_id = ?",
+                                    (record.category_id, member_id))
+        self.player_channels.get(record.category_id, {}).pop(member_id, None)
+
+    def replace_guild(self, guild_id: int, records: List[CampaignRecord],
+                      player_channels: List[Tuple[int, int, int]]) -> None:
+        """Atomically replaces everything known about a guild, used when rebuilding from the guild itself."""
+        with self.connection:
+            self.connection.execute("DELETE FROM campaigns WHERE guild_id = ?", (guild_id,))
+            self.connection.executemany("INSERT OR REPLACE INTO campaigns VALUES (?, ?, ?, ?, ?)",
+                                        [(record.category_id, record.guild_id, record.name,
+                                          record.player_role_id, record.dm_role_id) for record in records])
+            self.connection.executemany("INSERT OR REPLACE INTO player_channels VALUES (?, ?, ?)",
+                                        player_channels)
+        for record in self.campaigns(guild_id):
+            self._forget(record)
+        for record in records:
+            self._remember(record)
+        for category_id, member_id, channel_id in player_channels:
+            self.player_channels.setdefault(category_id, {})[member_id] = channel_id
+
+
+registry = CampaignRegistry(REGISTRY_PATH)
+
+
+def discover_campaign(server: discord.Guild, campaign_name: str) -> Optional[CampaignRecord]:
+    """Finds an unregistered campaign by its names, for campaigns created before the registry existed."""
+    category = discord.utils.get(server.categories, name=campaign_name)
+    player_role = discord.utils.get(server.roles, name=f"{campaign_name} Player")
+    dm_role = discord.utils.get(server.roles, name=f"{campaign_name} Dungeon Master")
+    if category is None or player_role is None or dm_role is None:
+        return None
+    return CampaignRecord(server.id, campaign_name, category.id, player_role.id, dm_role.id)
+
+
+def resolve_campaign(server: discord.Guild, campaign_name: str) -> Optional[ResolvedCampaign]:
+    """Looks up the category and roles of a campaign by their IDs.
+    Returns None if the campaign is unknown or one of its objects no longer exists."""
+    record = registry.get(server.id, campaign_name)
+    if record is not None and not isinstance(server.get_channel(record.category_id), discord.CategoryChannel):
+        # The category was deleted by hand, so the record can never resolve again. Dropping it lets a campaign
+        # created later under the same name take its place.
+        registry.remove_campaign(record)
+        record = None
+    if record is None:
+        record = discover_campaign(server, campaign_name)
+        if record is None:
+            return None
+        registry.add_campaign(record)
+
+    category = server.get_channel(record.category_id)
+    player_role = server.get_role(record.player_role_id)
+    dm_role = server.get_role(record.dm_role_id)
+    if not isinstance(category, discord.CategoryChannel) or player_role is None or dm_role is None:
+        return None
+    return ResolvedCampaign(record, category, player_role, dm_role)
+
+
+def member_overwrite_ids(channel: discord.abc.GuildChannel) -> List[int]:
+    """The IDs of the members with an overwrite in the channel. Members that are not cached (always the case
+    without a member cache) are given as a discord.Object typed as a user instead of a Member, so overwrites
+    are told apart by that type rather than by cache presence."""
+    return [target.id for target in channel.overwrites
+            if isinstance(target, discord.Member)
+            or (isinstance(target, discord.Object) and target.type is not discord.Role)]
+
+
+def rebuild_registry(server: discord.Guild) -> int:
+    """Rebuilds the registry entries of a guild from its categories, roles and log channels.
+    Returns the number of campaigns found."""
+    records = []
+    player_channels = []
+    roles = {role.name: role for role in server.roles}
+    for category in server.categories:
+        player_role = roles.get(f"{category.name} Player")
+        dm_role = roles.get(f"{category.name} Dungeon Master")
+        if player_role is None or dm_role is None:
+            continue
+
+        records.append(CampaignRecord(server.id, category.name, category.id, player_role.id, dm_role.id))
+        for channel in category.text_channels:
+            if not channel.name.endswith("-log"):
+                continue
+            members = member_overwrite_ids(channel)
+            if len(members) == 1:
+                player_channels.append((category.id, members[0], channel.id))
+
+    registry.replace_guild(server.id, records, player_channels)
+    return len(records)
@@ -0,0 +1,154 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, NamedTuple, Optional
+from discord.ext import commands
+
+LOG_DIRECTORY = os.getenv("RPG_LOG_DIR", "logs")
+LOG_FILE_SIZE = 5 * 1024 * 1024
+LOG_BACKUPS = 5
+RING_SIZE = 5000
+
+logger = logging.getLogger("rpgassistant")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+
+class LogEvent(NamedTuple):
+    time: float
+    level: str
+    event: str
+    fields: Dict[str, Any]
+
+    def describe(self) -> str:
+        fields = " ".join(f"{key}={value}" for key, value in self.fields.items() if key != "guild_id")
+        return f"{datetime.fromtimestamp(self.time).strftime('%m-%d %H:%M:%S')} {self.event} {fields}".rstrip()
+
+
+class RingBufferHandler(logging.Handler):
+    """Keeps the last RING_SIZE events in memory for R!log_tail. Appending to a bounded deque is all it does,
+    so it runs right on the event loop."""
+
+    def __init__(self, size: int) -> None:
+        super().__init__()
+        self.events: Deque[LogEvent] = deque(maxlen=size)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.events.append(LogEvent(record.created, record.levelname, record.getMessage(),
+                                    getattr(record, "fields", {})))
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = {"time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+                "level": record.levelname,
+                "event": record.getMessage()}
+        line.update(getattr(record, "fields", {}))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            line["traceback"] = record.exc_text
+        return json.dumps(line, default=str, ensure_ascii=False)
+
+
+class EventQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The default prepare() folds the traceback into the message; the JSONL formatter keeps it separate.
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+ring_buffer = RingBufferHandler(RING_SIZE)
+logger.addHandler(ring_buffer)
+listener: Optional[logging.handlers.QueueListener] = None
+
+
+def log_event(event: str, level: int = logging.INFO, exc_info: Any = None, **fields: Any) -> None:
+    """Logs a structured event. Pass guild_id, and campaign where it applies, so that R!log_tail can find it."""
+    logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+
+def recent_events(guild_id: int, campaign_name: Optional[str] = None, count: int = 50) -> List[LogEvent]:
+    """The newest count events of a guild, optionally only those of one campaign, oldest first."""
+    campaign_key = campaign_name.casefold() if campaign_name is not None else None
+    events = []
+    for event in reversed(ring_buffer.events):
+        if event.fields.get("guild_id") != guild_id:
+            continue
+        if campaign_key is not None and str(event.fields.get("campaign", "")).casefold() != campaign_key:
+            continue
+        events.append(event)
+        if len(events) == count:
+            break
+    events.reverse()
+    return events
+
+
+def start_logging() -> None:
+    """Starts writing events to size-rotated JSONL files. Formatting and file writes happen on a background
+    thread fed through a queue, so logging never blocks the event loop; warnings also go to the console."""
+    global listener
+    if listener is not None:
+        return
+    os.makedirs(LOG_DIRECTORY, exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(os.path.join(LOG_DIRECTORY, "events.jsonl"),
+                                                        maxBytes=LOG_FILE_SIZE, backupCount=LOG_BACKUPS,
+                                                        encoding="utf-8")
+    file_handler.setFormatter(JsonLinesFormatter())
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.WARNING)
+    console_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s %(fields)s"))
+
+    events: queue.SimpleQueue = queue.SimpleQueue()
+    logger.addHandler(EventQueueHandler(events))
+    listener = logging.handlers.QueueListener(events, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Writes out every queued event and stops the background writer."""
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+
+
+def instrument_commands(bot: commands.Bot) -> None:
+    """Logs the start, end and errors of every prefix command."""
+    started: Dict[int, float] = {}
+
+    def command_fields(context: commands.Context) -> Dict[str, Any]:
+        return {"guild_id": context.guild.id if context.guild is not None else None,
+                "command": context.command.qualified_name if context.command is not None else context.invoked_with,
+                "author_id": context.author.id,
+                "channel_id": context.channel.id}
+
+    async def on_command(context: commands.Context) -> None:
+        started[id(context)] = time.perf_counter()
+        # Dispatched before the arguments are converted, so the raw message is logged instead.
+        log_event("command_started", **command_fields(context), content=context.message.content[:200])
+
+    async def on_command_completion(context: commands.Context) -> None:
+        seconds = time.perf_counter() - started.pop(id(context), time.perf_counter())
+        log_event("command_finished", **command_fields(context), seconds=round(seconds, 3))
+
+    async def on_command_error(context: commands.Context, error: commands.CommandError) -> None:
+        seconds = time.perf_counter() - started.pop(id(context), time.perf_counter())
+        if isinstance(error, commands.CommandNotFound):
+            return
+        original = getattr(error, "original", error)
+        log_event("command_failed", logging.ERROR, exc_info=(type(original), original, original.__traceback__),
+                  **command_fields(context), seconds=round(seconds, 3), error=str(original))
+
+    bot.add_listener(on_command)
+    bot.add_listener(on_command_completion)
+    bot.add_listener(on_command_error)
@@ -0,0 +1,467 @@
+"""An in-memory stand-in for the parts of the discord.py Guild, Role, Channel and Member surface the bot uses.
+Every method that would be a REST call goes through FakeApi, which counts it, adds the configured latency
+and simulates 429 rate limits the way discord.py handles them (by waiting out the retry delay)."""
+import asyncio
+import discord
+import itertools
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Union
+
+_snowflakes = itertools.count(1 << 32)
+
+
+def snowflake() -> int:
+    return next(_snowflakes) << 22
+
+
+class FakeApi:
+    """Counts REST calls and simulates latency and a global rate limit of rate_limit calls per rate_window."""
+
+    def __init__(self, latency: float = 0.0, rate_limit: Optional[int] = None, rate_window: float = 1.0) -> None:
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.calls = 0
+        self.routes: Counter = Counter()
+        self.rate_limited = 0
+        self.rate_limit_wait = 0.0
+        self.window_start = time.monotonic()
+        self.window_calls = 0
+
+    def reset(self) -> None:
+        self.calls = 0
+        self.routes.clear()
+        self.rate_limited = 0
+        self.rate_limit_wait = 0.0
+
+    async def request(self, route: str) -> None:
+        self.calls += 1
+        self.routes[route] += 1
+        while self.rate_limit is not None:
+            now = time.monotonic()
+            if now - self.window_start >= self.rate_window:
+                self.window_start, self.window_calls = now, 0
+            if self.window_calls < self.rate_limit:
+                self.window_calls += 1
+                break
+            retry_after = self.window_start + self.rate_window - now
+            self.rate_limited += 1
+            self.rate_limit_wait += retry_after
+            await asyncio.sleep(retry_after)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+
+class FakeObject:
+    """Base of every fake. The fakes also subclass the discord.py class they stand in for, so isinstance checks
+    keep working; the slots and read-only properties of those classes are shadowed by plain class attributes."""
+
+    def __init__(self, guild: Optional["FakeGuild"], name: str) -> None:
+        self.id = snowflake()
+        self.guild = guild
+        self.name = name
+
+    @property
+    def api(self) -> FakeApi:
+        return self.guild.api
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, FakeObject) and other.id == self.id
+
+    def __hash__(self) -> int:
+        return self.id >> 22
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} id={self.id} name={self.name!r}>"
+
+
+class FakeRole(FakeObject, discord.Role):
+    id = guild = name = permissions = colour = position = managed = None
+
+    def __init__(self, guild: "FakeGuild", name: str, permissions: Optional[discord.Permissions] = None,
+                 colour: Optional[discord.Colour] = None) -> None:
+        FakeObject.__init__(self, guild, name)
+        self.permissions = permissions or discord.Permissions.none()
+        self.colour = colour or discord.Colour.default()
+        self.position = len(guild.roles)
+        self.managed = False
+
+    @property
+    def members(self) -> List["FakeMember"]:
+        return [member for member in self.guild.members if self in member.roles]
+
+    @property
+    def mention(self) -> str:
+        return f"<@&{self.id}>"
+
+    async def edit(self, *, name: Optional[str] = None, colour: Optional[discord.Colour] = None,
+                   permissions: Optional[discord.Permissions] = None, **_) -> "FakeRole":
+        await self.api.request("role.edit")
+        if name is not None:
+            self.name = name
+        if colour is not None:
+            self.colour = colour
+        if permissions is not None:
+            self.permissions = permissions
+        return self
+
+    async def delete(self, **_) -> None:
+        await self.api.request("role.delete")
+        self.guild.remove_role(self)
+
+
+class FakeMessage(FakeObject):
+    def __init__(self, channel: "FakeTextChannel", author: Optional["FakeMember"], content: Optional[str],
+                 embed: Optional[discord.Embed] = None,
+                 attachments: Optional[List["FakeAttachment"]] = None) -> None:
+        FakeObject.__init__(self, channel.guild, "")
+        self.channel = channel
+        self.author = author
+        self.content = content or ""
+        self.embeds = [embed] if embed is not None else []
+        self.attachments = attachments or []
+        self.created_at = discord.utils.snowflake_time(self.id)
+        self.edited_at = None
+        self.reference = None
+
+    @property
+    def api(self) -> FakeApi:
+        return self.channel.api
+
+    async def edit(self, *, content: Optional[str] = None, embed: Optional[discord.Embed] = None, **_) -> None:
+        await self.api.request("message.edit")
+        if content is not None:
+            self.content = content
+        if embed is not None:
+            self.embeds = [embed]
+
+
+class FakeAttachment:
+    def __init__(self, filename: str, data: bytes) -> None:
+        self.id = snowflake()
+        self.filename = filename
+        self.data = data
+        self.size = len(data)
+        self.url = f"https://cdn.invalid/attachments/{self.id}/{filename}"
+
+    async def read(self) -> bytes:
+        return self.data
+
+
+class FakeMessageable:
+    """Sending and history for text and DM channels. Messages are only kept when keep_messages is set."""
+    keep_messages = False
+
+    def _init_messages(self) -> None:
+        self.messages: List[FakeMessage] = []
+        self.sent = 0
+
+    async def send(self, content: Optional[str] = None, *, embed: Optional[discord.Embed] = None,
+                   **_) -> FakeMessage:
+        await self.api.request("channel.send")
+        self.sent += 1
+        message = FakeMessage(self, None, content, embed)
+        if self.keep_messages:
+            self.messages.append(message)
+        return message
+
+    async def history(self, *, limit: Optional[int] = 100, after: Optional[discord.abc.Snowflake] = None,
+                      oldest_first: Optional[bool] = None, **_):
+        messages = [message for message in self.messages if after is None or message.id > after.id]
+        if not oldest_first:
+            messages.reverse()
+        for index, message in enumerate(messages[:limit]):
+            if index % 100 == 0:
+                await self.api.request("channel.history")
+            yield message
+
+
+class FakeGuildChannel(FakeObject):
+    channel_type = discord.ChannelType.text
+    category = overwrites = position = None
+
+    def __init__(self, guild: "FakeGuild", name: str, category: Optional["FakeCategoryChannel"] = None,
+                 overwrites: Optional[Dict] = None, position: Optional[int] = None) -> None:
+        FakeObject.__init__(self, guild, name)
+        self.category = category
+        self.overwrites = dict(overwrites or {})
+        self.position = len(guild.channels) if position is None else position
+
+    @property
+    def type(self) -> discord.ChannelType:
+        return self.channel_type
+
+    @property
+    def category_id(self) -> Optional[int]:
+        return None if self.category is None else self.category.id
+
+    @property
+    def mention(self) -> str:
+        return f"<#{self.id}>"
+
+    def overwrites_for(self, target: Union[FakeRole, "FakeMember"]) -> discord.PermissionOverwrite:
+        return self.overwrites.get(target, discord.PermissionOverwrite())
+
+    async def set_permissions(self, target: Union[FakeRole, "FakeMember"], *,
+                              overwrite: Optional[discord.PermissionOverwrite] = discord.utils.MISSING,
+                              **permissions) -> None:
+        await self.api.request("channel.set_permissions")
+        if overwrite is discord.utils.MISSING:
+            overwrite = self.overwrites_for(target)
+            overwrite.update(**permissions)
+        if overwrite is None or overwrite.is_empty():
+            self.overwrites.pop(target, None)
+        else:
+            self.overwrites[target] = overwrite
+
+    async def edit(self, *, name: Optional[str] = None, category: Optional["FakeCategoryChannel"] = None,
+                   overwrites: Optional[Dict] = None, sync_permissions: bool = False,
+                   position: Optional[int] = None, **_) -> "FakeGuildChannel":
+        await self.api.request("channel.edit")
+        if name is not None:
+            self.name = name
+        if position is not None:
+            self.position = position
+        if category is not None:
+            self.guild.move_channel(self, category)
+        if sync_permissions and self.category is not None:
+            self.overwrites = dict(self.category.overwrites)
+        if overwrites is not None:
+            self.overwrites = dict(overwrites)
+        return self
+
+    async def delete(self, **_) -> None:
+        await self.api.request("channel.delete")
+        self.guild.remove_channel(self)
+
+
+class FakeTextChannel(FakeMessageable, FakeGuildChannel, discord.TextChannel):
+    id = guild = name = None
+
+    def __init__(self, *args, **kwargs) -> None:
+        FakeGuildChannel.__init__(self, *args, **kwargs)
+        self._init_messages()
+
+
+class FakeVoiceChannel(FakeGuildChannel, discord.VoiceChannel):
+    id = guild = name = None
+    channel_type = discord.ChannelType.voice
+
+
+class FakeCategoryChannel(FakeGuildChannel, discord.CategoryChannel):
+    id = guild = name = None
+    channel_type = discord.ChannelType.category
+    channels = None
+
+    def __init__(self, *args, **kwargs) -> None:
+        FakeGuildChannel.__init__(self, *args, **kwargs)
+        self.channels: List[FakeGuildChannel] = []
+
+    @property
+    def text_channels(self) -> List[FakeTextChannel]:
+        return [channel for channel in self.channels if isinstance(channel, FakeTextChannel)]
+
+    @property
+    def voice_channels(self) -> List[FakeVoiceChannel]:
+        return [channel for channel in self.channels if isinstance(channel, FakeVoiceChannel)]
+
+
+class FakeDMChannel(FakeMessageable):
+    def __init__(self, api: FakeApi, recipient: "FakeMember") -> None:
+        self.id = snowflake()
+        self.api = api
+        self.recipient = recipient
+        self.guild = None
+        self._init_messages()
+
+
+class FakeMember(FakeObject, discord.Member):
+    id = guild = name = discriminator = roles = dm_channel = bot = None
+
+    def __init__(self, guild: "FakeGuild", name: str, discriminator: str = "0", closed_dms: bool = False) -> None:
+        FakeObject.__init__(self, guild, name)
+        self.discriminator = discriminator
+        self.roles: List[FakeRole] = [guild.default_role]
+        self.dm_channel: Optional[FakeDMChannel] = None
+        self.closed_dms = closed_dms
+        self.bot = False
+
+    @property
+    def display_name(self) -> str:
+        return self.name
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self.id}>"
+
+    @property
+    def mutual_guilds(self) -> List["FakeGuild"]:
+        return [self.guild]
+
+    async def add_roles(self, *roles: FakeRole, **_) -> None:
+        for role in roles:
+            await self.api.request("member.add_role")
+            if role not in self.roles:
+                self.roles.append(role)
+
+    async def remove_roles(self, *roles: FakeRole, **_) -> None:
+        for role in roles:
+            await self.api.request("member.remove_role")
+            if role in self.roles:
+                self.roles.remove(role)
+
+    async def edit(self, *, roles: Optional[Iterable[FakeRole]] = None, **_) -> None:
+        await self.api.request("member.edit")
+        if roles is not None:
+            self.roles = [self.guild.default_role] + [role for role in roles if role != self.guild.default_role]
+
+    async def create_dm(self) -> FakeDMChannel:
+        await self.api.request("user.create_dm")
+        self.dm_channel = FakeDMChannel(self.api, self)
+        return self.dm_channel
+
+    async def send(self, content: Optional[str] = None, **kwargs) -> FakeMessage:
+        channel = self.dm_channel or await self.create_dm()
+        return await channel.send(content, **kwargs)
+
+
+class FakeGuild:
+    def __init__(self, name: str = "Bench Guild", api: Optional[FakeApi] = None) -> None:
+        self.id = snowflake()
+        self.name = name
+        self.api = api or FakeApi()
+        self.roles: List[FakeRole] = []
+        self.default_role = FakeRole(self, "@everyone")
+        self.roles.append(self.default_role)
+        self.members: List[FakeMember] = []
+        self.channels: List[FakeGuildChannel] = []
+        self._members: Dict[int, FakeMember] = {}
+        self._roles: Dict[int, FakeRole] = {self.default_role.id: self.default_role}
+        self._channels: Dict[int, FakeGuildChannel] = {}
+
+    def __repr__(self) -> str:
+        return f"<FakeGuild id={self.id} name={self.name!r}>"
+
+    @property
+    def categories(self) -> List[FakeCategoryChannel]:
+        return [channel for channel in self.channels if isinstance(channel, FakeCategoryChannel)]
+
+    @property
+    def text_channels(self) -> List[FakeTextChannel]:
+        return [channel for channel in self.channels if isinstance(channel, FakeTextChannel)]
+
+    @property
+    def member_count(self) -> int:
+        return len(self.members)
+
+    def get_member(self, member_id: int) -> Optional[FakeMember]:
+        return self._members.get(member_id)
+
+    def get_role(self, role_id: int) -> Optional[FakeRole]:
+        return self._roles.get(role_id)
+
+    def get_channel(self, channel_id: int) -> Optional[FakeGuildChannel]:
+        return self._channels.get(channel_id)
+
+    def add_member(self, name: str, discriminator: str = "0", closed_dms: bool = False) -> FakeMember:
+        """Adds a member without any REST call, for setting up a benchmark guild."""
+        member = FakeMember(self, name, discriminator, closed_dms)
+        self.members.append(member)
+        self._members[member.id] = member
+        return member
+
+    def add_role(self, name: str, permissions: Optional[discord.Permissions] = None) -> FakeRole:
+        """Adds a role without any REST call, for setting up a benchmark guild."""
+        role = FakeRole(self, name, permissions)
+        self.roles.append(role)
+        self._roles[role.id] = role
+        return role
+
+    def add_channel(self, channel_class: type, name: str, category: Optional[FakeCategoryChannel] = None,
+                    overwrites: Optional[Dict] = None, position: Optional[int] = None) -> FakeGuildChannel:
+        """Adds a channel without any REST call, for setting up a benchmark guild."""
+        channel = channel_class(self, name, category, overwrites, position)
+        if channel_class is not FakeCategoryChannel:
+            # Discord normalises text channel names the same way.
+            channel.name = name if channel_class is FakeVoiceChannel else name.lower().replace(" ", "-")
+        self.channels.append(channel)
+        self._channels[channel.id] = channel
+        if category is not None:
+            category.channels.append(channel)
+        return channel
+
+    def move_channel(self, channel: FakeGuildChannel, category: FakeCategoryChannel) -> None:
+        if channel.category is not None:
+            channel.category.channels.remove(channel)
+        channel.category = category
+        category.channels.append(channel)
+
+    def remove_channel(self, channel: FakeGuildChannel) -> None:
+        self.channels.remove(channel)
+        del self._channels[channel.id]
+        if channel.category is not None and channel in channel.category.channels:
+            channel.category.channels.remove(channel)
+        if isinstance(channel, FakeCategoryChannel):
+            for child in channel.channels:
+                child.category = None
+
+    def remove_role(self, role: FakeRole) -> None:
+        self.roles.remove(role)
+        del self._roles[role.id]
+        for member in role.members:
+            member.roles.remove(role)
+
+    async def create_role(self, *, name: str, permissions: Optional[discord.Permissions] = None,
+                          colour: Optional[discord.Colour] = None, **_) -> FakeRole:
+        await self.api.request("guild.create_role")
+        role = self.add_role(name, permissions)
+        if colour is not None:
+            role.colour = colour
+        return role
+
+    async def create_category(self, name: str, *, overwrites: Optional[Dict] = None,
+                              **_) -> FakeCategoryChannel:
+        await self.api.request("guild.create_channel")
+        return self.add_channel(FakeCategoryChannel, name, None, overwrites)
+
+    async def create_text_channel(self, name: str, *, category: Optional[FakeCategoryChannel] = None,
+                                  overwrites: Optional[Dict] = None, position: Optional[int] = None,
+                                  **_) -> FakeTextChannel:
+        await self.api.request("guild.create_channel")
+        return self.add_channel(FakeTextChannel, name, category, overwrites, position)
+
+    async def create_voice_channel(self, name: str, *, category: Optional[FakeCategoryChannel] = None,
+                                   overwrites: Optional[Dict] = None, position: Optional[int] = None,
+                                   **_) -> FakeVoiceChannel:
+        await self.api.request("guild.create_channel")
+        return self.add_channel(FakeVoiceChannel, name, category, overwrites, position)
+
+    async def query_members(self, query: Optional[str] = None, *, limit: int = 5,
+                            user_ids: Optional[List[int]] = None, **_) -> List[FakeMember]:
+        """Gateway member search. Not a REST call, but it is a round trip, so it is counted the same way."""
+        await self.api.request("gateway.query_members")
+        if user_ids is not None:
+            return [self._members[member_id] for member_id in user_ids if member_id in self._members][:limit]
+        query = (query or "").casefold()
+        return [member for member in self.members if member.name.casefold().startswith(query)][:limit]
+
+    async def fetch_members(self, *, limit: Optional[int] = 1000, **_):
+        for index, member in enumerate(self.members[:limit]):
+            if index % 1000 == 0:
+                await self.api.request("guild.fetch_members")
+            yield member
+
+
+class FakeContext:
+    """What the prefix commands in main.py receive as their first argument."""
+
+    def __init__(self, guild: FakeGuild, author: FakeMember, channel: FakeTextChannel,
+                 attachments: Optional[List[FakeAttachment]] = None) -> None:
+        self.guild = guild
+        self.author = author
+        self.channel = channel
+        self.message = FakeMessage(channel, author, "", attachments=attachments)
+
+    async def send(self, content: Optional[str] = None, **kwargs) -> FakeMessage:
+        return await self.channel.send(content, **kwargs)
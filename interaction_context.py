@@ -0,0 +1,47 @@
+import discord
+from typing import Any, List, NamedTuple, Optional
+
+
+class InteractionChannel:
+    """Stands in for message.channel when a command runs as a slash command. The response was deferred as soon
+    as the command arrived, so everything the command sends goes out as a follow-up to it."""
+
+    def __init__(self, interaction: discord.Interaction) -> None:
+        self.interaction = interaction
+        self.id = interaction.channel_id
+        self.sent = 0
+
+    @property
+    def mention(self) -> str:
+        return f"<#{self.id}>"
+
+    async def send(self, content: Optional[str] = None, *, embed: Optional[discord.Embed] = None,
+                   **_: Any) -> discord.WebhookMessage:
+        self.sent += 1
+        if embed is None:
+            return await self.interaction.followup.send(content, wait=True)
+        return await self.interaction.followup.send(content or "", embed=embed, wait=True)
+
+
+class InteractionMessage(NamedTuple):
+    attachments: List[discord.Attachment]
+
+
+class InteractionContext:
+    """What the prefix commands in main.py receive as their first argument, built from a slash command."""
+
+    def __init__(self, interaction: discord.Interaction,
+                 attachments: Optional[List[discord.Attachment]] = None) -> None:
+        self.guild = interaction.guild
+        self.author = interaction.user
+        self.channel = InteractionChannel(interaction)
+        self.message = InteractionMessage(attachments or [])
+
+    async def send(self, content: Optional[str] = None, **kwargs: Any) -> discord.WebhookMessage:
+        return await self.channel.send(content, **kwargs)
+
+
+async def send_please_wait(channel: discord.abc.Messageable, content: str) -> None:
+    """Tells the user that a slow command has started. Slash commands already show that while deferred."""
+    if not isinstance(channel, InteractionChannel):
+        await channel.send(content)
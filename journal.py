@@ -0,0 +1,130 @@
+import sqlite3
+import time
+from typing import Dict, List, Optional
+from campaign_registry import registry
+
+RUNNING = "running"
+FAILED = "failed"
+DONE = "done"
+ROLLED_BACK = "rolled back"
+
+CREATE = "create"
+DELETE = "delete"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS operations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    guild_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    campaign_name TEXT NOT NULL,
+    author_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    started_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS operation_steps (
+    operation_id INTEGER NOT NULL REFERENCES operations(id) ON DELETE CASCADE,
+    step TEXT NOT NULL,
+    object_id INTEGER,
+    done INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (operation_id, step)
+);
+"""
+
+
+class Operation:
+    """A multi-step campaign operation. steps maps each step to the ID of the object it created or will delete,
+    in the order the steps were journaled; done holds the steps that have been carried out."""
+
+    def __init__(self, operation_id: int, guild_id: int, kind: str, campaign_name: str,
+                 author_id: int, channel_id: int, state: str) -> None:
+        self.id = operation_id
+        self.guild_id = guild_id
+        self.kind = kind
+        self.campaign_name = campaign_name
+        self.author_id = author_id
+        self.channel_id = channel_id
+        self.state = state
+        self.steps: Dict[str, Optional[int]] = {}
+        self.done: Dict[str, bool] = {}
+
+    def is_done(self, step: str) -> bool:
+        return self.done.get(step, False)
+
+
+class Journal:
+    """A write-ahead journal of campaign operations. Every step is committed before the operation moves on,
+    so after an error or a restart an operation can be resumed or rolled back without repeating API calls."""
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.connection = connection
+        self.connection.executescript(SCHEMA)
+
+    def begin(self, guild_id: int, kind: str, campaign_name: str, author_id: int, channel_id: int) -> Operation:
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO operations (guild_id, kind, campaign_name, author_id, channel_id, state, started_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (guild_id, kind, campaign_name, author_id, channel_id, RUNNING, time.time()))
+        return Operation(cursor.lastrowid, guild_id, kind, campaign_name, author_id, channel_id, RUNNING)
+
+    def _write_step(self, operation: Operation, step: str, object_id: Optional[int], done: bool) -> None:
+        position = list(operation.steps).index(step) if step in operation.steps else len(operation.steps)
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO operation_steps VALUES (?, ?, ?, ?, ?)",
+                                    (operation.id, step, object_id, int(done), position))
+        operation.steps[step] = object_id
+        operation.done[step] = done
+
+    def plan(self, operation: Operation, step: str, object_id: Optional[int]) -> None:
+        """Journals a step that has not been carried out yet."""
+        self._write_step(operation, step, object_id, False)
+
+    def record(self, operation: Operation, step: str, object_id: Optional[int] = None) -> None:
+        """Journals a completed step and the ID of the object it produced."""
+        self._write_step(operation, step, object_id if object_id is not None else operation.steps.get(step), True)
+
+    def undo(self, operation: Operation, step: str) -> None:
+        """Journals that a completed step has been rolled back."""
+        self._write_step(operation, step, operation.steps.get(step), False)
+
+    def set_state(self, operation: Operation, state: str) -> None:
+        with self.connection:
+            self.connection.execute("UPDATE operations SET state = ? WHERE id = ?", (state, operation.id))
+        operation.state = state
+
+    def mark_interrupted(self, shard_ids: Optional[List[int]] = None,
+                         shard_count: Optional[int] = None) -> List[Operation]:
+        """Marks the operations a previous run of the bot left running as failed, and returns them. Only called at
+        startup. A process that only runs some of the shards only marks the operations of their guilds, since the
+        other processes sharing the journal may still be running theirs."""
+        query = ("SELECT id, guild_id, kind, campaign_name, author_id, channel_id, state FROM operations "
+                 "WHERE state = ?")
+        parameters = [RUNNING]
+        if shard_ids is not None and shard_count is not None:
+            query += f" AND ((guild_id >> 22) % ?) IN ({', '.join('?' * len(shard_ids))})"
+            parameters += [shard_count, *shard_ids]
+        with self.connection:
+            rows = self.connection.execute(query + " ORDER BY id", parameters).fetchall()
+            self.connection.executemany("UPDATE operations SET state = ? WHERE id = ?",
+                                        [(FAILED, row[0]) for row in rows])
+        return [self._load(row[:-1] + (FAILED,)) for row in rows]
+
+    def get(self, guild_id: int, operation_id: int) -> Optional[Operation]:
+        row = self.connection.execute("SELECT id, guild_id, kind, campaign_name, author_id, channel_id, state "
+                                      "FROM operations WHERE id = ? AND guild_id = ?",
+                                      (operation_id, guild_id)).fetchone()
+        return None if row is None else self._load(row)
+
+    def _load(self, row: tuple) -> Operation:
+        operation = Operation(*row)
+        for step, object_id, done in self.connection.execute(
+                "SELECT step, object_id, done FROM operation_steps WHERE operation_id = ? ORDER BY position",
+                (operation.id,)):
+            operation.steps[step] = object_id
+            operation.done[step] = bool(done)
+        return operation
+
+
+journal = Journal(registry.connection)
@@ -0,0 +1,102 @@
+"""Runs the bot's shards split over several processes.
+
+Every process runs main.py as an AutoShardedBot with its own RPG_SHARD_IDS, so a busy guild only ever shares its
+connection and event loop with the guilds of the same process. Each process gets its own metrics port and log
+directory. A process that exits is started again after RESTART_DELAY seconds.
+"""
+import argparse
+import asyncio
+import discord
+import os
+import signal
+import subprocess
+import sys
+import time
+from dotenv import load_dotenv
+from typing import Dict, List
+
+# Discord lets a bot identify one shard about every five seconds, so processes are started that far apart per shard.
+IDENTIFY_INTERVAL = 5.0
+RESTART_DELAY = 10.0
+POLL_INTERVAL = 1.0
+
+
+async def recommended_shard_count(token: str) -> int:
+    client = discord.Client(intents=discord.Intents.none())
+    try:
+        await client.login(token)
+        shard_count, _, _ = await client.http.get_bot_gateway()
+    finally:
+        await client.close()
+    return shard_count
+
+
+def split_shards(shard_count: int, processes: int) -> List[List[int]]:
+    return [shard_ids for shard_ids in (list(range(index, shard_count, processes)) for index in range(processes))
+            if shard_ids]
+
+
+def process_environment(index: int, shard_ids: List[int], shard_count: int) -> Dict[str, str]:
+    environment = dict(os.environ)
+    environment.update(RPG_SHARD_COUNT=str(shard_count),
+                       RPG_SHARD_IDS=",".join(map(str, shard_ids)),
+                       RPG_METRICS_PORT=str(int(os.getenv("RPG_METRICS_PORT", "9108")) + index),
+                       RPG_LOG_DIR=os.path.join(os.getenv("RPG_LOG_DIR", "logs"), f"process-{index}"))
+    return environment
+
+
+def start_process(index: int, shard_ids: List[int], shard_count: int) -> subprocess.Popen:
+    print(f"Starting process {index} with shards {', '.join(map(str, shard_ids))} of {shard_count}.")
+    return subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")],
+                            env=process_environment(index, shard_ids, shard_count))
+
+
+def supervise(shards: List[List[int]], shard_count: int) -> None:
+    """Starts every process, restarts the ones that exit and stops them all on SIGINT or SIGTERM."""
+    stopping = False
+
+    def stop(*_) -> None:
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    processes: Dict[int, subprocess.Popen] = {}
+    restart_at: Dict[int, float] = {}
+    for index, shard_ids in enumerate(shards):
+        if stopping:
+            break
+        processes[index] = start_process(index, shard_ids, shard_count)
+        time.sleep(IDENTIFY_INTERVAL * len(shard_ids))
+
+    while not stopping:
+        time.sleep(POLL_INTERVAL)
+        for index, process in list(processes.items()):
+            if index not in restart_at and process.poll() is not None:
+                print(f"Process {index} exited with {process.returncode}, restarting it in {RESTART_DELAY:.0f}s.")
+                restart_at[index] = time.monotonic() + RESTART_DELAY
+            elif index in restart_at and time.monotonic() >= restart_at[index]:
+                del restart_at[index]
+                processes[index] = start_process(index, shards[index], shard_count)
+
+    for process in processes.values():
+        if process.poll() is None:
+            process.terminate()
+    for process in processes.values():
+        process.wait()
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--shards", type=int, default=None,
+                        help="The total number of shards. Defaults to the number discord recommends.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    load_dotenv()
+    shard_count = arguments.shards or asyncio.run(recommended_shard_count(os.getenv("DISCORD_TOKEN")))
+    supervise(split_shards(shard_count, arguments.processes), shard_count)
@@ -1,10 +1,30 @@
 import discord
+import hashlib
+import logging
+import time
 from discord.ext import commands
 from os import getenv
+from typing import Awaitable, Callable, Hashable, List, Tuple
 from dotenv import load_dotenv
-from campaign_management import create_campaign, delete_campaign, rename_campaign
+from campaign_management import (create_campaign, delete_campaign, load_guild_template, rename_campaign,
+                                 resume_operation, rollback_operation)
 from player_management import bulk_add_players, bulk_remove_players
-from role_management import set_role_colour, send_role_dm
+from role_management import set_role_colour, set_role_colours, send_role_dm, cancel_role_dm
+from campaign_registry import name_key, rebuild_registry, registry, resolve_campaign
+from reconciler import apply_repairs, plan_campaign
+from archive import archive_campaign, describe_archive
+from manifest import MAX_MANIFEST_SIZE, parse_colour, parse_manifest, run_manifest
+from palette import MAX_PALETTE_SIZE, apply_palette, parse_palette, resolve_palette
+from templates import TemplateError
+from interaction_context import send_please_wait
+from slash_commands import add_slash_commands
+from member_index import LOW_MEMORY_MODE, member_index
+from auth_cache import auth_cache
+from journal import CREATE, DONE, ROLLED_BACK, Operation, journal
+from metrics import instrument_bot, metrics, start_metrics
+from event_log import instrument_commands, log_event, recent_events, start_logging
+from scheduler import MAX_QUEUED_JOBS, RUNNING, scheduler
+from sharding import SHARD_COUNT, SHARD_IDS, create_bot, describe_shards
 
 load_dotenv()
 TOKEN = getenv('DISCORD_TOKEN')
@@ -12,59 +32,268 @@ intents = discord.Intents.default()
 intents.all()
 intents.messages = True
 intents.members = True
-bot = commands.Bot(command_prefix='R!', intents=intents)
+if LOW_MEMORY_MODE:
+    # Members are fetched when a command names them, and no messages are cached at all.
+    bot = create_bot(command_prefix='R!', intents=intents, member_cache_flags=discord.MemberCacheFlags.none(),
+                     chunk_guilds_at_startup=False, max_messages=None)
+else:
+    bot = create_bot(command_prefix='R!', intents=intents)
+instrument_bot(bot)
+instrument_commands(bot)
+add_slash_commands(bot)
 #ToDo: More testing!
-#ToDo: Create a logging system.
 
 
 async def validate_role(message: discord.Message, role_name: str) -> bool:
     """Used to validate whether a user has the required role in the case of campaign creation / moderation."""
-    # Todo: Make this smarter -> Perhaps implement a database to correlate campaign_name with role_name.
-    for role in message.author.roles:
-        if role.name == role_name:
-            return True
+    if auth_cache.has_role(message.author, role_name):
+        return True
     await message.channel.send(f"You do not have the {role_name} role required for this command.")
     return False
 
 
+async def validate_campaign_dm(message: discord.Message, campaign_name: str) -> bool:
+    """Validates that the user holds the registered Dungeon Master role of the campaign.
+    Checked by role ID, so a role that was merely named like it does not pass."""
+    if auth_cache.is_campaign_dm(message.author, campaign_name):
+        return True
+    await message.channel.send(f"You do not have the {campaign_name} Dungeon Master role required for this command.")
+    return False
+
+
 async def is_name_unique(message: discord.Message, channel_name: str) -> bool:
-    # Todo: Consider how to improve this.
-    for category in message.guild.categories:
-        if channel_name.lower() == category.name.lower():
-            return False
-    return True
+    return not auth_cache.category_exists(message.guild, channel_name)
+
+
+async def run_campaign_job(message: discord.Message, campaign_names: Tuple[str, ...], description: str,
+                           operation: Callable[[], Awaitable[None]], content: Hashable = None) -> None:
+    """Runs a campaign command through the server's scheduler, so that commands touching the same campaign never
+    interleave. The same command from the same author that has not finished yet is merged with this one instead
+    of running twice. content tells apart commands that only differ by their attached file, e.g. its hash."""
+    job = scheduler.for_guild(message.guild).submit(campaign_names, description,
+                                                    (description, message.author.id, content), operation)
+    if job is None:
+        await message.channel.send(f"There are already {MAX_QUEUED_JOBS} campaign commands waiting in this server, "
+                                   f"please try again once some of them have finished.")
+        return None
+
+    if job.merged:
+        await message.channel.send(f"The same command is already waiting or running, it will only be done once.")
+    await job.wait()
 
 
 @bot.command()
 async def campaign_create(message: discord.Message, campaign_name: str) -> None:
     """Creates the category and all chat channels for a D&D Campaign.
     The message author is then promoted to the Campaign's Dungeon Master Role."""
-    if not await validate_role(message, "Dungeon Master") or not await is_name_unique(message, campaign_name):
+    if not await validate_role(message, "Dungeon Master"):
         return None
 
-    await create_campaign(message, campaign_name)
+    async def operation() -> None:
+        # Checked inside the job, so two creations of the same name cannot both pass the check.
+        if not await is_name_unique(message, campaign_name):
+            await message.channel.send(f"Error: A category named {campaign_name} already exists.")
+            return None
+        await create_campaign(message, campaign_name)
+
+    await run_campaign_job(message, (campaign_name,), f"campaign_create {campaign_name}", operation)
 
 
 @bot.command()
-async def campaign_delete(message: discord.Message, campaign_name: str) -> None:
-    """Deletes the given campaign category, along with all the channels and roles."""
-    if not await validate_role(message, f"{campaign_name} Dungeon Master"):
+async def campaign_delete(message: discord.Message, campaign_name: str, mode: str = "") -> None:
+    """Deletes the given campaign category, along with all the channels and roles.
+    With the "archive" mode the campaign's message history is archived first."""
+    if not await validate_campaign_dm(message, campaign_name):
+        return None
+
+    await run_campaign_job(message, (campaign_name,), f"campaign_delete {campaign_name} {mode}".rstrip(),
+                           lambda: delete_campaign(message, campaign_name, mode == "archive"))
+
+
+@bot.command()
+async def campaign_archive(message: discord.Message, campaign_name: str) -> None:
+    """Exports the message history of the campaign's text channels to a compressed archive on the bot's host.
+    Running it again continues from the last archived message of every channel."""
+    server = message.guild
+    if server is None:
+        await message.channel.send("Something went wrong while trying to archive the campaign.")
+        return None
+
+    if not await validate_campaign_dm(message, campaign_name):
         return None
 
-    await delete_campaign(message, campaign_name)
+    async def operation() -> None:
+        campaign = resolve_campaign(server, campaign_name)
+        if campaign is None:
+            await message.channel.send(f"No campaign by the name of {campaign_name} exists.")
+            return None
+        await send_please_wait(message.channel, f"Archiving {campaign_name}, please wait until an error or "
+                                                f"success message is returned.")
+        try:
+            result = await archive_campaign(server, campaign)
+        except (discord.HTTPException, OSError) as error:
+            await message.channel.send(f"Error: Archiving {campaign_name} failed ({error}). Run the command again "
+                                       f"to continue where it stopped.")
+            return None
+        await message.channel.send(describe_archive(campaign_name, result))
+
+    await run_campaign_job(message, (campaign_name,), f"campaign_archive {campaign_name}", operation)
 
 
 @bot.command()
 async def campaign_rename(message: discord.Message, campaign_name: str, new_name: str) -> None:
     """Renames the given campaign category, along with all the roles."""
-    if not await validate_role(message, f"{campaign_name} Dungeon Master"):
+    if not await validate_campaign_dm(message, campaign_name):
+        return None
+
+    async def operation() -> None:
+        if not await is_name_unique(message, new_name):
+            await message.channel.send(f"Error: A category named {new_name} already exists.")
+            return None
+        await rename_campaign(message, campaign_name, new_name)
+
+    await run_campaign_job(message, (campaign_name, new_name), f"campaign_rename {campaign_name} -> {new_name}",
+                           operation)
+
+
+async def run_journaled_operation(message: discord.Message, operation_id: int, rollback: bool) -> None:
+    server = message.guild
+    if server is None:
+        await message.channel.send("Something went wrong while trying to find the operation.")
+        return None
+
+    if not await validate_role(message, "Dungeon Master"):
+        return None
+
+    operation = journal.get(server.id, operation_id)
+    if operation is None:
+        await message.channel.send(f"No campaign operation #{operation_id} exists in this server.")
+        return None
+    # Both kinds of operation journal the campaign's Dungeon Master role, even before a creation registers it.
+    dm_role_id = operation.steps.get("dm_role")
+    if message.author.id != operation.author_id and all(role.id != dm_role_id for role in message.author.roles):
+        await message.channel.send(f"Only the author of operation #{operation_id} or a Dungeon Master of "
+                                   f"{operation.campaign_name} can {'roll it back' if rollback else 'resume it'}.")
         return None
 
-    if not await is_name_unique(message, new_name):
-        await message.channel.send(f"Error: A category named {new_name} already exists.")
+    async def operation_job() -> None:
+        # Reloaded inside the job, in case a resume or rollback of the same operation ran just before.
+        current = journal.get(server.id, operation_id)
+        if current.state in (DONE, ROLLED_BACK):
+            await message.channel.send(f"Operation #{operation_id} is already {current.state}.")
+        elif rollback:
+            await rollback_operation(message.channel, server, current)
+        else:
+            await resume_operation(message.channel, server, current)
+
+    await run_campaign_job(message, (operation.campaign_name,),
+                           f"campaign_{'rollback' if rollback else 'resume'} #{operation_id}", operation_job)
+
+
+@bot.command()
+async def campaign_resume(message: discord.Message, operation_id: int) -> None:
+    """Continues an interrupted campaign creation or deletion from its last completed step."""
+    await run_journaled_operation(message, operation_id, False)
+
+
+@bot.command()
+async def campaign_rollback(message: discord.Message, operation_id: int) -> None:
+    """Removes everything an interrupted campaign creation already created."""
+    await run_journaled_operation(message, operation_id, True)
+
+
+@bot.command()
+async def campaign_sync(message: discord.Message, campaign_name: str = "all", mode: str = "apply") -> None:
+    """Compares one campaign (or all of them) with the campaign template and repairs only what differs.
+    With the "dry" mode the repairs are listed instead of applied."""
+    server = message.guild
+    if server is None:
+        await message.channel.send("Something went wrong while trying to sync the campaigns.")
+        return None
+    if mode not in ("apply", "dry"):
+        # Anything else, such as a mistyped "dry-run", must not turn a dry run into a live one.
+        await message.channel.send(f"Unknown mode {mode}. Use R!campaign_sync \"<Campaign Name>\" dry to list the "
+                                   f"repairs, or leave the mode out (or use apply) to apply them.")
+        return None
+
+    if campaign_name == "all":
+        if not await validate_role(message, "Dungeon Master"):
+            return None
+        # Keyed by name, so that a campaign is never planned (and repaired) twice.
+        names = {name_key(record.name): record.name for record in registry.campaigns(server.id)}
+        campaign_names = tuple(names.values())
+    else:
+        if not await validate_campaign_dm(message, campaign_name):
+            return None
+        campaign_names = (campaign_name,)
+
+    template = await load_guild_template(message.channel, server)
+    if template is None:
         return None
 
-    await rename_campaign(message, campaign_name, new_name)
+    async def operation() -> None:
+        plan = []
+        missing = []
+        for name in campaign_names:
+            campaign = resolve_campaign(server, name)
+            if campaign is None:
+                missing.append(name)
+            else:
+                plan.extend(plan_campaign(server, campaign, template))
+
+        lines = [f"- {repair.description}" for repair in plan] or ["Everything already matches the template."]
+        if missing:
+            lines.append(f"Skipped because their category or roles are missing: {', '.join(missing)}.")
+        if mode == "apply":
+            failed = await apply_repairs(server, plan)
+            header = f"Applied {len(plan) - len(failed)} of {len(plan)} repairs ({len(plan)} API calls)"
+            header += f", {len(failed)} failed:" if failed else ":"
+            # Failures go first, so that a long list of repairs cannot push them out of the message.
+            lines[0:0] = [header] + [f"Failed: {repair.description} ({error})" for repair, error in failed]
+        else:
+            lines.insert(0, f"Would apply {len(plan)} repairs:")
+        await message.channel.send("\n".join(lines)[:2000])
+
+    await run_campaign_job(message, campaign_names, f"campaign_sync {campaign_name} {mode}", operation)
+
+
+@bot.command()
+async def campaign_manifest(message: discord.Message) -> None:
+    """Creates every campaign described in the attached manifest file, with its players and role colours,
+    as one parallel job, and reports the result of every step at the end."""
+    server = message.guild
+    if server is None:
+        await message.channel.send("Something went wrong while trying to run the manifest.")
+        return None
+
+    if not await validate_role(message, "Dungeon Master"):
+        return None
+
+    attachments = message.message.attachments
+    if len(attachments) != 1:
+        await message.channel.send("Please attach exactly one manifest file (.toml, .yaml or .json).")
+        return None
+    attachment = attachments[0]
+    if attachment.size > MAX_MANIFEST_SIZE:
+        await message.channel.send(f"The manifest may be at most {MAX_MANIFEST_SIZE // 1024} KiB.")
+        return None
+
+    content = await attachment.read()
+    try:
+        manifests = parse_manifest(attachment.filename, content)
+    except TemplateError as error:
+        await message.channel.send(f"Error: The manifest is invalid. {error}")
+        return None
+    template = await load_guild_template(message.channel, server)
+    if template is None:
+        return None
+
+    await send_please_wait(message.channel, f"Running {attachment.filename} for {len(manifests)} campaigns, "
+                                            f"please wait for the report.")
+    await run_campaign_job(message, tuple(manifest.name for manifest in manifests),
+                           f"campaign_manifest {attachment.filename}",
+                           lambda: run_manifest(server, message.author, message.channel, attachment.filename,
+                                                manifests, template), hashlib.sha256(content).digest())
 
 
 @bot.command()
@@ -75,16 +304,17 @@ async def player_add(message: discord.Message, campaign_name: str, *player_names
         await message.channel.send(f"Something went wrong while trying to add the player. :/")
         return None
 
-    if not await validate_role(message, f"{campaign_name} Dungeon Master"):
+    if not await validate_campaign_dm(message, campaign_name):
         return None
 
-    await bulk_add_players(server, campaign_name, player_names, message.channel)
+    await run_campaign_job(message, (campaign_name,), f"player_add {campaign_name}: {', '.join(player_names)}",
+                           lambda: bulk_add_players(server, campaign_name, player_names, message.channel))
 
 
 @bot.command()
 async def player_remove(message: discord.Message, campaign_name: str, *player_names: str) -> None:
     """Removes a given player from the campaign."""
-    if not await validate_role(message, f"{campaign_name} Dungeon Master"):
+    if not await validate_campaign_dm(message, campaign_name):
         return None
 
     server = message.guild
@@ -92,7 +322,8 @@ async def player_remove(message: discord.Message, campaign_name: str, *player_na
         await message.channel.send(f"Something went wrong while trying to remove the player. :/")
         return None
 
-    await bulk_remove_players(server, campaign_name, player_names, message.channel)
+    await run_campaign_job(message, (campaign_name,), f"player_remove {campaign_name}: {', '.join(player_names)}",
+                           lambda: bulk_remove_players(server, campaign_name, player_names, message.channel))
 
 
 @bot.command()
@@ -113,6 +344,78 @@ async def role_colour(message: discord.Message, role: discord.Role, new_colour_s
     await set_role_colour(role, colour)
 
 
+@bot.command()
+async def role_colours(message: discord.Message, campaign_name: str, player_colour: str,
+                       dm_colour: str = "") -> None:
+    """Sets the colours of a campaign's Player and Dungeon Master roles in one go."""
+    server = message.guild
+    if server is None:
+        await message.channel.send("Something went wrong while trying to set the role colours.")
+        return None
+
+    if not await validate_campaign_dm(message, campaign_name):
+        return None
+
+    campaign = resolve_campaign(server, campaign_name)
+    if campaign is None:
+        await message.channel.send(f"No campaign by the name of {campaign_name} exists.")
+        return None
+    try:
+        colours = {campaign.player_role: parse_colour(player_colour, "The Player colour")}
+        if dm_colour:
+            colours[campaign.dm_role] = parse_colour(dm_colour, "The Dungeon Master colour")
+    except TemplateError as error:
+        await message.channel.send(f"Invalid color code! {error}")
+        return None
+
+    errors = await set_role_colours(server, colours)
+    if errors:
+        await message.channel.send(f"Error: Discord refused to change {len(errors)} of the colours "
+                                   f"({', '.join(errors.values())}).")
+        return None
+    await message.channel.send(f"The role colours of {campaign_name} were set.")
+
+
+@bot.command()
+async def role_palette(message: discord.Message) -> None:
+    """Applies the attached palette file: sets the colours of many campaign roles and gives or takes away campaign
+    roles of many members, with a single call per role and per member. Only the roles of campaigns the author is
+    a Dungeon Master of can be changed."""
+    server = message.guild
+    if server is None:
+        await message.channel.send("Something went wrong while trying to apply the palette.")
+        return None
+
+    if not await validate_role(message, "Dungeon Master"):
+        return None
+
+    attachments = message.message.attachments
+    if len(attachments) != 1:
+        await message.channel.send("Please attach exactly one palette file (.toml, .yaml or .json).")
+        return None
+    attachment = attachments[0]
+    if attachment.size > MAX_PALETTE_SIZE:
+        await message.channel.send(f"The palette may be at most {MAX_PALETTE_SIZE // 1024} KiB.")
+        return None
+
+    content = await attachment.read()
+    try:
+        palette = await resolve_palette(server, parse_palette(attachment.filename, content))
+    except TemplateError as error:
+        await message.channel.send(f"Error: The palette is invalid. {error}")
+        return None
+    for record in palette.campaigns.values():
+        if not await validate_campaign_dm(message, record.name):
+            return None
+
+    async def operation() -> None:
+        await send_please_wait(message.channel, f"Applying {attachment.filename}, please wait for the summary.")
+        await message.channel.send(await apply_palette(server, palette))
+
+    await run_campaign_job(message, tuple(record.name for record in palette.campaigns.values()),
+                           f"role_palette {attachment.filename}", operation, hashlib.sha256(content).digest())
+
+
 @bot.command()
 async def role_send_message(message: discord.Message, role: discord.Role, to_send: str) -> None:
     """Sends a private message to each member of a given role. Does not work for @everyone."""
@@ -128,7 +431,134 @@ async def role_send_message(message: discord.Message, role: discord.Role, to_sen
         await message.channel.send("Nope. I won't message EVERYONE in the server! >:-|")
         return None
 
-    await send_role_dm(server, message.author, role, to_send)
+    await send_role_dm(server, message.author, role, to_send, message.channel)
+
+
+@bot.command()
+async def role_send_cancel(message: discord.Message) -> None:
+    """Cancels the role message currently being sent in this server."""
+    server = message.guild
+    if server is None:
+        await message.channel.send("Something went wrong while trying to cancel the message.")
+        return None
+
+    if not await validate_role(message, "Dungeon Master"):
+        return None
+
+    if not cancel_role_dm(server):
+        await message.channel.send("No message is being sent right now.")
+
+
+@bot.command()
+async def campaign_registry_rebuild(message: discord.Message) -> None:
+    """Rebuilds this server's campaign registry from its categories, roles and log channels."""
+    server = message.guild
+    if server is None:
+        await message.channel.send("Something went wrong while trying to rebuild the campaign registry.")
+        return None
+
+    if not await validate_role(message, "Dungeon Master"):
+        return None
+
+    found = rebuild_registry(server)
+    await message.channel.send(f"Campaign registry rebuilt, {found} campaigns found.")
+
+
+@bot.command()
+async def jobs(message: discord.Message) -> None:
+    """Lists the campaign commands that are waiting or running in this server."""
+    server = message.guild
+    if server is None:
+        await message.channel.send("Something went wrong while trying to list the campaign commands.")
+        return None
+
+    guild_jobs = scheduler.for_guild(server).status()
+    if not guild_jobs:
+        await message.channel.send("No campaign commands are waiting or running.")
+        return None
+
+    embedded_message = discord.Embed(title=f"Campaign commands ({len(guild_jobs)}/{MAX_QUEUED_JOBS})",
+                                     colour=discord.Colour.dark_red())
+    for job in guild_jobs[:25]:
+        since = job.started_at if job.state == RUNNING else job.submitted_at
+        embedded_message.add_field(name=f"#{job.id} {job.description}",
+                                   value=f"{job.state.capitalize()} for {time.monotonic() - since:.0f}s"
+                                         f"{f', requested {job.merged + 1} times' if job.merged else ''}",
+                                   inline=False)
+    await message.channel.send(embed=embedded_message)
+
+
+@bot.command()
+async def metrics_slowest(message: discord.Message, count: int = 10) -> None:
+    """Lists the slowest recently finished commands."""
+    if not await validate_role(message, "Dungeon Master"):
+        return None
+
+    slowest = metrics.slowest(min(count, 25))
+    if not slowest:
+        await message.channel.send("No commands have finished yet.")
+        return None
+
+    embedded_message = discord.Embed(title="Slowest recent commands", colour=discord.Colour.dark_red())
+    for run in slowest:
+        embedded_message.add_field(name=f"R!{run.command} ({run.seconds:.2f}s){' - failed' if run.failed else ''}",
+                                   value=f"{run.api_calls} API calls, {run.rate_limit_wait:.2f}s rate limited, "
+                                         f"finished <t:{int(run.finished_at)}:R>",
+                                   inline=False)
+    await message.channel.send(embed=embedded_message)
+
+
+@bot.command()
+async def slash_sync(message: discord.Message) -> None:
+    """Registers the slash commands in this server. Only needed after they change."""
+    server = message.guild
+    if server is None:
+        await message.channel.send("Something went wrong while trying to register the slash commands.")
+        return None
+
+    if not await validate_role(message, "Dungeon Master"):
+        return None
+
+    bot.tree.copy_global_to(guild=server)
+    synced = await bot.tree.sync(guild=server)
+    await message.channel.send(f"{len(synced)} slash commands registered in this server.")
+
+
+@bot.command()
+async def log_tail(message: discord.Message, campaign_name: str = "all", count: int = 50) -> None:
+    """Shows the most recent logged events of this server, or of one of its campaigns."""
+    server = message.guild
+    if server is None:
+        await message.channel.send("Something went wrong while trying to read the log.")
+        return None
+
+    if not await validate_role(message, "Dungeon Master"):
+        return None
+
+    events = recent_events(server.id, None if campaign_name == "all" else campaign_name, max(1, min(count, 200)))
+    if not events:
+        await message.channel.send("No events have been logged for that yet.")
+        return None
+
+    # Newest events are kept when the list does not fit into a single message.
+    lines = []
+    length = 0
+    for event in reversed(events):
+        line = event.describe()[:500]
+        length += len(line) + 1
+        if length > 1900:
+            break
+        lines.append(line)
+    await message.channel.send("```\n" + "\n".join(reversed(lines)) + "\n```")
+
+
+@bot.command()
+async def shard_status(message: discord.Message) -> None:
+    """Shows the gateway latency and state of every shard this process runs."""
+    if not await validate_role(message, "Dungeon Master"):
+        return None
+
+    await message.channel.send(embed=describe_shards(bot))
 
 
 @bot.command()
@@ -143,18 +573,39 @@ async def commands(message: discord.Message) -> None:
                                      "with Player and DM roles as well as all necessary channels.",
                                inline=False)
 
-    embedded_message.add_field(name=f"{emoji} R!campaign_delete \"<Campaign Name>\"",
+    embedded_message.add_field(name=f"{emoji} R!campaign_delete \"<Campaign Name>\" <archive>",
                                value="Deletes a given campaign category, all of its channels, as well as the Player "
-                                     "and DM roles.",
+                                     "and DM roles. Add archive to archive its message history first.",
+                               inline=False)
+
+    embedded_message.add_field(name=f"{emoji} R!campaign_archive \"<Campaign Name>\"",
+                               value="Archives the message history of a campaign's text channels. Running it again "
+                                     "only adds the messages sent since.",
                                inline=False)
 
     embedded_message.add_field(name=f"{emoji} R!campaign_rename \"<Campaign Name>\" \"<New Name>\"",
                                value="Renames the given Campaign Category and its Player and DM roles accordingly.",
                                inline=False)
 
+    embedded_message.add_field(name=f"{emoji} R!campaign_resume <operation> / R!campaign_rollback <operation>",
+                               value="Finishes or undoes a campaign creation or deletion that was interrupted "
+                                     "halfway. The operation number is given in the error message.",
+                               inline=False)
+
+    embedded_message.add_field(name=f"{emoji} R!campaign_sync \"<Campaign Name>\" <dry>",
+                               value="Repairs the channels, permissions and roles of a campaign (or of \"all\" "
+                                     "campaigns) that were changed by hand. Add dry to only list the repairs.",
+                               inline=False)
+
+    embedded_message.add_field(name=f"{emoji} R!campaign_manifest (with a manifest file attached)",
+                               value="Creates several campaigns at once, with their players and role colours, "
+                                     "from a .toml, .yaml or .json file. See campaign_templates/manifest_example.toml.",
+                               inline=False)
+
     embedded_message.add_field(name=f"{emoji} R!player_add \"<Campaign Name>\" <DiscordUser#Number>",
                                value="Adds a player to your campaign, creating their log channel as well. "
-                                     "Will add more players if you input more <DiscordUser#Number> values.",
+                                     "Will add more players if you input more <DiscordUser#Number> values. "
+                                     "Users without a #Number can be added by their username.",
                                inline=False)
 
     embedded_message.add_field(name=f"{emoji} R!player_remove \"<Campaign Name>\" <DiscordUser#Number>",
@@ -167,10 +618,50 @@ async def commands(message: discord.Message) -> None:
                                      "leading # before the hex code!",
                                inline=False)
 
+    embedded_message.add_field(name=f"{emoji} R!role_colours \"<Campaign Name>\" <player_hex> <dm_hex>",
+                               value="Sets the colours of a campaign's Player and DM roles at once.",
+                               inline=False)
+
+    embedded_message.add_field(name=f"{emoji} R!role_palette (with a palette file attached)",
+                               value="Sets the colours of many campaign roles and gives or takes away campaign roles "
+                                     "of many members at once. See campaign_templates/palette_example.toml.",
+                               inline=False)
+
     embedded_message.add_field(name=f"{emoji} R!role_send_message @<role> \"<message>\"",
                                value="Sends <message> to all users with @<role>. Use with caution!!!",
                                inline=False)
 
+    embedded_message.add_field(name=f"{emoji} R!role_send_cancel",
+                               value="Stops a role message that is still being sent.",
+                               inline=False)
+
+    embedded_message.add_field(name=f"{emoji} R!campaign_registry_rebuild",
+                               value="Rebuilds the bot's record of this server's campaigns, in case their "
+                                     "channels or roles were changed by hand.",
+                               inline=False)
+
+    embedded_message.add_field(name=f"{emoji} R!jobs",
+                               value="Lists the campaign commands that are waiting or running in this server.",
+                               inline=False)
+
+    embedded_message.add_field(name=f"{emoji} R!metrics_slowest <count>",
+                               value="Lists the slowest recent commands, with their API calls and rate limit waits.",
+                               inline=False)
+
+    embedded_message.add_field(name=f"{emoji} R!slash_sync",
+                               value="Registers the slash versions of the campaign, player and role commands in "
+                                     "this server. They autocomplete campaign and player names.",
+                               inline=False)
+
+    embedded_message.add_field(name=f"{emoji} R!log_tail \"<Campaign Name>\" <count>",
+                               value="Shows the last <count> logged events of a campaign, or of the whole server "
+                                     "with \"all\".",
+                               inline=False)
+
+    embedded_message.add_field(name=f"{emoji} R!shard_status",
+                               value="Shows the latency and connection state of the bot's shards.",
+                               inline=False)
+
     embedded_message.add_field(name=f"{emoji} R!commands",
                                value="Displays this useful message!",
                                inline=False)
@@ -180,9 +671,128 @@ async def commands(message: discord.Message) -> None:
     await message.channel.send(embed=embedded_message)
 
 
+async def setup_hook() -> None:
+    start_logging()
+    interrupted_operations.extend(journal.mark_interrupted(SHARD_IDS, SHARD_COUNT))
+    await start_metrics()
+
+
+async def offer_interrupted_operations() -> None:
+    """Tells the channels that started a campaign operation which this restart interrupted how to resume or
+    undo it. Operations that had already failed before were announced then, so they are not repeated."""
+    operations = interrupted_operations[:]
+    interrupted_operations.clear()
+    for operation in operations:
+        server = bot.get_guild(operation.guild_id)
+        channel = server.get_channel(operation.channel_id) if server is not None else None
+        if channel is None:
+            continue
+        undo = f" or R!campaign_rollback {operation.id} to undo it" if operation.kind == CREATE else ""
+        try:
+            await channel.send(f"The {operation.kind} of the campaign {operation.campaign_name} was interrupted. "
+                               f"Use R!campaign_resume {operation.id} to finish it{undo}.")
+        except discord.HTTPException as error:
+            log_event("interrupted_operation_not_announced", logging.WARNING, guild_id=operation.guild_id,
+                      campaign=operation.campaign_name, operation_id=operation.id, status=error.status,
+                      error=error.text)
+
+
+bot.setup_hook = setup_hook
+# The operations this process marked as interrupted at startup, until on_ready announces them.
+interrupted_operations: List[Operation] = []
+
+
 @bot.event
 async def on_ready() -> None:
-    print(f"Bot connected and ready for work!")
+    log_event("bot_ready", guilds=len(bot.guilds), shard_count=bot.shard_count)
+    await offer_interrupted_operations()
+
+
+@bot.event
+async def on_shard_ready(shard_id: int) -> None:
+    log_event("shard_ready", shard_id=shard_id, latency=bot.get_shard(shard_id).latency)
+
+
+@bot.event
+async def on_shard_disconnect(shard_id: int) -> None:
+    log_event("shard_disconnected", logging.WARNING, shard_id=shard_id)
+
+
+@bot.event
+async def on_shard_resumed(shard_id: int) -> None:
+    log_event("shard_resumed", shard_id=shard_id)
+
+
+@bot.event
+async def on_member_join(member: discord.Member) -> None:
+    member_index.add(member)
+
+
+@bot.event
+async def on_member_remove(member: discord.Member) -> None:
+    member_index.remove(member)
+    auth_cache.member_changed(member)
+
+
+@bot.event
+async def on_raw_member_remove(payload: discord.RawMemberRemoveEvent) -> None:
+    # Also sent for members that are not cached, which is every member in low-memory mode.
+    member_index.forget_member(payload.guild_id, payload.user.id)
+
+
+@bot.event
+async def on_member_update(before: discord.Member, after: discord.Member) -> None:
+    member_index.rename(after.guild, before, after)
+    if before.roles != after.roles:
+        auth_cache.member_changed(after)
+
+
+@bot.event
+async def on_user_update(before: discord.User, after: discord.User) -> None:
+    # Username changes are reported once per user rather than once per guild.
+    for server in after.mutual_guilds:
+        member_index.rename(server, before, after)
+
+
+@bot.event
+async def on_guild_remove(server: discord.Guild) -> None:
+    member_index.forget_guild(server)
+    auth_cache.forget_guild(server)
+
+
+@bot.event
+async def on_guild_role_create(role: discord.Role) -> None:
+    auth_cache.roles_changed(role.guild)
+
+
+@bot.event
+async def on_guild_role_update(before: discord.Role, after: discord.Role) -> None:
+    if before.name != after.name:
+        auth_cache.roles_changed(after.guild)
+
+
+@bot.event
+async def on_guild_role_delete(role: discord.Role) -> None:
+    auth_cache.roles_changed(role.guild)
+
+
+@bot.event
+async def on_guild_channel_create(channel: discord.abc.GuildChannel) -> None:
+    if isinstance(channel, discord.CategoryChannel):
+        auth_cache.category_added(channel.guild, channel.id, channel.name)
+
+
+@bot.event
+async def on_guild_channel_delete(channel: discord.abc.GuildChannel) -> None:
+    if isinstance(channel, discord.CategoryChannel):
+        auth_cache.category_removed(channel.guild, channel.id, channel.name)
+
+
+@bot.event
+async def on_guild_channel_update(before: discord.abc.GuildChannel, after: discord.abc.GuildChannel) -> None:
+    if isinstance(after, discord.CategoryChannel) and before.name != after.name:
+        auth_cache.category_removed(before.guild, before.id, before.name)
+        auth_cache.category_added(after.guild, after.id, after.name)
 
 
 @bot.event
@@ -192,4 +802,5 @@ async def on_message(message: discord.Message) -> None:
     await bot.process_commands(message)
 
 
-bot.run(TOKEN)
+if __name__ == "__main__":
+    bot.run(TOKEN)
@@ -0,0 +1,237 @@
+import asyncio
+import discord
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+from auth_cache import auth_cache
+from campaign_management import ProvisionedCampaign, provision_campaign, register_created_campaign
+from campaign_registry import ResolvedCampaign
+from journal import CREATE, FAILED, journal
+from member_index import member_index, parse_player_name
+from player_management import FAILURE, SUCCESS, create_player_channel
+from role_management import RoleChanges, set_role_colour
+from scheduler import RequestLimit, scheduler
+from templates import CompiledTemplate, TemplateError, parse_document
+
+# Every REST call made while running a manifest shares this budget, however many campaigns it describes.
+MANIFEST_CONCURRENCY = 8
+MAX_MANIFEST_CAMPAIGNS = 20
+MAX_MANIFEST_SIZE = 64 * 1024
+MAX_COLOUR = 0xFFFFFF
+
+SKIPPED = "⏭️"
+
+
+class CampaignManifest(NamedTuple):
+    name: str
+    dungeon_master: Optional[str]
+    players: Tuple[str, ...]
+    player_colour: Optional[discord.Colour]
+    dm_colour: Optional[discord.Colour]
+
+
+class ManifestStepError(Exception):
+    """A manifest step failed with the given status."""
+
+
+NodeKey = Tuple[str, str]
+
+
+class Node(NamedTuple):
+    """One step of a manifest, keyed by campaign name and step. It starts once every step in dependencies has
+    succeeded, and returns its status."""
+    key: NodeKey
+    dependencies: Tuple[NodeKey, ...]
+    run: Callable[[], Awaitable[str]]
+
+
+def parse_colour(value: Any, where: str) -> Optional[discord.Colour]:
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        # An unquoted 255 (or a YAML 000255, read as octal) would otherwise turn into an unrelated colour.
+        raise TemplateError(f"{where} must be a hex colour code in quotes, such as \"ff0000\".")
+    try:
+        colour = int(value.lstrip("#"), 16)
+    except ValueError:
+        colour = -1
+    if not 0 <= colour <= MAX_COLOUR:
+        raise TemplateError(f"{where} must be a hex colour code such as ff0000.")
+    return discord.Colour(colour)
+
+
+def parse_manifest(filename: str, content: bytes) -> List[CampaignManifest]:
+    """Validates a manifest file. It holds a list of campaigns, each with a name and optionally a dungeon_master
+    (defaults to the author), a list of players and a player_colour and dm_colour."""
+    data = parse_document(filename, content)
+    campaigns = data.get("campaigns") if isinstance(data, dict) else None
+    if not isinstance(campaigns, list) or not campaigns:
+        raise TemplateError("The manifest needs a non-empty list of campaigns.")
+    if len(campaigns) > MAX_MANIFEST_CAMPAIGNS:
+        raise TemplateError(f"A manifest can describe at most {MAX_MANIFEST_CAMPAIGNS} campaigns.")
+
+    manifests = []
+    for index, campaign in enumerate(campaigns):
+        where = f"campaigns[{index}]"
+        if not isinstance(campaign, dict) or not isinstance(campaign.get("name"), str) or not campaign["name"].strip():
+            raise TemplateError(f"{where} needs a name.")
+        dungeon_master = campaign.get("dungeon_master")
+        if dungeon_master is not None and not isinstance(dungeon_master, str):
+            raise TemplateError(f"{where}.dungeon_master must be a player name.")
+        players = campaign.get("players", [])
+        if not isinstance(players, list) or not all(isinstance(player, str) for player in players):
+            raise TemplateError(f"{where}.players must be a list of player names.")
+        manifests.append(CampaignManifest(campaign["name"].strip(), dungeon_master,
+                                          tuple(dict.fromkeys(players)),
+                                          parse_colour(campaign.get("player_colour"), f"{where}.player_colour"),
+                                          parse_colour(campaign.get("dm_colour"), f"{where}.dm_colour")))
+
+    names = [manifest.name.casefold() for manifest in manifests]
+    if len(set(names)) != len(names):
+        raise TemplateError("Campaign names must be unique.")
+    return manifests
+
+
+async def compile_manifest(server: discord.Guild, author: discord.Member, channel: discord.abc.Messageable,
+                           manifests: List[CampaignManifest], template: CompiledTemplate, budget: RequestLimit,
+                           role_changes: RoleChanges,
+                           role_grants: Dict[NodeKey, int]) -> Tuple[List[Node], Dict[str, Dict[str, str]]]:
+    """Turns the manifest into a dependency graph. Within a campaign, its players and role colours depend on the
+    campaign's creation (which creates the roles before the category's channels); different campaigns do not
+    depend on each other. The Dungeon Master role is given (and journaled) by the creation itself, but the
+    player roles are collected into role_changes, and role_grants records which step (by key) gave a role to
+    which member.
+    Also returns the status of every step by campaign: steps that cannot run at all already have their error,
+    the others are filled in by the report."""
+    nodes: List[Node] = []
+    statuses: Dict[str, Dict[str, str]] = {}
+    campaigns: Dict[str, ResolvedCampaign] = {}
+
+    for manifest in manifests:
+        name = manifest.name
+        statuses[name] = {}
+        dungeon_master = author
+        if manifest.dungeon_master is not None:
+            dungeon_master = await member_index.resolve(server, manifest.dungeon_master)
+        if auth_cache.category_exists(server, name):
+            statuses[name]["Creation"] = f"{FAILURE} A category by this name already exists"
+            continue
+        if dungeon_master is None:
+            statuses[name]["Creation"] = f"{FAILURE} Dungeon Master {manifest.dungeon_master} not found"
+            continue
+
+        async def create(name: str = name, dungeon_master: discord.Member = dungeon_master) -> str:
+            operation = journal.begin(server.id, CREATE, name, dungeon_master.id, channel.id)
+            try:
+                provisioned: ProvisionedCampaign = await provision_campaign(server, operation, dungeon_master,
+                                                                            template, budget)
+            except discord.HTTPException as error:
+                journal.set_state(operation, FAILED)
+                raise ManifestStepError(f"{FAILURE} Failed ({error.status}), use R!campaign_resume {operation.id} "
+                                        f"or R!campaign_rollback {operation.id}") from error
+            campaigns[name] = register_created_campaign(server, operation, provisioned)
+            return f"{SUCCESS} Created ({provisioned.api_calls} API calls)"
+
+        create_key = (name, "Creation")
+        nodes.append(Node(create_key, (), create))
+        statuses[name]["Creation"] = ""
+
+        for player_name, player in (await member_index.resolve_many(server, manifest.players)).items():
+            if parse_player_name(player_name) is None:
+                statuses[name][player_name] = f"{FAILURE} Incorrect name format, use NAME#NUMBER or USERNAME"
+                continue
+            if player is None:
+                statuses[name][player_name] = f"{FAILURE} No such player found"
+                continue
+
+            async def add(name: str = name, player_name: str = player_name, player: discord.Member = player) -> str:
+                async with budget:
+                    await create_player_channel(server, campaigns[name], player)
+                role_changes.add(player, campaigns[name].player_role)
+                role_grants[(name, player_name)] = player.id
+                return f"{SUCCESS} Added"
+
+            nodes.append(Node((name, player_name), (create_key,), add))
+            statuses[name][player_name] = ""
+
+        for label, colour, role_of in (("Player colour", manifest.player_colour, lambda c: c.player_role),
+                                       ("Dungeon Master colour", manifest.dm_colour, lambda c: c.dm_role)):
+            if colour is None:
+                continue
+
+            async def paint(name: str = name, colour: discord.Colour = colour,
+                            role_of: Callable[[ResolvedCampaign], discord.Role] = role_of) -> str:
+                async with budget:
+                    await set_role_colour(role_of(campaigns[name]), colour)
+                return f"{SUCCESS} Set to #{colour.value:06x}"
+
+            nodes.append(Node((name, label), (create_key,), paint))
+            statuses[name][label] = ""
+
+    return nodes, statuses
+
+
+async def run_graph(nodes: List[Node]) -> Dict[NodeKey, str]:
+    """Runs every node as soon as its dependencies have succeeded, so independent steps run in parallel.
+    A node whose dependency failed is skipped. Returns the status of every node by key."""
+    statuses: Dict[NodeKey, str] = {}
+    tasks: Dict[NodeKey, asyncio.Task] = {}
+
+    async def run(node: Node) -> bool:
+        for dependency in node.dependencies:
+            if not await tasks[dependency]:
+                statuses[node.key] = f"{SKIPPED} Skipped, {dependency[1]} failed"
+                return False
+        try:
+            statuses[node.key] = await node.run()
+        except ManifestStepError as error:
+            statuses[node.key] = str(error)
+        except discord.HTTPException as error:
+            statuses[node.key] = f"{FAILURE} Discord refused the change ({error.status})"
+        return statuses[node.key].startswith(SUCCESS)
+
+    # Dependencies always come earlier in the list, so every task a node waits on already exists.
+    for node in nodes:
+        tasks[node.key] = asyncio.create_task(run(node))
+    await asyncio.gather(*tasks.values())
+    return statuses
+
+
+def build_report(filename: str, manifests: List[CampaignManifest], statuses: Dict[str, Dict[str, str]],
+                 results: Dict[NodeKey, str], elapsed: float) -> discord.Embed:
+    for (campaign_name, step), status in results.items():
+        statuses[campaign_name][step] = status
+
+    embedded_message = discord.Embed(title=f"Manifest {filename}", colour=discord.Colour.dark_red())
+    succeeded = total = 0
+    for manifest in manifests:
+        campaign_statuses = statuses[manifest.name]
+        lines = [f"**{step}**: {status}" for step, status in campaign_statuses.items()]
+        value = "\n".join(lines)
+        if len(value) > 1024:
+            value = value[:1020] + "\n…"
+        embedded_message.add_field(name=manifest.name, value=value, inline=False)
+        succeeded += sum(status.startswith(SUCCESS) for status in campaign_statuses.values())
+        total += len(campaign_statuses)
+    embedded_message.set_footer(text=f"{succeeded} of {total} steps done in {elapsed:.1f}s.")
+    return embedded_message
+
+
+async def run_manifest(server: discord.Guild, author: discord.Member, channel: discord.abc.Messageable,
+                       filename: str, manifests: List[CampaignManifest], template: CompiledTemplate) -> None:
+    """Runs a whole manifest as one dependency graph and sends a single report at the end."""
+    budget = scheduler.request_limit(server, MANIFEST_CONCURRENCY)
+    role_changes = RoleChanges()
+    role_grants: Dict[NodeKey, int] = {}
+    nodes, statuses = await compile_manifest(server, author, channel, manifests, template, budget, role_changes,
+                                             role_grants)
+    start = time.perf_counter()
+    results = await run_graph(nodes)
+    # Every player role the manifest gives is applied at the end, with one call per member however many
+    # campaigns the member joins.
+    role_errors = await role_changes.apply(server, budget)
+    for key, member_id in role_grants.items():
+        if member_id in role_errors:
+            results[key] = (f"{FAILURE} {results[key][len(SUCCESS):].strip()}, but the role could not be given "
+                            f"({role_errors[member_id]})")
+    await channel.send(embed=build_report(filename, manifests, statuses, results,
+                                          time.perf_counter() - start))
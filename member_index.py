@@ -0,0 +1,205 @@
+import asyncio
+import discord
+import time
+from collections import OrderedDict
+from os import getenv
+from typing import Dict, Iterable, List, Optional, Tuple
+from prefix_index import PrefixIndex
+
+MemberKey = Tuple[str, str]
+
+# Without the member cache, members are looked up through the gateway when a command names them.
+LOW_MEMORY_MODE = getenv("RPG_LOW_MEMORY", "").lower() in ("1", "true", "yes")
+MEMBER_LRU_SIZE = 1024
+MEMBER_LRU_TTL = 600.0
+QUERY_LIMIT = 100
+
+
+def parse_player_name(player_name: str) -> Optional[MemberKey]:
+    """Splits NAME#NUMBER into its index key. Names without a #NUMBER are treated as global usernames,
+    which discord reports with a discriminator of 0."""
+    name_parts = player_name.split("#")
+    if len(name_parts) == 1 and name_parts[0]:
+        return name_parts[0].casefold(), "0"
+    if len(name_parts) == 2 and name_parts[0] and name_parts[1]:
+        return name_parts[0].casefold(), name_parts[1]
+    return None
+
+
+def member_key(member: discord.abc.User) -> MemberKey:
+    return member.name.casefold(), member.discriminator
+
+
+def player_name_of(member: discord.abc.User) -> str:
+    """The name a command would use for the member, the inverse of parse_player_name."""
+    return member.name if member.discriminator == "0" else f"{member.name}#{member.discriminator}"
+
+
+class MemberIndex:
+    """Resolves player names to members.
+
+    Normally this is a per-guild hash index of (lowercased name, discriminator) -> member ID over the member
+    cache, with a prefix index of player names for autocompletion beside it. Both are built on first use and kept
+    current by the member events in main.py. In low-memory mode there is no
+    member cache to index, so names are looked up with gateway member queries instead, and the IDs of recently
+    resolved names are kept in a small LRU. Members themselves are never kept in low-memory mode: they are
+    fetched again by ID (in one query per command), so their roles are always current."""
+
+    def __init__(self, low_memory: bool = LOW_MEMORY_MODE) -> None:
+        self.low_memory = low_memory
+        self.guilds: Dict[int, Dict[MemberKey, int]] = {}
+        self.prefixes: Dict[int, PrefixIndex] = {}
+        self.recent: "OrderedDict[Tuple[int, MemberKey], Tuple[int, float]]" = OrderedDict()
+
+    def _index(self, server: discord.Guild) -> Dict[MemberKey, int]:
+        index = self.guilds.get(server.id)
+        if index is None:
+            index = {member_key(member): member.id for member in server.members}
+            self.guilds[server.id] = index
+            self.prefixes[server.id] = PrefixIndex(player_name_of(member) for member in server.members)
+        return index
+
+    def add(self, member: discord.Member) -> None:
+        index = self.guilds.get(member.guild.id)
+        if index is not None:
+            index[member_key(member)] = member.id
+            self.prefixes[member.guild.id].add(player_name_of(member))
+
+    def remove(self, member: discord.Member) -> None:
+        index = self.guilds.get(member.guild.id)
+        if index is not None and index.get(member_key(member)) == member.id:
+            del index[member_key(member)]
+            self.prefixes[member.guild.id].remove(player_name_of(member))
+        self.forget_member(member.guild.id, member.id)
+
+    def forget_member(self, guild_id: int, member_id: int) -> None:
+        for key in [key for key, (cached_id, _) in self.recent.items()
+                    if key[0] == guild_id and cached_id == member_id]:
+            del self.recent[key]
+
+    def rename(self, server: discord.Guild, before: discord.abc.User, after: discord.abc.User) -> None:
+        self.recent.pop((server.id, member_key(before)), None)
+        index = self.guilds.get(server.id)
+        if index is None or member_key(before) == member_key(after):
+            return
+        if index.get(member_key(before)) == before.id:
+            del index[member_key(before)]
+            self.prefixes[server.id].remove(player_name_of(before))
+        index[member_key(after)] = after.id
+        self.prefixes[server.id].add(player_name_of(after))
+
+    def forget_guild(self, server: discord.Guild) -> None:
+        self.guilds.pop(server.id, None)
+        self.prefixes.pop(server.id, None)
+        for key in [key for key in self.recent if key[0] == server.id]:
+            del self.recent[key]
+
+    def _remember(self, server: discord.Guild, member: discord.Member) -> None:
+        key = (server.id, member_key(member))
+        self.recent[key] = (member.id, time.monotonic())
+        self.recent.move_to_end(key)
+        while len(self.recent) > MEMBER_LRU_SIZE:
+            self.recent.popitem(last=False)
+
+    def _recent_id(self, server: discord.Guild, key: MemberKey) -> Optional[int]:
+        cached = self.recent.get((server.id, key))
+        if cached is None:
+            return None
+        if time.monotonic() - cached[1] > MEMBER_LRU_TTL:
+            del self.recent[(server.id, key)]
+            return None
+        self.recent.move_to_end((server.id, key))
+        return cached[0]
+
+    async def _query_name(self, server: discord.Guild, key: MemberKey) -> Optional[discord.Member]:
+        # The query matches username prefixes, so the exact name is picked out of the results.
+        for member in await server.query_members(query=key[0], limit=QUERY_LIMIT, cache=False):
+            if member_key(member) == key:
+                self._remember(server, member)
+                return member
+        return None
+
+    async def get(self, server: discord.Guild, member_id: int) -> Optional[discord.Member]:
+        """The member with the given ID, fetched through the gateway if it is not cached."""
+        member = server.get_member(member_id)
+        if member is None and self.low_memory:
+            members = await server.query_members(user_ids=[member_id], limit=1, cache=False)
+            member = members[0] if members else None
+        return member
+
+    async def get_many(self, server: discord.Guild, member_ids: Iterable[int]) -> Dict[int, discord.Member]:
+        """The members with the given IDs that are still in the guild. In low-memory mode the ones that are not
+        cached are fetched in one query per QUERY_LIMIT members."""
+        members = {}
+        missing = []
+        for member_id in member_ids:
+            member = server.get_member(member_id)
+            if member is not None:
+                members[member_id] = member
+            elif self.low_memory:
+                missing.append(member_id)
+        for start in range(0, len(missing), QUERY_LIMIT):
+            for member in await server.query_members(user_ids=missing[start:start + QUERY_LIMIT],
+                                                     limit=QUERY_LIMIT, cache=False):
+                members[member.id] = member
+        return members
+
+    async def resolve(self, server: discord.Guild, player_name: str) -> Optional[discord.Member]:
+        return (await self.resolve_many(server, (player_name,)))[player_name]
+
+    async def resolve_many(self, server: discord.Guild,
+                           player_names: Iterable[str]) -> Dict[str, Optional[discord.Member]]:
+        """Resolves every given name against the guild's index in a single pass. In low-memory mode, names in
+        the LRU are fetched by ID in a single query and every other name is looked up concurrently."""
+        if not self.low_memory:
+            index = self._index(server)
+            resolved = {}
+            for player_name in player_names:
+                key = parse_player_name(player_name)
+                member_id = None if key is None else index.get(key)
+                resolved[player_name] = None if member_id is None else server.get_member(member_id)
+            return resolved
+
+        keys = {player_name: parse_player_name(player_name) for player_name in player_names}
+        known = {player_name: self._recent_id(server, key) for player_name, key in keys.items() if key is not None}
+        known_ids = [member_id for member_id in known.values() if member_id is not None]
+        fetched = {}
+        for start in range(0, len(known_ids), QUERY_LIMIT):
+            for member in await server.query_members(user_ids=known_ids[start:start + QUERY_LIMIT],
+                                                     limit=QUERY_LIMIT, cache=False):
+                fetched[member.id] = member
+
+        resolved: Dict[str, Optional[discord.Member]] = {}
+        missing: List[str] = []
+        for player_name, key in keys.items():
+            member = fetched.get(known.get(player_name))
+            if key is not None and member is not None and member_key(member) == key:
+                resolved[player_name] = member
+            elif key is not None:
+                # Never resolved, expired, or renamed since it was resolved.
+                missing.append(player_name)
+            else:
+                resolved[player_name] = None
+        queried = await asyncio.gather(*(self._query_name(server, keys[player_name]) for player_name in missing))
+        resolved.update(zip(missing, queried))
+        return {player_name: resolved[player_name] for player_name in keys}
+
+    async def complete(self, server: discord.Guild, prefix: str, limit: int = 25) -> List[str]:
+        """Player names starting with prefix, for autocompletion. In low-memory mode this is one gateway query."""
+        if not self.low_memory:
+            self._index(server)
+            return self.prefixes[server.id].search(prefix, limit)
+        if not prefix:
+            return []
+        members = await server.query_members(query=prefix.split("#")[0], limit=limit, cache=False)
+        return [name for name in map(player_name_of, members) if name.casefold().startswith(prefix.casefold())]
+
+    async def role_members(self, server: discord.Guild, role: discord.Role) -> List[discord.Member]:
+        """Every member with the role. In low-memory mode the member list is paged through once over REST,
+        keeping only the members that have the role."""
+        if not self.low_memory:
+            return role.members
+        return [member async for member in server.fetch_members(limit=None) if role in member.roles]
+
+
+member_index = MemberIndex()
@@ -0,0 +1,216 @@
+import asyncio
+import bisect
+import discord.http
+import logging
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from discord.ext import commands
+from os import getenv
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+
+METRICS_HOST = getenv("RPG_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(getenv("RPG_METRICS_PORT", "9108"))
+LOOP_LAG_INTERVAL = 0.5
+RECENT_COMMANDS = 500
+# Bucket waits shorter than this are just the event loop handing the request on, not a rate limit.
+MIN_BUCKET_WAIT = 0.001
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+RATE_LIMIT_MESSAGE = "We are being rate limited. %s %s responded with 429. Retrying in %.2f seconds."
+
+
+class Histogram:
+    """A Prometheus-style histogram with fixed upper bounds."""
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def exposition(self, name: str, labels: str = "") -> List[str]:
+        separator = "," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            upper = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{name}_bucket{{{labels}{separator}le="{upper}"}} {cumulative}')
+        braces = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{braces} {self.sum}")
+        lines.append(f"{name}_count{braces} {self.count}")
+        return lines
+
+
+class CommandRun:
+    """The API usage of one command invocation, found through the current_run context variable."""
+    __slots__ = ("command", "guild_id", "start", "api_calls", "rate_limit_wait")
+
+    def __init__(self, command: str, guild_id: Optional[int]) -> None:
+        self.command = command
+        self.guild_id = guild_id
+        self.start = time.perf_counter()
+        self.api_calls = 0
+        self.rate_limit_wait = 0.0
+
+
+class FinishedRun(NamedTuple):
+    command: str
+    guild_id: Optional[int]
+    finished_at: float
+    seconds: float
+    api_calls: int
+    rate_limit_wait: float
+    failed: bool
+
+
+current_run: ContextVar[Optional[CommandRun]] = ContextVar("current_run", default=None)
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self.command_latency: Dict[str, Histogram] = {}
+        self.command_failures: Counter = Counter()
+        self.api_calls: Counter = Counter()
+        self.rate_limit_wait: Counter = Counter()
+        self.loop_lag = Histogram(LAG_BUCKETS)
+        self.recent: Deque[FinishedRun] = deque(maxlen=RECENT_COMMANDS)
+
+    def command_started(self, command: str, guild_id: Optional[int]) -> None:
+        current_run.set(CommandRun(command, guild_id))
+
+    def command_finished(self, failed: bool) -> None:
+        run = current_run.get()
+        if run is None:
+            return
+        current_run.set(None)
+        seconds = time.perf_counter() - run.start
+        self.command_latency.setdefault(run.command, Histogram(LATENCY_BUCKETS)).observe(seconds)
+        if failed:
+            self.command_failures[run.command] += 1
+        self.recent.append(FinishedRun(run.command, run.guild_id, time.time(), seconds,
+                                       run.api_calls, run.rate_limit_wait, failed))
+
+    def api_call(self) -> None:
+        run = current_run.get()
+        self.api_calls[run.command if run is not None else ""] += 1
+        if run is not None:
+            run.api_calls += 1
+
+    def rate_limited(self, seconds: float) -> None:
+        run = current_run.get()
+        self.rate_limit_wait[run.command if run is not None else ""] += seconds
+        if run is not None:
+            run.rate_limit_wait += seconds
+
+    def slowest(self, count: int) -> List[FinishedRun]:
+        return sorted(self.recent, key=lambda run: run.seconds, reverse=True)[:count]
+
+    def exposition(self) -> str:
+        lines = ["# TYPE rpg_command_duration_seconds histogram"]
+        for command, histogram in sorted(self.command_latency.items()):
+            lines.extend(histogram.exposition("rpg_command_duration_seconds", f'command="{command}"'))
+        lines.append("# TYPE rpg_command_failures_total counter")
+        lines.extend(f'rpg_command_failures_total{{command="{command}"}} {count}'
+                     for command, count in sorted(self.command_failures.items()))
+        lines.append("# TYPE rpg_api_calls_total counter")
+        lines.extend(f'rpg_api_calls_total{{command="{command}"}} {count}'
+                     for command, count in sorted(self.api_calls.items()))
+        lines.append("# TYPE rpg_rate_limit_wait_seconds_total counter")
+        lines.extend(f'rpg_rate_limit_wait_seconds_total{{command="{command}"}} {seconds}'
+                     for command, seconds in sorted(self.rate_limit_wait.items()))
+        lines.append("# TYPE rpg_event_loop_lag_seconds histogram")
+        lines.extend(self.loop_lag.exposition("rpg_event_loop_lag_seconds"))
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+background_tasks: List[asyncio.Task] = []
+
+
+class RateLimitHandler(logging.Handler):
+    """discord.py only reports the time it sleeps after a 429 through its log, so the metrics listen there.
+    Log records are emitted from the task that made the request, so current_run still points at its command.
+    The far more common wait for a bucket that ran out of requests is timed by timed_acquire instead."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.msg == RATE_LIMIT_MESSAGE:
+            metrics.rate_limited(float(record.args[2]))
+
+
+def time_bucket_waits() -> None:
+    """Times every wait for a rate limit bucket. discord.py queues a request there until its bucket resets,
+    before the request is ever sent, so that wait never shows up as a 429. acquire() runs in the task that made
+    the request, so current_run still points at its command."""
+    original_acquire = discord.http.Ratelimit.acquire
+    if getattr(original_acquire, "timed", False):
+        return
+
+    async def timed_acquire(self: discord.http.Ratelimit) -> None:
+        start = time.perf_counter()
+        try:
+            await original_acquire(self)
+        finally:
+            waited = time.perf_counter() - start
+            if waited >= MIN_BUCKET_WAIT:
+                metrics.rate_limited(waited)
+
+    timed_acquire.timed = True
+    discord.http.Ratelimit.acquire = timed_acquire
+
+
+async def monitor_loop_lag() -> None:
+    while True:
+        expected = time.perf_counter() + LOOP_LAG_INTERVAL
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        metrics.loop_lag.observe(max(0.0, time.perf_counter() - expected))
+
+
+async def serve_metrics(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """A minimal HTTP/1.0 responder; every path returns the Prometheus text exposition."""
+    try:
+        await reader.readuntil(b"\r\n\r\n")
+        body = metrics.exposition().encode()
+        writer.write(b"HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                     b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+        await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def instrument_bot(bot: commands.Bot) -> None:
+    """Times every command and counts every REST call the bot makes."""
+    @bot.before_invoke
+    async def start_command(context: commands.Context) -> None:
+        metrics.command_started(context.command.qualified_name,
+                                context.guild.id if context.guild is not None else None)
+
+    @bot.after_invoke
+    async def finish_command(context: commands.Context) -> None:
+        metrics.command_finished(context.command_failed)
+
+    original_request = bot.http.request
+
+    async def request(*args, **kwargs):
+        metrics.api_call()
+        return await original_request(*args, **kwargs)
+
+    bot.http.request = request
+    logging.getLogger("discord.http").addHandler(RateLimitHandler(logging.WARNING))
+    time_bucket_waits()
+
+
+async def start_metrics() -> None:
+    """Starts the loop lag monitor and the local metrics endpoint."""
+    background_tasks.append(asyncio.create_task(monitor_loop_lag()))
+    await asyncio.start_server(serve_metrics, METRICS_HOST, METRICS_PORT)
@@ -0,0 +1,119 @@
+import asyncio
+import discord
+import time
+from typing import Dict, List, NamedTuple, Tuple
+from campaign_registry import CampaignRecord, registry
+from manifest import parse_colour
+from member_index import member_index
+from role_management import RoleChanges, set_role_colours
+from templates import TemplateError, parse_document
+
+MAX_PALETTE_SIZE = 64 * 1024
+MAX_PALETTE_MEMBERS = 500
+REMOVE_PREFIX = "-"
+
+
+class Palette(NamedTuple):
+    colours: Dict[str, discord.Colour]
+    # Player name -> (role names to add, role names to remove)
+    members: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]]
+
+
+def parse_palette(filename: str, content: bytes) -> Palette:
+    """Validates a palette file. Its colours table maps role names to hex colours, and its members table maps
+    player names to a list of role names to give them, with a leading - for the roles to take away instead."""
+    data = parse_document(filename, content)
+    if not isinstance(data, dict):
+        raise TemplateError("The palette needs a colours or a members table.")
+    colours = data.get("colours", {})
+    members = data.get("members", {})
+    if not isinstance(colours, dict) or not isinstance(members, dict) or not (colours or members):
+        raise TemplateError("The palette needs a colours or a members table.")
+    if len(members) > MAX_PALETTE_MEMBERS:
+        raise TemplateError(f"A palette can change the roles of at most {MAX_PALETTE_MEMBERS} members.")
+
+    parsed_members = {}
+    for player_name, role_names in members.items():
+        if not isinstance(role_names, list) or not all(isinstance(name, str) and name.lstrip(REMOVE_PREFIX)
+                                                         for name in role_names):
+            raise TemplateError(f"members.{player_name} must be a list of role names.")
+        parsed_members[player_name] = (tuple(name for name in role_names if not name.startswith(REMOVE_PREFIX)),
+                                       tuple(name[1:] for name in role_names if name.startswith(REMOVE_PREFIX)))
+    parsed_colours = {role_name: parse_colour(colour, f"colours.{role_name}") for role_name, colour in colours.items()}
+    return Palette(parsed_colours, parsed_members)
+
+
+class ResolvedPalette(NamedTuple):
+    colours: Dict[discord.Role, discord.Colour]
+    changes: RoleChanges
+    missing: List[str]
+    # Every campaign whose roles the palette changes, by category ID.
+    campaigns: Dict[int, CampaignRecord]
+
+
+def find_role(server: discord.Guild, role_name: str,
+              campaign_roles: Dict[int, CampaignRecord]) -> Tuple[discord.Role, CampaignRecord]:
+    """The one registered campaign role with the name (ignoring case), and its campaign. Other roles, such as
+    moderator roles, can never be changed through a palette. Raises TemplateError if there is none, or several."""
+    roles = [role for role in server.roles
+             if role.id in campaign_roles and role.name.casefold() == role_name.casefold()]
+    if len(roles) != 1:
+        raise TemplateError(f"{'No' if not roles else 'More than one'} campaign role is named {role_name}.")
+    return roles[0], campaign_roles[roles[0].id]
+
+
+async def resolve_palette(server: discord.Guild, palette: Palette) -> ResolvedPalette:
+    """Resolves every role and member of the palette up front. Raises TemplateError for unknown roles."""
+    campaign_roles = {}
+    for record in registry.campaigns(server.id):
+        campaign_roles[record.player_role_id] = campaign_roles[record.dm_role_id] = record
+    campaigns = {}
+    colours = {}
+    for role_name, colour in palette.colours.items():
+        role, record = find_role(server, role_name, campaign_roles)
+        colours[role] = colour
+        campaigns[record.category_id] = record
+
+    changes = RoleChanges()
+    players = await member_index.resolve_many(server, palette.members)
+    for player_name, (added, removed) in palette.members.items():
+        # Resolved even for missing players, so that a wrong role name is reported either way.
+        added_roles = [find_role(server, role_name, campaign_roles) for role_name in added]
+        removed_roles = [find_role(server, role_name, campaign_roles) for role_name in removed]
+        campaigns.update((record.category_id, record) for _, record in added_roles + removed_roles)
+        player = players[player_name]
+        if player is None:
+            continue
+        for role, _ in added_roles:
+            changes.add(player, role)
+        for role, _ in removed_roles:
+            changes.remove(player, role)
+    missing = [player_name for player_name, player in players.items() if player is None]
+    return ResolvedPalette(colours, changes, missing, campaigns)
+
+
+async def apply_palette(server: discord.Guild, palette: ResolvedPalette) -> str:
+    """Sets all colours and edits all members concurrently, with one REST call per changed role and one per
+    changed member. Returns a summary."""
+    start = time.perf_counter()
+    unchanged = sum(role.colour == colour for role, colour in palette.colours.items())
+    colour_errors, member_errors = await asyncio.gather(set_role_colours(server, palette.colours),
+                                                        palette.changes.apply(server))
+    elapsed = time.perf_counter() - start
+
+    recoloured = len(palette.colours) - unchanged - len(colour_errors)
+    lines = [f"Recoloured {recoloured} roles and changed the roles of {palette.changes.edited} members in "
+             f"{elapsed:.1f}s ({len(palette.colours) - unchanged + palette.changes.edited + len(member_errors)} "
+             f"API calls)."]
+    if palette.missing:
+        lines.append(f"Not found: {', '.join(palette.missing)}.")
+    lines.extend(f"Could not recolour {role.name}: {colour_errors[role.id]}"
+                 for role in palette.colours if role.id in colour_errors)
+    lines.extend(f"Could not change the roles of {palette.changes.members[member_id].name}: {error}"
+                 for member_id, error in member_errors.items())
+    return truncate_lines(lines)
+
+
+def truncate_lines(lines: List[str], limit: int = 2000) -> str:
+    summary = "\n".join(lines)
+    return summary if len(summary) <= limit else summary[:limit - 2] + "\n…"
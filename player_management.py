@@ -1,124 +1,240 @@
+import asyncio
 import discord
-from typing import Union, Tuple
-
-
-async def create_player_channel(server: discord.Guild, parent_category: str,
-                                member: discord.User, dm_role: discord.Role) -> bool:
-    """Creates a log channel for the given campaign player."""
-    current_category = discord.utils.get(server.categories, name=parent_category)
-    if current_category is None:
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional, Union, Tuple
+from campaign_registry import ResolvedCampaign, registry, resolve_campaign
+from event_log import log_event
+from member_index import member_index, parse_player_name
+from scheduler import RequestLimit, scheduler
+
+PLAYER_CONCURRENCY = 4
+PROGRESS_INTERVAL = 1.5
+
+PENDING = "⏳ Waiting"
+WORKING = "⚙️ Working"
+SUCCESS = "✅"
+FAILURE = "❌"
+
+PlayerStep = Callable[[discord.Guild, ResolvedCampaign, discord.Member], Awaitable[str]]
+
+
+class ProgressMessage:
+    """A single embed listing every player's status, edited in place at most once every PROGRESS_INTERVAL seconds.
+    Edits run one at a time, so the final one always lands last. A failed edit (e.g. of a deleted message) is
+    logged and does not stop the command."""
+
+    def __init__(self, server: discord.Guild, channel: Union[discord.VoiceChannel, discord.TextChannel], title: str,
+                 player_names: Tuple[str, ...]) -> None:
+        self.server = server
+        self.channel = channel
+        self.title = title
+        self.statuses: Dict[str, str] = {player_name: PENDING for player_name in player_names}
+        self.footer = ""
+        self.message: Optional[discord.Message] = None
+        self.pending_edit: Optional[asyncio.Task] = None
+        self.edit_lock = asyncio.Lock()
+        self.last_edit = 0.0
+
+    def embed(self) -> discord.Embed:
+        embedded_message = discord.Embed(
+            title=self.title,
+            description="\n".join(f"**{player_name}**: {status}" for player_name, status in self.statuses.items()),
+            colour=discord.Colour.dark_red())
+        if self.footer:
+            embedded_message.set_footer(text=self.footer)
+        return embedded_message
+
+    async def start(self) -> None:
+        self.message = await self.channel.send(embed=self.embed())
+        self.last_edit = time.monotonic()
+
+    def update(self, player_name: str, status: str) -> None:
+        self.statuses[player_name] = status
+        if self.pending_edit is None:
+            self.pending_edit = asyncio.create_task(self._edit_later())
+
+    async def _edit_later(self) -> None:
+        await asyncio.sleep(max(0.0, self.last_edit + PROGRESS_INTERVAL - time.monotonic()))
+        self.pending_edit = None
+        await self._edit()
+
+    async def _edit(self) -> None:
+        async with self.edit_lock:
+            self.last_edit = time.monotonic()
+            try:
+                await self.message.edit(embed=self.embed())
+            except discord.HTTPException as error:
+                log_event("progress_message_edit_failed", logging.WARNING, guild_id=self.server.id,
+                          message_id=self.message.id, status=error.status, error=error.text)
+
+    async def finish(self, footer: str) -> None:
+        # An edit that is still waiting for its interval is dropped; one already being sent finishes first.
+        if self.pending_edit is not None:
+            self.pending_edit.cancel()
+            self.pending_edit = None
+        self.footer = footer
+        await self._edit()
+
+
+def player_channel_name(member: discord.abc.User) -> str:
+    """The name discord gives the log channel created for the member."""
+    return f"{member.name.lower()}-log"
+
+
+async def create_player_channel(server: discord.Guild, campaign: ResolvedCampaign,
+                                member: discord.Member) -> discord.TextChannel:
+    """Creates a log channel for the given campaign player, with its category and permissions set in one call."""
+    player_overwrite = discord.PermissionOverwrite(view_channel=True,
+                                                   read_message_history=True,
+                                                   send_messages=True)
+    overwrites = {server.default_role: discord.PermissionOverwrite(view_channel=False),
+                  member: player_overwrite,
+                  campaign.dm_role: player_overwrite}
+
+    channel = await server.create_text_channel(f"{member.name} log", category=campaign.category,
+                                               overwrites=overwrites)
+    registry.set_player_channel(campaign.record, member.id, channel.id)
+    log_event("player_channel_created", guild_id=server.id, campaign=campaign.category.name, member_id=member.id,
+              channel_id=channel.id)
+    return channel
+
+
+async def add_to_campaign(server: discord.Guild, campaign: ResolvedCampaign, player: discord.Member) -> str:
+    """Adds a single, already validated player to the campaign. Returns the player's final status."""
+    await create_player_channel(server, campaign, player)
+    await player.add_roles(campaign.player_role)
+    log_event("player_added", guild_id=server.id, campaign=campaign.category.name, member_id=player.id,
+              role_id=campaign.player_role.id)
+    return f"{SUCCESS} Added"
+
+
+async def delete_player_channel(server: discord.Guild, campaign: ResolvedCampaign, member: discord.Member) -> bool:
+    """Deletes a given campaign player's log channel."""
+    channel_id = registry.get_player_channel(campaign.record, member.id)
+    if channel_id is not None:
+        channel_to_delete = server.get_channel(channel_id)
+    else:
+        # Log channels created before the registry existed are only known by their name.
+        channel_to_delete = discord.utils.get(campaign.category.channels, name=player_channel_name(member))
+
+    if channel_to_delete is None:
         return False
 
-    # ToDo: Refactor this line to not be as long.
-    channel = await server.create_text_channel(f"{member.name} log")
-
-    await channel.edit(category=current_category)
-
-    channel.overwrites_for(server.default_role)
-    await channel.set_permissions(server.default_role,
-                                  view_channel=False)
-
-    channel.overwrites_for(member)
-    await channel.set_permissions(member,
-                                  view_channel=True,
-                                  read_message_history=True,
-                                  send_messages=True,
-                                  read_messages=True)
-
-    channel.overwrites_for(dm_role)
-    await channel.set_permissions(dm_role,
-                                  view_channel=True,
-                                  read_message_history=True,
-                                  send_messages=True,
-                                  read_messages=True)
+    await channel_to_delete.delete()
+    registry.remove_player_channel(campaign.record, member.id)
+    log_event("player_channel_deleted", guild_id=server.id, campaign=campaign.category.name, member_id=member.id,
+              channel_id=channel_to_delete.id)
     return True
 
 
-async def add_to_campaign(server: discord.Guild, campaign_name: str, player_name: str,
-                          channel: Union[discord.VoiceChannel, discord.TextChannel]) -> None:
-    """Adds a single player to the campaign_name campaign."""
-    await channel.send(f"Adding {player_name} to {campaign_name}. Please wait until an error or success"
-                       f"message is returned.")
-
-    player_role = discord.utils.get(server.roles, name=f"{campaign_name} Player")
-    dm_role = discord.utils.get(server.roles, name=f"{campaign_name} Dungeon Master")
-
-    if dm_role is None or player_role is None:
-        await channel.send("Error: No DM or Player Role for the given Campaign Exists!")
+async def remove_from_campaign(server: discord.Guild, campaign: ResolvedCampaign, player: discord.Member) -> str:
+    """Removes a single, already validated player from the campaign. Returns the player's final status."""
+    channel_deleted = await delete_player_channel(server, campaign, player)
+    await player.remove_roles(campaign.player_role)
+    log_event("player_removed", guild_id=server.id, campaign=campaign.category.name, member_id=player.id,
+              role_id=campaign.player_role.id)
+    if not channel_deleted:
+        return f"{SUCCESS} Removed, but their log channel {player_channel_name(player)} did not exist"
+    return f"{SUCCESS} Removed"
+
+
+async def rename_player_channels(server: discord.Guild, campaign: ResolvedCampaign,
+                                 semaphore: RequestLimit) -> Tuple[int, int]:
+    """Renames every registered log channel of the campaign whose name no longer matches its player's current
+    name, with at most as many edits at a time as the semaphore allows. Returns the renamed and failed counts."""
+    channel_ids = dict(registry.player_channels.get(campaign.record.category_id, {}))
+    members = await member_index.get_many(server, channel_ids)
+    renamed = failed = 0
+
+    async def rename(channel: discord.abc.GuildChannel, name: str) -> None:
+        nonlocal renamed, failed
+        async with semaphore:
+            try:
+                await channel.edit(name=name)
+            except discord.HTTPException as error:
+                failed += 1
+                log_event("player_channel_rename_failed", logging.WARNING, guild_id=server.id,
+                          campaign=campaign.record.name, channel_id=channel.id, status=error.status,
+                          error=error.text)
+                return
+        renamed += 1
+        log_event("player_channel_renamed", guild_id=server.id, campaign=campaign.record.name,
+                  channel_id=channel.id, name=name)
+
+    renames = []
+    for member_id, channel_id in channel_ids.items():
+        channel = server.get_channel(channel_id)
+        member = members.get(member_id)
+        if channel is not None and member is not None and channel.name != player_channel_name(member):
+            renames.append(rename(channel, player_channel_name(member)))
+    await asyncio.gather(*renames)
+    return renamed, failed
+
+
+def validate_players(campaign: ResolvedCampaign, players: Dict[str, Optional[discord.Member]],
+                     should_have_role: bool) -> Dict[str, str]:
+    """Returns an error status for every player name that cannot be processed."""
+    errors = {}
+    for player_name, player in players.items():
+        if parse_player_name(player_name) is None:
+            errors[player_name] = f"{FAILURE} Incorrect name format, use NAME#NUMBER or USERNAME"
+        elif player is None:
+            errors[player_name] = f"{FAILURE} No such player found"
+        elif (campaign.player_role in player.roles) != should_have_role:
+            errors[player_name] = (f"{FAILURE} Already in the campaign" if not should_have_role
+                                   else f"{FAILURE} Not in the campaign")
+    return errors
+
+
+async def run_player_pipeline(server: discord.Guild, campaign_name: str, player_names: Tuple[str, ...],
+                              channel: Union[discord.VoiceChannel, discord.TextChannel], title: str,
+                              should_have_role: bool, step: PlayerStep) -> None:
+    """Resolves the campaign once, validates every player up front and then runs step for the valid
+    players concurrently, reporting all results in a single progress message."""
+    campaign = resolve_campaign(server, campaign_name)
+    if campaign is None:
+        await channel.send(f"Error: The campaign {campaign_name} or its Player and Dungeon Master roles "
+                           f"do not exist.")
         return None
 
-    name_parts = player_name.split("#")
-    if len(name_parts) != 2:
-        await channel.send(f"Error: Incorrect name format. "
-                           f"Please, ensure the player's name is in a format of NAME#NUMBER.")
-        return None
+    players = await member_index.resolve_many(server, player_names)
+    progress = ProgressMessage(server, channel, title, tuple(players))
+    for player_name, error in validate_players(campaign, players, should_have_role).items():
+        progress.statuses[player_name] = error
+    await progress.start()
 
-    player = discord.utils.get(server.members, name=name_parts[0], discriminator=name_parts[1])
-    if player is None:
-        await channel.send(f"Error: No player called {player_name} found!")
-        return None
+    start = time.perf_counter()
+    semaphore = scheduler.request_limit(server, PLAYER_CONCURRENCY)
 
-    if not await create_player_channel(server, campaign_name, player, dm_role):
-        await channel.send("Error: Something went wrong while creating the player's log channel.")
-        return None
+    async def process(player_name: str, player: discord.Member) -> None:
+        async with semaphore:
+            progress.update(player_name, WORKING)
+            try:
+                progress.update(player_name, await step(server, campaign, player))
+            except discord.HTTPException as error:
+                log_event("player_step_failed", logging.WARNING, guild_id=server.id,
+                          campaign=campaign.category.name, member_id=player.id, status=error.status,
+                          error=error.text)
+                progress.update(player_name, f"{FAILURE} Discord refused the change ({error.status})")
 
-    await player.add_roles(player_role)
-    await channel.send(f"{player_name} added to {campaign_name} successfully!")
+    await asyncio.gather(*(process(player_name, players[player_name])
+                           for player_name, status in progress.statuses.items() if status == PENDING))
+
+    succeeded = sum(status.startswith(SUCCESS) for status in progress.statuses.values())
+    await progress.finish(f"{succeeded} of {len(progress.statuses)} players done "
+                          f"in {time.perf_counter() - start:.1f}s.")
 
 
 async def bulk_add_players(server: discord.Guild, campaign_name: str, player_names: Tuple[str, ...],
                            channel: Union[discord.VoiceChannel, discord.TextChannel]) -> None:
     """Adds the specified player_names players to the given campaign_name campaign."""
-    for player_name in player_names:
-        await add_to_campaign(server, campaign_name, player_name, channel)
-
-
-async def delete_player_channel(server: discord.Guild, campaign_name: str, player_name: str) -> bool:
-    """Deletes a given campaign player's log channel."""
-    current_category = discord.utils.get(server.categories, name=campaign_name)
-    channel_to_delete = discord.utils.get(current_category.channels, name=f"{player_name.lower()}-log")
-
-    if current_category is None or channel_to_delete is None:
-        return False
-
-    await channel_to_delete.delete()
-    return True
-
-
-async def remove_from_campaign(server: discord.Guild, campaign_name: str, player_name: str,
-                               channel: Union[discord.VoiceChannel, discord.TextChannel]) -> None:
-    """Removes a single player from the given campaign_name campaign."""
-    await channel.send(f"Removing {player_name} from {campaign_name}. Please wait until an error or success "
-                       f"message is returned.")
-
-    name_parts = player_name.split("#")
-    if len(name_parts) != 2:
-        await channel.send(f"Error: Incorrect name format. "
-                           f"Please, ensure the player's name is in a format of NAME#NUMBER.")
-        return None
-
-    player = discord.utils.get(server.members, name=name_parts[0], discriminator=name_parts[1])
-    if player is None:
-        await channel.send(f"Error: No player called {player_name} found!")
-        return None
-
-    player_role = discord.utils.get(player.roles, name=f"{campaign_name} Player")
-    if player_role is None:
-        await channel.send(f"Error: The player doesn't have the required {campaign_name} Player role.")
-        return None
-
-    if not await delete_player_channel(server, campaign_name, player.name):
-        await channel.send(f"Error: The Category {campaign_name} or "
-                           f"Log Channel {player_name.lower()}-log do not exist.")
-        return None
-
-    await player.remove_roles(player_role)
-
-    await channel.send(f"Player {player_name} successfully removed from {campaign_name}.")
+    await run_player_pipeline(server, campaign_name, player_names, channel,
+                              f"Adding players to {campaign_name}", False, add_to_campaign)
 
 
 async def bulk_remove_players(server: discord.Guild, campaign_name: str, player_names: Tuple[str, ...],
                               channel: Union[discord.VoiceChannel, discord.TextChannel]) -> None:
     """Removes the specified player_names players from a campaign category."""
-    for player_name in player_names:
-        await remove_from_campaign(server, campaign_name, player_name, channel)
+    await run_player_pipeline(server, campaign_name, player_names, channel,
+                              f"Removing players from {campaign_name}", True, remove_from_campaign)
@@ -0,0 +1,36 @@
+from bisect import bisect_left, insort
+from typing import Iterable, List, Tuple
+
+
+class PrefixIndex:
+    """A sorted list of (case-folded name, name) pairs. Every name starting with a prefix lies in one contiguous
+    run of the list, found with a single binary search, so a lookup costs O(log n + limit) however many names
+    there are."""
+
+    def __init__(self, names: Iterable[str] = ()) -> None:
+        self.entries: List[Tuple[str, str]] = sorted((name.casefold(), name) for name in names)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, name: str) -> None:
+        entry = (name.casefold(), name)
+        position = bisect_left(self.entries, entry)
+        if position == len(self.entries) or self.entries[position] != entry:
+            insort(self.entries, entry)
+
+    def remove(self, name: str) -> None:
+        entry = (name.casefold(), name)
+        position = bisect_left(self.entries, entry)
+        if position < len(self.entries) and self.entries[position] == entry:
+            del self.entries[position]
+
+    def search(self, prefix: str, limit: int = 25) -> List[str]:
+        prefix = prefix.casefold()
+        matches = []
+        for position in range(bisect_left(self.entries, (prefix, "")), len(self.entries)):
+            key, name = self.entries[position]
+            if not key.startswith(prefix) or len(matches) == limit:
+                break
+            matches.append(name)
+        return matches
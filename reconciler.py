@@ -0,0 +1,98 @@
+import asyncio
+import discord
+import logging
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Tuple, Union
+from campaign_management import PROVISIONING_CONCURRENCY, Overwrites, build_channel_overwrites, hidden_overwrites
+from campaign_registry import ResolvedCampaign
+from event_log import log_event
+from scheduler import scheduler
+from templates import ChannelType, CompiledTemplate
+
+
+class Repair(NamedTuple):
+    campaign: str
+    description: str
+    apply: Callable[[], Awaitable[object]]
+
+
+def merged_overwrites(live: Overwrites, desired: Overwrites, managed: List[Union[discord.Role, discord.Member]]
+                      ) -> Overwrites:
+    """The live overwrites with every template-managed target set to its desired overwrite. Overwrites for other
+    targets (added by hand, e.g. for a guest) are kept."""
+    merged = {target: overwrite for target, overwrite in live.items() if target not in managed}
+    merged.update(desired)
+    return merged
+
+
+def overwrites_differ(live: Overwrites, desired: Overwrites, managed: List[Union[discord.Role, discord.Member]]
+                      ) -> bool:
+    return any(live.get(target, discord.PermissionOverwrite()) != desired.get(target, discord.PermissionOverwrite())
+               for target in managed)
+
+
+def plan_campaign(server: discord.Guild, campaign: ResolvedCampaign, template: CompiledTemplate) -> List[Repair]:
+    """Compares a campaign against the template and returns the smallest set of API calls that closes the gap:
+    one call per drifted object, and none at all for a campaign that matches the template."""
+    repairs = []
+    name = campaign.record.name
+    category, player_role, dm_role = campaign.category, campaign.player_role, campaign.dm_role
+    managed = [server.default_role, player_role, dm_role]
+
+    for role, role_name, permissions in ((player_role, f"{name} Player", template.player_permissions),
+                                         (dm_role, f"{name} Dungeon Master", template.dm_permissions)):
+        changes = {}
+        if role.name != role_name:
+            changes["name"] = role_name
+        if role.permissions != permissions:
+            changes["permissions"] = permissions
+        if changes:
+            repairs.append(Repair(name, f"Update the {', '.join(changes)} of the role {role.name}",
+                                  lambda role=role, changes=changes: role.edit(**changes)))
+
+    category_changes = {}
+    if category.name != name:
+        category_changes["name"] = name
+    desired = hidden_overwrites(server, template)
+    if overwrites_differ(category.overwrites, desired, managed):
+        category_changes["overwrites"] = merged_overwrites(category.overwrites, desired, managed)
+    if category_changes:
+        repairs.append(Repair(name, f"Update the {', '.join(category_changes)} of the category {category.name}",
+                              lambda: category.edit(**category_changes)))
+
+    live_channels: Dict[str, Union[discord.TextChannel, discord.VoiceChannel]] = {
+        channel.name: channel for channel in category.channels}
+    for position, (channel_name, channel_type, desired) in enumerate(
+            build_channel_overwrites(server, player_role, dm_role, template)):
+        channel = live_channels.get(channel_name)
+        is_text = channel_type == ChannelType.TEXT
+        if channel is None or isinstance(channel, discord.TextChannel) != is_text:
+            create = server.create_text_channel if is_text else server.create_voice_channel
+            repairs.append(Repair(name, f"Create the missing channel {channel_name}",
+                                  lambda create=create, channel_name=channel_name, desired=desired, position=position:
+                                  create(channel_name, category=category, overwrites=desired, position=position)))
+        elif overwrites_differ(channel.overwrites, desired, managed):
+            repairs.append(Repair(name, f"Reset the permissions of {channel.mention}",
+                                  lambda channel=channel, desired=desired:
+                                  channel.edit(overwrites=merged_overwrites(channel.overwrites, desired, managed))))
+    return repairs
+
+
+async def apply_repairs(server: discord.Guild, repairs: List[Repair]) -> List[Tuple[Repair, str]]:
+    """Applies repairs concurrently, at most PROVISIONING_CONCURRENCY at a time. A repair that discord refuses
+    does not stop the others. Returns every failed repair with its error."""
+    semaphore = scheduler.request_limit(server, PROVISIONING_CONCURRENCY)
+    failed = []
+
+    async def apply(repair: Repair) -> None:
+        async with semaphore:
+            try:
+                await repair.apply()
+            except discord.HTTPException as error:
+                failed.append((repair, f"{error.status} {error.text}"))
+                log_event("campaign_repair_failed", logging.WARNING, guild_id=server.id, campaign=repair.campaign,
+                          repair=repair.description, status=error.status, error=error.text)
+                return
+        log_event("campaign_repaired", guild_id=server.id, campaign=repair.campaign, repair=repair.description)
+
+    await asyncio.gather(*(apply(repair) for repair in repairs))
+    return failed
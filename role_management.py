@@ -1,14 +1,146 @@
+import asyncio
 import discord
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Union
+from event_log import log_event
+from member_index import member_index
+from scheduler import RequestLimit, scheduler
+
+BROADCAST_CONCURRENCY = 5
+ROLE_EDIT_CONCURRENCY = 5
+BROADCAST_ATTEMPTS = 3
+BROADCAST_BACKOFF = 1.0
+# discord.py itself only keeps the last 128 DM channels, far fewer than one broadcast reaches.
+DM_CHANNEL_CACHE_SIZE = 5000
+
+dm_channels: "OrderedDict[int, discord.DMChannel]" = OrderedDict()
+active_broadcasts: Dict[int, asyncio.Task] = {}
 
 
 async def set_role_colour(role: discord.Role, new_colour: discord.Colour) -> None:
     """Sets the colour for a specific server role."""
+    old_colour = role.colour
     await role.edit(colour=new_colour)
+    log_event("role_colour_changed", guild_id=role.guild.id, role_id=role.id, role=role.name,
+              old_colour=str(old_colour), new_colour=str(new_colour))
     return None
 
 
-async def send_role_dm(server: discord.Guild, author: discord.User, role: discord.Role, message: str) -> None:
+async def set_role_colours(server: discord.Guild, colours: Dict[discord.Role, discord.Colour]) -> Dict[int, str]:
+    """Sets the colours of many roles concurrently, skipping roles that already have theirs.
+    Returns the error of every role (by ID) that discord refused to change."""
+    semaphore = scheduler.request_limit(server, ROLE_EDIT_CONCURRENCY)
+    errors = {}
+
+    async def paint(role: discord.Role, colour: discord.Colour) -> None:
+        async with semaphore:
+            try:
+                await set_role_colour(role, colour)
+            except discord.HTTPException as error:
+                errors[role.id] = f"{error.status} {error.text}"
+
+    await asyncio.gather(*(paint(role, colour) for role, colour in colours.items() if role.colour != colour))
+    return errors
+
+
+class RoleChanges:
+    """Role changes for many members, collected first and then applied with a single member.edit(roles=...) per
+    member, however many roles it gains or loses. Each member's new role list is computed from its current roles
+    right before its own edit, so changes made while earlier members were being edited are kept."""
+
+    def __init__(self) -> None:
+        self.edited = 0
+        self.members: Dict[int, discord.Member] = {}
+        self.added: Dict[int, Dict[int, discord.Role]] = {}
+        self.removed: Dict[int, Set[int]] = {}
+
+    def add(self, member: discord.Member, role: discord.Role) -> None:
+        self.members[member.id] = member
+        self.added.setdefault(member.id, {})[role.id] = role
+        self.removed.get(member.id, set()).discard(role.id)
+
+    def remove(self, member: discord.Member, role: discord.Role) -> None:
+        self.members[member.id] = member
+        self.removed.setdefault(member.id, set()).add(role.id)
+        self.added.get(member.id, {}).pop(role.id, None)
+
+    def roles_of(self, member: discord.Member) -> Optional[List[discord.Role]]:
+        """The member's new roles, or None if the changes leave them as they are."""
+        current = [role for role in member.roles if not role.is_default()]
+        removed = self.removed.get(member.id, set())
+        roles = [role for role in current if role.id not in removed]
+        roles.extend(role for role_id, role in self.added.get(member.id, {}).items()
+                     if role_id not in {role.id for role in current})
+        return None if {role.id for role in roles} == {role.id for role in current} else roles
+
+    async def apply(self, server: discord.Guild, semaphore: Optional[RequestLimit] = None) -> Dict[int, str]:
+        """Edits every changed member concurrently. Returns the error of every member (by ID) that failed."""
+        semaphore = semaphore or scheduler.request_limit(server, ROLE_EDIT_CONCURRENCY)
+        errors = {}
+
+        async def edit(member: discord.Member) -> None:
+            async with semaphore:
+                # The cached member is kept current by the gateway; without a member cache the resolved one is used.
+                member = server.get_member(member.id) or member
+                roles = self.roles_of(member)
+                if roles is None:
+                    return
+                try:
+                    await member.edit(roles=roles)
+                except discord.HTTPException as error:
+                    errors[member.id] = f"{error.status} {error.text}"
+                    return
+            self.edited += 1
+            log_event("member_roles_changed", guild_id=server.id, member_id=member.id,
+                      added=[role_id for role_id in self.added.get(member.id, {})],
+                      removed=sorted(self.removed.get(member.id, set())))
+
+        await asyncio.gather(*(edit(member) for member in self.members.values()))
+        return errors
+
+
+async def get_dm_channel(user: discord.Member) -> discord.DMChannel:
+    """Returns the user's DM channel, only asking discord to open it the first time. The channels of the
+    DM_CHANNEL_CACHE_SIZE most recent users are kept."""
+    channel = dm_channels.get(user.id) or user.dm_channel
+    if channel is None:
+        channel = await user.create_dm()
+    dm_channels[user.id] = channel
+    dm_channels.move_to_end(user.id)
+    while len(dm_channels) > DM_CHANNEL_CACHE_SIZE:
+        dm_channels.popitem(last=False)
+    return channel
+
+
+async def deliver_dm(user: discord.Member, embed: discord.Embed, semaphore: RequestLimit) -> bool:
+    """Sends the embed to a single user, retrying rate limits and server errors with an exponential backoff.
+    Users who closed their DMs are skipped."""
+    for attempt in range(BROADCAST_ATTEMPTS):
+        try:
+            async with semaphore:
+                channel = await get_dm_channel(user)
+                await channel.send(embed=embed)
+            return True
+        except discord.Forbidden:
+            return False
+        except discord.HTTPException as error:
+            if error.status != 429 and error.status < 500:
+                return False
+        # The backoff is slept outside the request limit, so it never holds one of the guild's request slots.
+        if attempt < BROADCAST_ATTEMPTS - 1:
+            await asyncio.sleep(BROADCAST_BACKOFF * 2 ** attempt)
+    return False
+
+
+async def send_role_dm(server: discord.Guild, author: discord.User, role: discord.Role, message: str,
+                       summary_channel: Union[discord.TextChannel, discord.VoiceChannel]) -> None:
     """Sends a message to all users for a specific role. Use with caution!"""
+    if server.id in active_broadcasts:
+        await summary_channel.send("A message is already being sent in this server, please wait for it to finish "
+                                   "or cancel it first.")
+        return None
+
     user_message = discord.Embed(
         title=f"❗ New Message for all users with the {role.name} role ❗",
         description=message,
@@ -16,5 +148,49 @@ async def send_role_dm(server: discord.Guild, author: discord.User, role: discor
 
     user_message.set_footer(text=f"This message was sent by {author.name} from {server.name}.")
 
-    for user in role.members:
-        await user.send(embed=user_message)
+    semaphore = scheduler.request_limit(server, BROADCAST_CONCURRENCY)
+    recipients: List[discord.Member] = []
+    delivered = 0
+    attempted = 0
+
+    async def deliver(user: discord.Member) -> None:
+        nonlocal delivered, attempted
+        if await deliver_dm(user, user_message, semaphore):
+            delivered += 1
+        attempted += 1
+
+    async def deliver_all() -> None:
+        recipients.extend(await member_index.role_members(server, role))
+        await asyncio.gather(*(deliver(user) for user in recipients), return_exceptions=True)
+
+    start = time.perf_counter()
+    # Registered before anything is awaited, so that a second broadcast started meanwhile is turned away.
+    broadcast = asyncio.create_task(deliver_all())
+    active_broadcasts[server.id] = broadcast
+    try:
+        await asyncio.wait({broadcast})
+    finally:
+        broadcast.cancel()
+        active_broadcasts.pop(server.id, None)
+    if not broadcast.cancelled() and broadcast.exception() is not None:
+        # Only looking up the recipients can fail; every delivery handles its own errors.
+        raise broadcast.exception()
+    elapsed = time.perf_counter() - start
+
+    summary = (f"Message to {role.name}: {delivered} delivered, {attempted - delivered} failed "
+               f"in {elapsed:.1f}s.")
+    if broadcast.cancelled():
+        summary += f" Cancelled before reaching {len(recipients) - attempted} members."
+    log_event("role_message_sent", guild_id=server.id, role_id=role.id, author_id=author.id, delivered=delivered,
+              failed=attempted - delivered, skipped=len(recipients) - attempted, cancelled=broadcast.cancelled(),
+              seconds=round(elapsed, 3))
+    await summary_channel.send(summary)
+
+
+def cancel_role_dm(server: discord.Guild) -> bool:
+    """Cancels the message currently being sent in the server. Returns False if there is none."""
+    broadcast = active_broadcasts.get(server.id)
+    if broadcast is None:
+        return False
+    broadcast.cancel()
+    return True
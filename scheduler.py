@@ -0,0 +1,135 @@
+import asyncio
+import discord
+import itertools
+import time
+from collections import Counter
+from contextlib import AsyncExitStack
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+MAX_QUEUED_JOBS = 20
+# Caps on what the long-running work of a single guild may use at once, so that a bulk job in one busy guild
+# cannot take the whole connection and rate limit budget away from the commands of every other guild.
+MAX_RUNNING_JOBS = 3
+GUILD_REQUEST_CONCURRENCY = 8
+
+QUEUED = "queued"
+RUNNING = "running"
+
+_job_ids = itertools.count(1)
+
+
+class Job:
+    def __init__(self, keys: Tuple[str, ...], description: str, signature: Hashable) -> None:
+        self.id = next(_job_ids)
+        self.keys = keys
+        self.description = description
+        self.signature = signature
+        self.state = QUEUED
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.merged = 0
+        self.task: Optional[asyncio.Task] = None
+
+    async def wait(self) -> None:
+        """Waits for the job to finish. Shielded, so a cancelled waiter does not cancel the job for everyone."""
+        await asyncio.shield(self.task)
+
+
+class RequestLimit:
+    """Limits one operation to limit concurrent REST calls, each of which also takes one of its guild's
+    GUILD_REQUEST_CONCURRENCY slots. Used like an asyncio.Semaphore: async with limit: await call()."""
+
+    def __init__(self, limit: int, guild_requests: asyncio.Semaphore) -> None:
+        self.own = asyncio.Semaphore(limit)
+        self.guild_requests = guild_requests
+
+    async def __aenter__(self) -> None:
+        await self.own.acquire()
+        try:
+            await self.guild_requests.acquire()
+        except BaseException:
+            self.own.release()
+            raise
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.guild_requests.release()
+        self.own.release()
+
+
+class GuildScheduler:
+    """Runs the campaign operations of one guild. Jobs sharing a campaign key run one after another in
+    submission order, jobs on different campaigns run concurrently and identical unfinished jobs are merged."""
+
+    def __init__(self) -> None:
+        self.jobs: Dict[int, Job] = {}
+        self.by_signature: Dict[Hashable, Job] = {}
+        self.locks: Dict[str, asyncio.Lock] = {}
+        self.lock_users: Counter = Counter()
+        self.running = asyncio.Semaphore(MAX_RUNNING_JOBS)
+        self.requests = asyncio.Semaphore(GUILD_REQUEST_CONCURRENCY)
+
+    def submit(self, keys: Iterable[str], description: str, signature: Hashable,
+               operation: Callable[[], Awaitable[None]]) -> Optional[Job]:
+        """Queues operation and returns its job, or the unfinished job it was merged into.
+        Returns None if the guild already has MAX_QUEUED_JOBS unfinished jobs."""
+        existing = self.by_signature.get(signature)
+        if existing is not None:
+            existing.merged += 1
+            return existing
+        if len(self.jobs) >= MAX_QUEUED_JOBS:
+            return None
+
+        job = Job(tuple(sorted({key.casefold() for key in keys})), description, signature)
+        # Locks are looked up (and reference counted) now rather than in the task, so a lock can never be
+        # dropped between submission and acquisition. Tasks start in submission order and asyncio locks are FIFO,
+        # so jobs sharing a key run in the order they were submitted.
+        locks = []
+        for key in job.keys:
+            locks.append(self.locks.setdefault(key, asyncio.Lock()))
+            self.lock_users[key] += 1
+        self.jobs[job.id] = job
+        self.by_signature[signature] = job
+        job.task = asyncio.create_task(self._run(job, locks, operation))
+        return job
+
+    async def _run(self, job: Job, locks: List[asyncio.Lock], operation: Callable[[], Awaitable[None]]) -> None:
+        try:
+            async with AsyncExitStack() as stack:
+                # Keys are sorted, so two jobs sharing several keys can never wait on each other.
+                for lock in locks:
+                    await stack.enter_async_context(lock)
+                # Taken last, so a job waiting for its campaigns never blocks one of the guild's running slots.
+                await stack.enter_async_context(self.running)
+                job.state = RUNNING
+                job.started_at = time.monotonic()
+                await operation()
+        finally:
+            del self.jobs[job.id]
+            if self.by_signature.get(job.signature) is job:
+                del self.by_signature[job.signature]
+            for key in job.keys:
+                self.lock_users[key] -= 1
+                if not self.lock_users[key]:
+                    del self.lock_users[key]
+                    del self.locks[key]
+
+    def status(self) -> List[Job]:
+        return sorted(self.jobs.values(), key=lambda job: job.id)
+
+    def request_limit(self, limit: int) -> RequestLimit:
+        return RequestLimit(limit, self.requests)
+
+
+class Scheduler:
+    def __init__(self) -> None:
+        self.guilds: Dict[int, GuildScheduler] = {}
+
+    def for_guild(self, server: discord.Guild) -> GuildScheduler:
+        return self.guilds.setdefault(server.id, GuildScheduler())
+
+    def request_limit(self, server: discord.Guild, limit: int) -> RequestLimit:
+        """A limit of concurrent REST calls for one bulk operation in the guild, see RequestLimit."""
+        return self.for_guild(server).request_limit(limit)
+
+
+scheduler = Scheduler()
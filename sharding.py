@@ -0,0 +1,69 @@
+import discord
+import math
+from discord.ext import commands
+from os import getenv
+from typing import Any, Dict, List, NamedTuple, Optional
+from metrics import metrics
+
+# RPG_SHARDED runs the bot as an AutoShardedBot. RPG_SHARD_COUNT and RPG_SHARD_IDS are set by launcher.py when
+# it splits the shards over several processes, so that each process only connects the shards it was given.
+SHARDED = getenv("RPG_SHARDED", "").lower() in ("1", "true", "yes")
+SHARD_COUNT: Optional[int] = int(getenv("RPG_SHARD_COUNT")) if getenv("RPG_SHARD_COUNT") else None
+SHARD_IDS: Optional[List[int]] = ([int(shard_id) for shard_id in getenv("RPG_SHARD_IDS").split(",")]
+                                  if getenv("RPG_SHARD_IDS") else None)
+
+
+class ShardHealth(NamedTuple):
+    shard_id: Optional[int]
+    latency: float
+    connected: bool
+    rate_limited: bool
+    guilds: int
+
+
+def shard_of(guild_id: int, shard_count: int) -> int:
+    """The shard discord sends a guild's events to."""
+    return (guild_id >> 22) % shard_count
+
+
+def create_bot(**options: Any) -> commands.Bot:
+    """A Bot, or an AutoShardedBot when sharding is enabled or a process was given its own shards."""
+    if SHARD_IDS is not None:
+        return commands.AutoShardedBot(shard_count=SHARD_COUNT, shard_ids=SHARD_IDS, **options)
+    if SHARDED:
+        return commands.AutoShardedBot(shard_count=SHARD_COUNT, **options)
+    return commands.Bot(**options)
+
+
+def shard_health(bot: commands.Bot) -> List[ShardHealth]:
+    """The gateway latency and state of every shard this process runs."""
+    if not isinstance(bot, commands.AutoShardedBot):
+        return [ShardHealth(None, bot.latency, not bot.is_closed() and bot.is_ready(), bot.is_ws_ratelimited(),
+                            len(bot.guilds))]
+    guilds: Dict[int, int] = {}
+    for server in bot.guilds:
+        guilds[server.shard_id] = guilds.get(server.shard_id, 0) + 1
+    return [ShardHealth(shard.id, shard.latency, not shard.is_closed(), shard.is_ws_ratelimited(),
+                        guilds.get(shard.id, 0))
+            for shard in sorted(bot.shards.values(), key=lambda shard: shard.id)]
+
+
+def describe_shards(bot: commands.Bot) -> discord.Embed:
+    shards = shard_health(bot)
+    shard_count = bot.shard_count or 1
+    title = (f"{len(shards)} of {shard_count} shards run in this process"
+             if isinstance(bot, commands.AutoShardedBot) else "Unsharded connection")
+    embedded_message = discord.Embed(title=title, description=None if shards else "No shard has connected yet.",
+                                     colour=discord.Colour.dark_red())
+    for shard in shards[:25]:
+        # The latency is infinite (or NaN) until the shard received its first heartbeat acknowledgement.
+        latency = f"{shard.latency * 1000:.0f} ms" if math.isfinite(shard.latency) else "unknown"
+        state = "connected" if shard.connected else "disconnected"
+        if shard.rate_limited:
+            state += ", gateway rate limited"
+        embedded_message.add_field(name=f"Shard {shard.shard_id if shard.shard_id is not None else 0}",
+                                   value=f"{latency}, {state}, {shard.guilds} servers", inline=False)
+    if metrics.loop_lag.count:
+        embedded_message.set_footer(text=f"Average event loop lag of this process: "
+                                         f"{metrics.loop_lag.sum / metrics.loop_lag.count * 1000:.1f} ms")
+    return embedded_message
@@ -0,0 +1,140 @@
+import discord
+import logging
+import time
+from discord import app_commands
+from discord.ext import commands
+from typing import Any, List, Optional
+from campaign_registry import registry
+from event_log import log_event
+from interaction_context import InteractionContext
+from member_index import member_index
+from metrics import metrics
+
+# Discord drops autocomplete responses with more choices than this, or with longer values.
+MAX_CHOICES = 25
+MAX_CHOICE_LENGTH = 100
+
+
+async def complete_campaign(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    return [app_commands.Choice(name=name, value=name)
+            for name in registry.complete(interaction.guild_id, current, MAX_CHOICES)]
+
+
+async def complete_players(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    """Completes the last of the space separated player names, keeping the ones before it."""
+    chosen, _, last = current.rpartition(" ")
+    prefix = f"{chosen} " if chosen else ""
+    choices = []
+    for name in await member_index.complete(interaction.guild, last, MAX_CHOICES):
+        value = prefix + name
+        if len(value) <= MAX_CHOICE_LENGTH:
+            choices.append(app_commands.Choice(name=value, value=value))
+    return choices
+
+
+def add_slash_commands(bot: commands.Bot) -> None:
+    """Adds slash versions of the campaign, player and role commands. Each one defers its response right away
+    and then runs the prefix command of the same name, whose messages become follow-ups to that response."""
+
+    async def run_prefix_command(interaction: discord.Interaction, name: str, *arguments: Any,
+                                 attachments: Optional[List[discord.Attachment]] = None) -> None:
+        await interaction.response.defer(thinking=True)
+        context = InteractionContext(interaction, attachments)
+        metrics.command_started(name, interaction.guild_id)
+        fields = {"guild_id": interaction.guild_id, "command": name, "author_id": interaction.user.id,
+                  "channel_id": interaction.channel_id, "slash": True}
+        log_event("command_started", **fields, arguments=[str(argument) for argument in arguments])
+        start = time.perf_counter()
+        failed = True
+        try:
+            await bot.get_command(name).callback(context, *arguments)
+            failed = False
+            log_event("command_finished", **fields, seconds=round(time.perf_counter() - start, 3))
+        except Exception as error:
+            log_event("command_failed", logging.ERROR, exc_info=error, **fields,
+                      seconds=round(time.perf_counter() - start, 3), error=str(error))
+            raise
+        finally:
+            metrics.command_finished(failed)
+            if context.channel.sent == 0:
+                await context.send("Something went wrong, the command failed." if failed else "Done.")
+
+    @bot.tree.command(description="Create a campaign category with its channels and roles.")
+    @app_commands.guild_only()
+    async def campaign_create(interaction: discord.Interaction, name: str) -> None:
+        await run_prefix_command(interaction, "campaign_create", name)
+
+    @bot.tree.command(description="Delete a campaign with all of its channels and roles.")
+    @app_commands.guild_only()
+    @app_commands.describe(archive="Archive the campaign's message history first.")
+    @app_commands.autocomplete(campaign=complete_campaign)
+    async def campaign_delete(interaction: discord.Interaction, campaign: str, archive: bool = False) -> None:
+        await run_prefix_command(interaction, "campaign_delete", campaign, "archive" if archive else "")
+
+    @bot.tree.command(description="Rename a campaign and its roles.")
+    @app_commands.guild_only()
+    @app_commands.autocomplete(campaign=complete_campaign)
+    async def campaign_rename(interaction: discord.Interaction, campaign: str, new_name: str) -> None:
+        await run_prefix_command(interaction, "campaign_rename", campaign, new_name)
+
+    @bot.tree.command(description="Archive the message history of a campaign.")
+    @app_commands.guild_only()
+    @app_commands.autocomplete(campaign=complete_campaign)
+    async def campaign_archive(interaction: discord.Interaction, campaign: str) -> None:
+        await run_prefix_command(interaction, "campaign_archive", campaign)
+
+    @bot.tree.command(description="Repair a campaign (or \"all\") that differs from the campaign template.")
+    @app_commands.guild_only()
+    @app_commands.describe(dry_run="Only list the repairs.")
+    @app_commands.autocomplete(campaign=complete_campaign)
+    async def campaign_sync(interaction: discord.Interaction, campaign: str = "all", dry_run: bool = False) -> None:
+        await run_prefix_command(interaction, "campaign_sync", campaign, "dry" if dry_run else "apply")
+
+    @bot.tree.command(description="Create the campaigns, players and role colours described in a manifest file.")
+    @app_commands.guild_only()
+    async def campaign_manifest(interaction: discord.Interaction, manifest: discord.Attachment) -> None:
+        await run_prefix_command(interaction, "campaign_manifest", attachments=[manifest])
+
+    @bot.tree.command(description="Add players to a campaign.")
+    @app_commands.guild_only()
+    @app_commands.describe(players="Player names separated by spaces.")
+    @app_commands.autocomplete(campaign=complete_campaign, players=complete_players)
+    async def player_add(interaction: discord.Interaction, campaign: str, players: str) -> None:
+        await run_prefix_command(interaction, "player_add", campaign, *players.split())
+
+    @bot.tree.command(description="Remove players from a campaign.")
+    @app_commands.guild_only()
+    @app_commands.describe(players="Player names separated by spaces.")
+    @app_commands.autocomplete(campaign=complete_campaign, players=complete_players)
+    async def player_remove(interaction: discord.Interaction, campaign: str, players: str) -> None:
+        await run_prefix_command(interaction, "player_remove", campaign, *players.split())
+
+    @bot.tree.command(description="Set a role's colour.")
+    @app_commands.guild_only()
+    @app_commands.describe(colour="A hex colour code without the leading #.")
+    async def role_colour(interaction: discord.Interaction, role: discord.Role, colour: str) -> None:
+        await run_prefix_command(interaction, "role_colour", role, colour)
+
+    @bot.tree.command(description="Set the colours of a campaign's Player and Dungeon Master roles.")
+    @app_commands.guild_only()
+    @app_commands.describe(player_colour="A hex colour code without the leading #.",
+                           dm_colour="A hex colour code without the leading #.")
+    @app_commands.autocomplete(campaign=complete_campaign)
+    async def role_colours(interaction: discord.Interaction, campaign: str, player_colour: str,
+                           dm_colour: str = "") -> None:
+        await run_prefix_command(interaction, "role_colours", campaign, player_colour, dm_colour)
+
+    @bot.tree.command(description="Set role colours and change the roles of many members from a palette file.")
+    @app_commands.guild_only()
+    async def role_palette(interaction: discord.Interaction, palette: discord.Attachment) -> None:
+        await run_prefix_command(interaction, "role_palette", attachments=[palette])
+
+    @bot.tree.command(description="Send a private message to every member with a role.")
+    @app_commands.guild_only()
+    async def role_send_message(interaction: discord.Interaction, role: discord.Role, message: str) -> None:
+        await run_prefix_command(interaction, "role_send_message", role, message)
+
+    @bot.tree.command(description="Cancel the role message currently being sent.")
+    @app_commands.guild_only()
+    async def role_send_cancel(interaction: discord.Interaction) -> None:
+        await run_prefix_command(interaction, "role_send_cancel")
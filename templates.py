@@ -0,0 +1,245 @@
+import discord
+import json
+import os
+from enum import Enum
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+TEMPLATE_DIRECTORY = os.getenv("RPG_TEMPLATE_DIR", "campaign_templates")
+TEMPLATE_EXTENSIONS = (".toml", ".yaml", ".yml", ".json")
+
+
+class ChannelType(Enum):
+    TEXT = 1
+    VOICE = 2
+
+
+CHANNEL_TYPES = {"text": ChannelType.TEXT, "voice": ChannelType.VOICE}
+
+CanRead = bool
+CanWrite = bool
+Channels = List[Tuple[str, ChannelType, CanRead, CanWrite]]
+
+CAMPAIGN_CHANNELS: Channels = [("campaign-chronicle", ChannelType.TEXT, True, False),
+                               ("campaign-general", ChannelType.TEXT, True, True),
+                               ("reactions", ChannelType.TEXT, True, True),
+                               ("dm-notes", ChannelType.TEXT, False, False),
+                               ("bot-commands", ChannelType.TEXT, False, False),
+                               ("session-voice", ChannelType.VOICE, True, True),
+                               ("other-voice", ChannelType.VOICE, True, True)]
+
+PLAYER_PERMS = discord.Permissions(read_messages=True,
+                                   send_messages=True,
+                                   connect=True,
+                                   use_external_emojis=True,
+                                   change_nickname=True,
+                                   speak=True,
+                                   stream=True,
+                                   embed_links=True,
+                                   attach_files=True,
+                                   add_reactions=True)
+
+DM_PERMS = discord.Permissions(read_messages=True,
+                               send_messages=True,
+                               mention_everyone=True,
+                               connect=True,
+                               use_external_emojis=True,
+                               change_nickname=True,
+                               speak=True,
+                               stream=True,
+                               embed_links=True,
+                               attach_files=True,
+                               add_reactions=True,
+                               priority_speaker=True,
+                               mute_members=True,
+                               move_members=True,
+                               deafen_members=True)
+
+# The roles a template's overwrites refer to; they are bound to a campaign's actual roles at creation time.
+EVERYONE = "everyone"
+PLAYER = "player"
+DUNGEON_MASTER = "dungeon_master"
+
+
+class TemplateError(ValueError):
+    pass
+
+
+class CompiledChannel(NamedTuple):
+    name: str
+    channel_type: ChannelType
+    overwrites: Mapping[str, discord.PermissionOverwrite]
+
+
+class CompiledTemplate(NamedTuple):
+    """A validated campaign template. The overwrites are built once and shared by every campaign created from it,
+    so they must never be modified."""
+    source: str
+    player_permissions: discord.Permissions
+    dm_permissions: discord.Permissions
+    category_overwrites: Mapping[str, discord.PermissionOverwrite]
+    channels: Tuple[CompiledChannel, ...]
+
+
+def text_overwrite(read_privilege: bool, send_privilege: bool) -> discord.PermissionOverwrite:
+    """Builds the overwrite a campaign role receives in a text channel."""
+    return discord.PermissionOverwrite(view_channel=read_privilege,
+                                       read_message_history=True,
+                                       send_messages=send_privilege)
+
+
+def voice_overwrite() -> discord.PermissionOverwrite:
+    """Builds the overwrite a campaign role receives in a voice channel."""
+    return discord.PermissionOverwrite(view_channel=True,
+                                       connect=True,
+                                       speak=True,
+                                       stream=True)
+
+
+def compile_template(source: str, channels: Channels, player_permissions: discord.Permissions,
+                     dm_permissions: discord.Permissions) -> CompiledTemplate:
+    hidden = discord.PermissionOverwrite(view_channel=False)
+    dm_text = text_overwrite(True, True)
+    voice = voice_overwrite()
+    compiled_channels = []
+    for name, channel_type, player_read, player_write in channels:
+        if channel_type == ChannelType.TEXT:
+            overwrites = {EVERYONE: hidden, PLAYER: text_overwrite(player_read, player_write), DUNGEON_MASTER: dm_text}
+        else:
+            overwrites = {EVERYONE: hidden, PLAYER: voice, DUNGEON_MASTER: voice}
+        compiled_channels.append(CompiledChannel(name, channel_type, MappingProxyType(overwrites)))
+    return CompiledTemplate(source, player_permissions, dm_permissions, MappingProxyType({EVERYONE: hidden}),
+                            tuple(compiled_channels))
+
+
+def parse_permissions(value: Any, where: str) -> discord.Permissions:
+    if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+        raise TemplateError(f"{where} must be a list of permission names.")
+    unknown = [name for name in value if name not in discord.Permissions.VALID_FLAGS]
+    if unknown:
+        raise TemplateError(f"{where} contains unknown permissions: {', '.join(unknown)}.")
+    return discord.Permissions(**{name: True for name in value})
+
+
+def parse_role(roles: Dict[str, Any], slot: str, default: discord.Permissions) -> discord.Permissions:
+    if slot not in roles:
+        return default
+    role = roles[slot]
+    if not isinstance(role, dict):
+        raise TemplateError(f"roles.{slot} must be a table/mapping.")
+    return parse_permissions(role.get("permissions", []), f"roles.{slot}.permissions")
+
+
+def parse_template(source: str, data: Any) -> CompiledTemplate:
+    """Validates the contents of a template file and compiles them.
+
+    roles.player.permissions and roles.dungeon_master.permissions list the permission names of the two roles,
+    and every entry of channels has a name, a type ("text" or "voice") and, for text channels, whether
+    players can read and write in it."""
+    if not isinstance(data, dict):
+        raise TemplateError("A template must be a table/mapping.")
+    roles = data.get("roles", {})
+    if not isinstance(roles, dict):
+        raise TemplateError("roles must be a table/mapping.")
+    player_permissions = parse_role(roles, PLAYER, PLAYER_PERMS)
+    dm_permissions = parse_role(roles, DUNGEON_MASTER, DM_PERMS)
+
+    raw_channels = data.get("channels")
+    if not isinstance(raw_channels, list) or not raw_channels:
+        raise TemplateError("channels must be a non-empty list.")
+    channels: Channels = []
+    for index, channel in enumerate(raw_channels):
+        where = f"channels[{index}]"
+        if not isinstance(channel, dict) or not isinstance(channel.get("name"), str) or not channel["name"].strip():
+            raise TemplateError(f"{where} needs a name.")
+        raw_type = channel.get("type", "text")
+        channel_type = CHANNEL_TYPES.get(raw_type) if isinstance(raw_type, str) else None
+        if channel_type is None:
+            raise TemplateError(f"{where}.type must be \"text\" or \"voice\".")
+        player_read = channel.get("player_read", True)
+        player_write = channel.get("player_write", True)
+        if not isinstance(player_read, bool) or not isinstance(player_write, bool):
+            raise TemplateError(f"{where}.player_read and player_write must be true or false.")
+        name = channel["name"].strip()
+        if channel_type == ChannelType.TEXT:
+            # Discord stores text channel names in this form, and the reconciler compares against it.
+            name = name.lower().replace(" ", "-")
+        channels.append((name, channel_type, player_read, player_write))
+
+    names = [name for name, _, _, _ in channels]
+    if len(set(names)) != len(names):
+        raise TemplateError("Channel names must be unique.")
+    return compile_template(source, channels, player_permissions, dm_permissions)
+
+
+def parse_document(filename: str, content: bytes) -> Any:
+    """Parses a TOML, YAML or JSON file by its extension. Raises TemplateError if it cannot be read."""
+    if filename.endswith(".toml"):
+        if tomllib is None:
+            raise TemplateError("TOML files need Python 3.11 or newer.")
+        parse, errors = (lambda: tomllib.loads(content.decode())), (tomllib.TOMLDecodeError, UnicodeDecodeError)
+    elif filename.endswith((".yaml", ".yml")):
+        if yaml is None:
+            raise TemplateError("YAML files need the PyYAML package.")
+        parse, errors = (lambda: yaml.safe_load(content)), (yaml.YAMLError,)
+    elif filename.endswith(".json"):
+        parse, errors = (lambda: json.loads(content)), (json.JSONDecodeError, UnicodeDecodeError)
+    else:
+        raise TemplateError(f"{filename} must be a .toml, .yaml, .yml or .json file.")
+
+    try:
+        return parse()
+    except errors as error:
+        raise TemplateError(f"{filename} could not be parsed: {error}") from error
+
+
+def load_template(path: str) -> CompiledTemplate:
+    with open(path, "rb") as template_file:
+        content = template_file.read()
+    return parse_template(os.path.basename(path), parse_document(os.path.basename(path), content))
+
+
+DEFAULT_TEMPLATE = compile_template("built-in", CAMPAIGN_CHANNELS, PLAYER_PERMS, DM_PERMS)
+
+
+class TemplateCache:
+    """Compiled templates by file path. A file is only compiled again after its modification time changes,
+    so edited templates are picked up without a restart and unchanged ones are never processed twice."""
+
+    def __init__(self) -> None:
+        self.compiled: Dict[str, Tuple[int, CompiledTemplate]] = {}
+
+    def find(self, server: discord.Guild) -> Optional[str]:
+        for name in (str(server.id), "default"):
+            for extension in TEMPLATE_EXTENSIONS:
+                path = os.path.join(TEMPLATE_DIRECTORY, name + extension)
+                if os.path.isfile(path):
+                    return path
+        return None
+
+    def template_for(self, server: discord.Guild) -> CompiledTemplate:
+        """The guild's template file (<guild id>.toml), else default.toml, else the built-in template.
+        Raises TemplateError if the file is invalid."""
+        path = self.find(server)
+        if path is None:
+            return DEFAULT_TEMPLATE
+        modified = os.stat(path).st_mtime_ns
+        cached = self.compiled.get(path)
+        if cached is not None and cached[0] == modified:
+            return cached[1]
+        template = load_template(path)
+        self.compiled[path] = (modified, template)
+        return template
+
+
+template_cache = TemplateCache()
@@ -0,0 +1,43 @@
+"""Runs the commands against the in-memory guilds of fake_guild.py, so no test talks to discord.
+The registry and journal live in memory and the built-in campaign template is used."""
+import os
+import sys
+from types import SimpleNamespace
+
+os.environ.setdefault("RPG_REGISTRY_PATH", ":memory:")
+os.environ.setdefault("RPG_TEMPLATE_DIR", os.path.join(os.path.dirname(__file__), "no_templates"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+import pytest
+
+from benchmark import build_guild
+from fake_guild import FakeApi, FakeContext
+
+
+def http_error(status: int = 500, text: str = "Internal Server Error") -> discord.HTTPException:
+    return discord.HTTPException(SimpleNamespace(status=status, reason=text), text)
+
+
+@pytest.fixture
+def api() -> FakeApi:
+    return FakeApi()
+
+
+@pytest.fixture
+def context(api: FakeApi) -> FakeContext:
+    """A guild with 10 members and 2 campaigns, whose command channel keeps the bot's replies."""
+    context = build_guild(10, 2, api)
+    context.channel.keep_messages = True
+    context.channel._init_messages()
+    api.reset()
+    return context
+
+
+def replies(context: FakeContext) -> list:
+    return [message.content for message in context.channel.messages]
+
+
+def make_campaign_dm(context: FakeContext, campaign_name: str) -> None:
+    context.author.roles.append(next(role for role in context.guild.roles
+                                     if role.name == f"{campaign_name} Dungeon Master"))
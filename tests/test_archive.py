@@ -0,0 +1,90 @@
+import asyncio
+import gzip
+import json
+import os
+
+import discord
+import pytest
+
+import archive
+from campaign_registry import resolve_campaign
+from conftest import http_error
+from fake_guild import FakeMessage
+
+
+def post(channel, author, count):
+    channel.messages += [FakeMessage(channel, author, f"{channel.name} {index}") for index in range(count)]
+
+
+async def aenumerate(iterable):
+    index = 0
+    async for item in iterable:
+        yield index, item
+        index += 1
+
+
+def archived_contents(path):
+    with gzip.open(path, "rt") as archive_file:
+        return [json.loads(line)["content"] for line in archive_file]
+
+
+def setup_campaign(context, monkeypatch, tmp_path, messages=7):
+    monkeypatch.setattr(archive, "ARCHIVE_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(archive, "ARCHIVE_BATCH", 3)
+    campaign = resolve_campaign(context.guild, "Campaign 0")
+    channel = campaign.category.text_channels[0]
+    post(channel, context.author, messages)
+    return campaign, channel
+
+
+def test_second_run_exports_only_the_new_messages(context, monkeypatch, tmp_path):
+    campaign, channel = setup_campaign(context, monkeypatch, tmp_path)
+    first = asyncio.run(archive.archive_campaign(context.guild, campaign))
+    assert first.messages == 7 and not any(exported.resumed for exported in first.channels)
+
+    post(channel, context.author, 2)
+    second = asyncio.run(archive.archive_campaign(context.guild, campaign))
+    exported = next(exported for exported in second.channels if exported.channel_name == channel.name)
+    assert second.messages == 2 and exported.resumed
+    path = os.path.join(first.directory, f"{channel.id}.jsonl.gz")
+    assert archived_contents(path) == [message.content for message in channel.messages]
+    assert "continued from their previous export" in archive.describe_archive("Campaign 0", second)
+
+
+def test_data_written_after_the_last_checkpoint_is_cut_off(context, monkeypatch, tmp_path):
+    campaign, channel = setup_campaign(context, monkeypatch, tmp_path)
+    result = asyncio.run(archive.archive_campaign(context.guild, campaign))
+    path = os.path.join(result.directory, f"{channel.id}.jsonl.gz")
+    # A batch that was half written when the bot stopped, without a checkpoint.
+    with open(path, "ab") as archive_file:
+        archive_file.write(gzip.compress(b'{"content": "half a batch"}\n')[:10])
+
+    post(channel, context.author, 1)
+    asyncio.run(archive.archive_campaign(context.guild, campaign))
+    assert archived_contents(path) == [message.content for message in channel.messages]
+
+
+def test_failed_export_resumes_after_the_last_complete_batch(context, monkeypatch, tmp_path):
+    campaign, channel = setup_campaign(context, monkeypatch, tmp_path)
+    history = type(channel).history
+
+    async def failing_history(self, **kwargs):
+        async for index, message in aenumerate(history(self, **kwargs)):
+            if index == 4:
+                raise http_error(503, "Service Unavailable")
+            yield message
+
+    channel.history = failing_history.__get__(channel)
+    with pytest.raises(discord.HTTPException):
+        asyncio.run(archive.archive_campaign(context.guild, campaign))
+    directory = archive.campaign_archive_directory(campaign)
+    with open(os.path.join(directory, f"{channel.id}.json")) as checkpoint_file:
+        checkpoint = json.load(checkpoint_file)
+    assert checkpoint["messages"] == 3 and checkpoint["last_message_id"] == channel.messages[2].id
+
+    del channel.history
+    result = asyncio.run(archive.archive_campaign(context.guild, campaign))
+    exported = next(exported for exported in result.channels if exported.channel_name == channel.name)
+    assert exported.resumed and exported.messages == 4
+    path = os.path.join(directory, f"{channel.id}.jsonl.gz")
+    assert archived_contents(path) == [message.content for message in channel.messages]
@@ -0,0 +1,91 @@
+import asyncio
+
+import role_management
+from conftest import http_error, replies
+from scheduler import GUILD_REQUEST_CONCURRENCY, scheduler
+
+
+def broadcast(context, role_name="Bench Broadcast"):
+    role = next(role for role in context.guild.roles if role.name == role_name)
+    return role_management.send_role_dm(context.guild, context.author, role, "Session tonight", context.channel)
+
+
+def test_second_broadcast_is_turned_away(context, api):
+    async def run():
+        await asyncio.gather(broadcast(context), broadcast(context))
+
+    asyncio.run(run())
+    assert replies(context)[0].startswith("A message is already being sent in this server")
+    assert replies(context)[1].startswith("Message to Bench Broadcast: 10 delivered, 0 failed")
+    assert api.routes["user.create_dm"] == 10 and api.routes["channel.send"] == 12
+
+
+def test_cancelled_broadcast_reports_the_members_it_skipped(context, api):
+    api.latency = 0.01
+
+    async def run():
+        task = asyncio.create_task(broadcast(context))
+        await asyncio.sleep(0.015)
+        assert role_management.cancel_role_dm(context.guild)
+        await task
+
+    asyncio.run(run())
+    assert not role_management.cancel_role_dm(context.guild)
+    summary = replies(context)[-1]
+    assert "Cancelled before reaching" in summary
+    assert api.routes["channel.send"] < 11
+
+
+def test_rate_limited_dms_are_retried(context, monkeypatch):
+    monkeypatch.setattr(role_management, "BROADCAST_BACKOFF", 0.001)
+    failures = {member.id: 1 for member in context.guild.members[:3]}
+    failures[context.guild.members[3].id] = role_management.BROADCAST_ATTEMPTS
+    original_get_dm_channel = role_management.get_dm_channel
+
+    async def get_dm_channel(user):
+        if failures.get(user.id):
+            failures[user.id] -= 1
+            raise http_error(429, "Too Many Requests")
+        return await original_get_dm_channel(user)
+
+    monkeypatch.setattr(role_management, "get_dm_channel", get_dm_channel)
+    asyncio.run(broadcast(context))
+    assert replies(context)[-1].startswith("Message to Bench Broadcast: 9 delivered, 1 failed")
+    assert not any(failures.values())
+
+
+def test_backoff_does_not_hold_the_guild_request_slots(context, monkeypatch):
+    monkeypatch.setattr(role_management, "BROADCAST_BACKOFF", 0.05)
+    rate_limited = {member.id for member in context.guild.members[:5]}
+    original_get_dm_channel = role_management.get_dm_channel
+
+    async def get_dm_channel(user):
+        if user.id in rate_limited:
+            rate_limited.discard(user.id)
+            raise http_error(429, "Too Many Requests")
+        return await original_get_dm_channel(user)
+
+    async def run():
+        task = asyncio.create_task(broadcast(context))
+        await asyncio.sleep(0.02)
+        # Only the five rate limited members are left, and they are all sleeping out their backoff.
+        free_slots = scheduler.for_guild(context.guild).requests._value
+        await task
+        return free_slots
+
+    monkeypatch.setattr(role_management, "get_dm_channel", get_dm_channel)
+    assert asyncio.run(run()) == GUILD_REQUEST_CONCURRENCY
+    assert replies(context)[-1].startswith("Message to Bench Broadcast: 10 delivered, 0 failed")
+
+
+def test_closed_dms_are_not_retried(context, monkeypatch):
+    attempts = []
+
+    async def get_dm_channel(user):
+        attempts.append(user.id)
+        raise http_error(403, "Cannot send messages to this user")
+
+    monkeypatch.setattr(role_management, "get_dm_channel", get_dm_channel)
+    asyncio.run(broadcast(context))
+    assert len(attempts) == 10
+    assert replies(context)[-1].startswith("Message to Bench Broadcast: 0 delivered, 10 failed")
@@ -0,0 +1,44 @@
+import asyncio
+
+import main
+from campaign_registry import registry
+from conftest import make_campaign_dm, replies
+
+
+def role(context, name):
+    return next(role for role in context.guild.roles if role.name == name)
+
+
+def test_campaign_create_calls(context, api):
+    asyncio.run(main.campaign_create.callback(context, "Moria"))
+    assert dict(api.routes) == {"channel.send": 2, "guild.create_role": 2, "guild.create_channel": 8,
+                                "member.add_role": 1}
+    assert replies(context)[-1] == "The campaign Moria was successfully created! (11 API calls)"
+    record = registry.get(context.guild.id, "Moria")
+    assert record.dm_role_id in [role.id for role in context.author.roles]
+
+
+def test_campaign_create_refuses_a_taken_name(context, api):
+    asyncio.run(main.campaign_create.callback(context, "Campaign 0"))
+    assert "guild.create_role" not in api.routes
+
+
+def test_player_add_calls_and_repeats(context, api):
+    make_campaign_dm(context, "Campaign 0")
+    players = [member.name for member in context.guild.members[:3]]
+    asyncio.run(main.player_add.callback(context, "Campaign 0", *players))
+    assert dict(api.routes) == {"channel.send": 1, "guild.create_channel": 3, "member.add_role": 3,
+                                "message.edit": 1}
+    player_role = role(context, "Campaign 0 Player")
+    assert all(player_role in member.roles for member in context.guild.members[:3])
+
+    # Adding the same players again changes nothing.
+    api.reset()
+    asyncio.run(main.player_add.callback(context, "Campaign 0", *players))
+    assert dict(api.routes) == {"channel.send": 1, "message.edit": 1}
+
+
+def test_player_add_needs_the_campaign_dm_role(context, api):
+    asyncio.run(main.player_add.callback(context, "Campaign 0", context.guild.members[0].name))
+    assert replies(context) == ["You do not have the Campaign 0 Dungeon Master role required for this command."]
+    assert dict(api.routes) == {"channel.send": 1}
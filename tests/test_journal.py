@@ -0,0 +1,113 @@
+import asyncio
+import re
+
+import main
+from campaign_registry import registry
+from conftest import http_error, replies
+from fake_guild import FakeContext
+from journal import DONE, FAILED, ROLLED_BACK, journal
+
+
+def fail_voice_channels(context):
+    """Makes discord refuse every voice channel, so a campaign creation stops part of the way through."""
+    async def refuse(*args, **kwargs):
+        await context.guild.api.request("guild.create_channel")
+        raise http_error()
+
+    context.guild.create_voice_channel = refuse
+
+
+def failed_operation(context):
+    operation_id = int(re.search(r"R!campaign_resume (\d+)", replies(context)[-1]).group(1))
+    return journal.get(context.guild.id, operation_id)
+
+
+def campaign_objects(context, campaign_name):
+    guild = context.guild
+    return ([role.name for role in guild.roles if role.name.startswith(campaign_name)],
+            [category for category in guild.categories if category.name == campaign_name])
+
+
+def test_failed_creation_is_journaled_and_resumed_without_repeating_calls(context, api):
+    fail_voice_channels(context)
+    asyncio.run(main.campaign_create.callback(context, "Moria"))
+    operation = failed_operation(context)
+    assert operation.state == FAILED
+    assert registry.get(context.guild.id, "Moria") is None
+    assert operation.is_done("category") and operation.is_done("player_role") and operation.is_done("dm_role")
+    created_channels = len(campaign_objects(context, "Moria")[1][0].channels)
+    assert created_channels < 7
+
+    del context.guild.create_voice_channel
+    api.reset()
+    asyncio.run(main.campaign_resume.callback(context, operation.id))
+    assert journal.get(context.guild.id, operation.id).state == DONE
+    assert registry.get(context.guild.id, "Moria") is not None
+    # Only the steps that had not been carried out are repeated.
+    assert "guild.create_role" not in api.routes
+    assert api.routes["guild.create_channel"] == 7 - created_channels
+
+    roles, categories = campaign_objects(context, "Moria")
+    assert sorted(roles) == ["Moria Dungeon Master", "Moria Player"]
+    assert len(categories) == 1 and len(categories[0].channels) == 7
+
+
+def test_failed_creation_is_rolled_back(context):
+    channels = len(context.guild.channels)
+    fail_voice_channels(context)
+    asyncio.run(main.campaign_create.callback(context, "Moria"))
+    operation = failed_operation(context)
+
+    asyncio.run(main.campaign_rollback.callback(context, operation.id))
+    assert journal.get(context.guild.id, operation.id).state == ROLLED_BACK
+    assert campaign_objects(context, "Moria") == ([], [])
+    assert len(context.guild.channels) == channels
+    assert replies(context)[-1] == "The partially created campaign Moria was removed."
+
+    asyncio.run(main.campaign_rollback.callback(context, operation.id))
+    assert replies(context)[-1] == f"Operation #{operation.id} is already {ROLLED_BACK}."
+
+
+def test_mark_interrupted_returns_only_the_operations_it_marks(context):
+    running = journal.begin(context.guild.id, "create", "Rivendell", context.author.id, context.channel.id)
+    failed = journal.begin(context.guild.id, "create", "Isengard", context.author.id, context.channel.id)
+    journal.set_state(failed, FAILED)
+
+    interrupted = journal.mark_interrupted()
+    assert [operation.id for operation in interrupted] == [running.id]
+    assert interrupted[0].state == FAILED
+    assert journal.mark_interrupted() == []
+
+
+def test_only_the_author_or_the_campaign_dm_may_resume_or_roll_back(context):
+    fail_voice_channels(context)
+    asyncio.run(main.campaign_create.callback(context, "Moria"))
+    operation = failed_operation(context)
+
+    other_dm = context.guild.add_member("other dm")
+    other_dm.roles.append(next(role for role in context.guild.roles if role.name == "Dungeon Master"))
+    other = FakeContext(context.guild, other_dm, context.channel)
+    asyncio.run(main.campaign_rollback.callback(other, operation.id))
+    assert replies(context)[-1] == f"Only the author of operation #{operation.id} or a Dungeon Master of Moria " \
+                                   f"can roll it back."
+    assert journal.get(context.guild.id, operation.id).state == FAILED
+
+    other_dm.roles.append(context.guild.get_role(operation.steps["dm_role"]))
+    asyncio.run(main.campaign_rollback.callback(other, operation.id))
+    assert journal.get(context.guild.id, operation.id).state == ROLLED_BACK
+
+
+def test_a_campaign_dm_may_finish_someone_elses_deletion(context):
+    campaign_dm = context.guild.add_member("campaign dm")
+    campaign_dm.roles += [next(role for role in context.guild.roles if role.name == name)
+                          for name in ("Dungeon Master", "Campaign 0 Dungeon Master")]
+    record = registry.get(context.guild.id, "Campaign 0")
+    operation = journal.begin(context.guild.id, "delete", "Campaign 0", context.author.id, context.channel.id)
+    for step, object_id in (("category", record.category_id), ("player_role", record.player_role_id),
+                            ("dm_role", record.dm_role_id)):
+        journal.plan(operation, step, object_id)
+    journal.set_state(operation, FAILED)
+
+    asyncio.run(main.campaign_resume.callback(FakeContext(context.guild, campaign_dm, context.channel), operation.id))
+    assert journal.get(context.guild.id, operation.id).state == DONE
+    assert registry.get(context.guild.id, "Campaign 0") is None
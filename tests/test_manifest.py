@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+import main
+from fake_guild import FakeAttachment, FakeContext
+from manifest import parse_colour, parse_manifest
+from templates import TemplateError
+
+
+def manifest(context, content):
+    return FakeContext(context.guild, context.author, context.channel, [FakeAttachment("season.toml", content)])
+
+
+@pytest.mark.parametrize("value", [255, 0o255, True, "1ffffff", "-5", "zz"])
+def test_parse_colour_rejects_anything_but_a_hex_string(value):
+    with pytest.raises(TemplateError):
+        parse_colour(value, "player_colour")
+
+
+def test_parse_colour_reads_hex_strings():
+    assert parse_colour("ff0000", "player_colour").value == 0xFF0000
+    assert parse_colour("#00ff00", "player_colour").value == 0x00FF00
+    assert parse_colour(None, "player_colour") is None
+
+
+def test_unquoted_yaml_colour_is_rejected():
+    with pytest.raises(TemplateError, match="in quotes"):
+        parse_manifest("season.yaml", b"campaigns:\n  - name: Moria\n    player_colour: 000255\n")
+
+
+def test_different_manifests_with_the_same_name_both_run(context):
+    async def run():
+        await asyncio.gather(
+            main.campaign_manifest.callback(manifest(context, b'[[campaigns]]\nname = "Moria"\n')),
+            main.campaign_manifest.callback(manifest(context, b'[[campaigns]]\nname = "Erebor"\n')))
+
+    asyncio.run(run())
+    assert {"Moria", "Erebor"} <= {category.name for category in context.guild.categories}
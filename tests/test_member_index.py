@@ -0,0 +1,72 @@
+import asyncio
+import copy
+
+import main
+from member_index import MemberIndex, member_index
+
+
+def leave(guild, member):
+    guild.members.remove(member)
+    del guild._members[member.id]
+
+
+def rename(member, name):
+    before = copy.copy(member)
+    member.name = name
+    return before
+
+
+def resolve(guild, *player_names, index=member_index):
+    return asyncio.run(index.resolve_many(guild, player_names))
+
+
+def complete(guild, prefix, index=member_index):
+    return asyncio.run(index.complete(guild, prefix))
+
+
+def test_joined_members_are_resolved_and_completed(context):
+    guild = context.guild
+    assert resolve(guild, "player3", "PLAYER4", "nobody") == {"player3": guild.members[3],
+                                                              "PLAYER4": guild.members[4], "nobody": None}
+    member = guild.add_member("Gimli")
+    asyncio.run(main.on_member_join(member))
+    assert resolve(guild, "gimli") == {"gimli": member}
+    assert complete(guild, "gi") == ["Gimli"]
+
+
+def test_removed_members_are_no_longer_resolved(context):
+    guild = context.guild
+    member = guild.members[5]
+    assert resolve(guild, "player5") == {"player5": member}
+    leave(guild, member)
+    asyncio.run(main.on_member_remove(member))
+    assert resolve(guild, "player5") == {"player5": None}
+    assert "player5" not in complete(guild, "player")
+
+
+def test_renamed_members_are_resolved_by_their_new_name_only(context):
+    guild = context.guild
+    member = guild.members[6]
+    assert resolve(guild, "player6") == {"player6": member}
+    before = rename(member, "Legolas")
+    asyncio.run(main.on_member_update(before, member))
+    assert resolve(guild, "player6", "legolas") == {"player6": None, "legolas": member}
+    assert complete(guild, "player6") == [] and complete(guild, "le") == ["Legolas"]
+
+
+def test_low_memory_renames_are_queried_again(context, api):
+    guild = context.guild
+    index = MemberIndex(low_memory=True)
+    member = guild.members[7]
+    assert resolve(guild, "player7", index=index) == {"player7": member}
+    api.reset()
+    assert resolve(guild, "player7", index=index) == {"player7": member}
+    assert api.routes["gateway.query_members"] == 1
+
+    before = rename(member, "Aragorn")
+    index.rename(guild, before, member)
+    assert resolve(guild, "player7", "aragorn", index=index) == {"player7": None, "aragorn": member}
+
+    leave(guild, member)
+    index.remove(member)
+    assert resolve(guild, "aragorn", index=index) == {"aragorn": None}
@@ -0,0 +1,41 @@
+import asyncio
+
+import main
+from conftest import make_campaign_dm, replies
+from fake_guild import FakeAttachment, FakeContext
+
+
+def role(context, name):
+    return next(role for role in context.guild.roles if role.name == name)
+
+
+def palette(context, content):
+    return FakeContext(context.guild, context.author, context.channel, [FakeAttachment("palette.toml", content)])
+
+
+def test_palette_only_changes_campaign_roles(context, api):
+    asyncio.run(main.role_palette.callback(palette(context, b'[colours]\n"Dungeon Master" = "ff0000"\n')))
+    assert replies(context)[-1] == "Error: The palette is invalid. No campaign role is named Dungeon Master."
+
+    make_campaign_dm(context, "Campaign 0")
+    make_campaign_dm(context, "Campaign 1")
+    player = context.guild.members[1]
+    api.reset()
+    content = b'[colours]\n"Campaign 0 Player" = "ff0000"\n[members]\nplayer1 = ["Campaign 1 Player"]\n'
+    asyncio.run(main.role_palette.callback(palette(context, content)))
+    assert replies(context)[-1].startswith("Recoloured 1 roles and changed the roles of 1 members")
+    assert dict(api.routes) == {"channel.send": 2, "role.edit": 1, "member.edit": 1}
+    assert role(context, "Campaign 1 Player") in player.roles
+
+
+def test_different_palettes_with_the_same_name_both_apply(context):
+    make_campaign_dm(context, "Campaign 0")
+
+    async def run():
+        await asyncio.gather(
+            main.role_palette.callback(palette(context, b'[colours]\n"Campaign 0 Player" = "ff0000"\n')),
+            main.role_palette.callback(palette(context, b'[colours]\n"Campaign 0 Dungeon Master" = "00ff00"\n')))
+
+    asyncio.run(run())
+    assert role(context, "Campaign 0 Player").colour.value == 0xFF0000
+    assert role(context, "Campaign 0 Dungeon Master").colour.value == 0x00FF00
@@ -0,0 +1,30 @@
+from campaign_registry import registry
+from prefix_index import PrefixIndex
+
+
+def test_search_is_case_insensitive_and_sorted():
+    index = PrefixIndex(["Gandalf", "galadriel", "Gimli", "Frodo"])
+    assert index.search("g") == ["galadriel", "Gandalf", "Gimli"]
+    assert index.search("GA") == ["galadriel", "Gandalf"]
+    assert index.search("x") == []
+
+
+def test_search_stops_at_limit():
+    index = PrefixIndex(f"player{number}" for number in range(100))
+    assert index.search("player", 3) == ["player0", "player1", "player10"]
+
+
+def test_add_and_remove():
+    index = PrefixIndex(["Gimli"])
+    index.add("Gloin")
+    index.add("Gloin")
+    assert len(index) == 2
+    index.remove("Gimli")
+    index.remove("Gimli")
+    assert index.search("g") == ["Gloin"]
+
+
+def test_registry_completes_campaign_names_of_one_guild(context):
+    assert registry.complete(context.guild.id, "camp") == ["Campaign 0", "Campaign 1"]
+    assert registry.complete(context.guild.id, "campaign 1") == ["Campaign 1"]
+    assert registry.complete(context.guild.id + 1, "camp") == []
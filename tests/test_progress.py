@@ -0,0 +1,44 @@
+import asyncio
+
+import player_management
+from conftest import http_error
+from player_management import ProgressMessage
+
+
+def test_final_edit_lands_after_an_edit_in_flight(context, api, monkeypatch):
+    monkeypatch.setattr(player_management, "PROGRESS_INTERVAL", 0.0)
+    api.latency = 0.02
+
+    async def run():
+        progress = ProgressMessage(context.guild, context.channel, "Adding players", ("player0", "player1"))
+        await progress.start()
+        progress.update("player0", "✅ Added")
+        # Lets the scheduled edit start, so finish() runs while it is still being sent.
+        await asyncio.sleep(0.005)
+        await progress.finish("Done")
+        await asyncio.sleep(0.05)
+        return progress.message
+
+    message = asyncio.run(run())
+    assert api.routes["message.edit"] == 2
+    assert message.embeds[0].footer.text == "Done"
+    assert "**player0**: ✅ Added" in message.embeds[0].description
+
+
+def test_failed_edits_do_not_raise(context, monkeypatch):
+    monkeypatch.setattr(player_management, "PROGRESS_INTERVAL", 0.0)
+
+    async def run():
+        progress = ProgressMessage(context.guild, context.channel, "Adding players", ("player0",))
+        await progress.start()
+
+        async def deleted(**kwargs):
+            raise http_error(404, "Unknown Message")
+
+        progress.message.edit = deleted
+        progress.update("player0", "✅ Added")
+        await asyncio.sleep(0.01)
+        assert progress.pending_edit is None
+        await progress.finish("Done")
+
+    asyncio.run(run())
@@ -0,0 +1,59 @@
+import asyncio
+
+import main
+from conftest import http_error, make_campaign_dm, replies
+
+
+def campaign(context, campaign_name):
+    guild = context.guild
+    category = next(category for category in guild.categories if category.name == campaign_name)
+    player_role = next(role for role in guild.roles if role.name == f"{campaign_name} Player")
+    return category, player_role
+
+
+def test_matching_campaigns_need_no_calls(context, api):
+    asyncio.run(main.campaign_sync.callback(context))
+    assert replies(context)[-1] == "Applied 0 of 0 repairs (0 API calls):\nEverything already matches the template."
+    assert api.calls == 1
+
+
+def test_deleted_channel_is_recreated_with_one_call(context, api):
+    category, _ = campaign(context, "Campaign 0")
+    make_campaign_dm(context, "Campaign 0")
+    deleted = category.channels[2]
+    context.guild.remove_channel(deleted)
+
+    asyncio.run(main.campaign_sync.callback(context, "Campaign 0"))
+    assert api.routes["guild.create_channel"] == 1
+    assert deleted.name in [channel.name for channel in category.channels]
+    assert f"Create the missing channel {deleted.name}" in replies(context)[-1]
+
+    api.reset()
+    asyncio.run(main.campaign_sync.callback(context, "Campaign 0", "dry"))
+    assert replies(context)[-1] == "Would apply 0 repairs:\nEverything already matches the template."
+    assert api.routes == {"channel.send": 1}
+
+
+def test_failed_repair_does_not_stop_the_others(context, api):
+    category, player_role = campaign(context, "Campaign 1")
+    player_role.name = "Renamed by hand"
+    context.guild.remove_channel(category.channels[0])
+
+    async def refuse(**kwargs):
+        raise http_error(403, "Missing Permissions")
+
+    player_role.edit = refuse
+    asyncio.run(main.campaign_sync.callback(context))
+    report = replies(context)[-1].splitlines()
+    assert report[0] == "Applied 1 of 2 repairs (2 API calls), 1 failed:"
+    assert report[1] == "Failed: Update the name of the role Renamed by hand (403 Missing Permissions)"
+    assert api.routes["guild.create_channel"] == 1
+
+
+def test_unknown_mode_changes_nothing(context, api):
+    category, _ = campaign(context, "Campaign 0")
+    context.guild.remove_channel(category.channels[0])
+    for mode in ("dry-run", "--dry", "DRY"):
+        asyncio.run(main.campaign_sync.callback(context, "all", mode))
+        assert replies(context)[-1].startswith(f"Unknown mode {mode}.")
+    assert dict(api.routes) == {"channel.send": 3}
@@ -0,0 +1,49 @@
+import asyncio
+
+import main
+from campaign_registry import registry, resolve_campaign
+from conftest import replies
+
+
+def test_campaign_recreated_after_a_manual_delete_is_synced_once(context, api):
+    guild = context.guild
+    old_category = next(category for category in guild.categories if category.name == "Campaign 0")
+    for channel in list(old_category.channels) + [old_category]:
+        guild.remove_channel(channel)
+    for role in [role for role in guild.roles if role.name.startswith("Campaign 0 ")]:
+        guild.remove_role(role)
+
+    asyncio.run(main.campaign_create.callback(context, "Campaign 0"))
+    assert [record.name for record in registry.campaigns(guild.id)].count("Campaign 0") == 1
+
+    category = next(category for category in guild.categories if category.name == "Campaign 0")
+    deleted = category.channels[0]
+    guild.remove_channel(deleted)
+    api.reset()
+    asyncio.run(main.campaign_sync.callback(context))
+    assert api.routes["guild.create_channel"] == 1
+    assert replies(context)[-1].count(f"Create the missing channel {deleted.name}") == 1
+    assert [channel.name for channel in category.channels].count(deleted.name) == 1
+
+
+def test_record_of_a_deleted_category_is_dropped(context):
+    guild = context.guild
+    record = registry.get(guild.id, "Campaign 1")
+    guild.remove_channel(guild.get_channel(record.category_id))
+
+    assert resolve_campaign(guild, "Campaign 1") is None
+    assert registry.get(guild.id, "Campaign 1") is None
+    assert record.category_id not in registry.by_category
+
+
+def test_add_campaign_replaces_a_campaign_of_the_same_name(context):
+    guild = context.guild
+    record = registry.get(guild.id, "Campaign 1")
+    replacement = record._replace(name="campaign 1", category_id=record.category_id + 1)
+    registry.add_campaign(replacement)
+
+    assert registry.get(guild.id, "Campaign 1") == replacement
+    assert [record.category_id for record in registry.campaigns(guild.id) if record.name.casefold() == "campaign 1"] \
+        == [replacement.category_id]
+    assert registry.connection.execute("SELECT COUNT(*) FROM campaigns WHERE category_id = ?",
+                                       (record.category_id,)).fetchone() == (0,)
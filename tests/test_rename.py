@@ -0,0 +1,58 @@
+import asyncio
+
+import main
+from campaign_registry import registry
+from conftest import http_error, make_campaign_dm, replies
+
+
+def campaign_names(context, campaign_name):
+    record = registry.get(context.guild.id, campaign_name)
+    guild = context.guild
+    return (guild.get_channel(record.category_id).name, guild.get_role(record.player_role_id).name,
+            guild.get_role(record.dm_role_id).name)
+
+
+def refuse_after(to_edit, successes):
+    """Lets the first edits of the object through, then makes discord refuse the rest."""
+    edit = to_edit.edit
+
+    async def refuse(**kwargs):
+        nonlocal successes
+        if successes:
+            successes -= 1
+            return await edit(**kwargs)
+        raise http_error(403, "Missing Permissions")
+
+    to_edit.edit = refuse
+
+
+def test_campaign_is_renamed(context, api):
+    make_campaign_dm(context, "Campaign 0")
+    asyncio.run(main.campaign_rename.callback(context, "Campaign 0", "Moria"))
+    assert replies(context)[-1].startswith("Campaign 0 was successfully renamed to Moria")
+    assert registry.get(context.guild.id, "Campaign 0") is None
+    assert campaign_names(context, "Moria") == ("Moria", "Moria Player", "Moria Dungeon Master")
+
+
+def test_failed_rename_is_undone(context, api):
+    make_campaign_dm(context, "Campaign 0")
+    record = registry.get(context.guild.id, "Campaign 0")
+    refuse_after(context.guild.get_role(record.dm_role_id), 0)
+    asyncio.run(main.campaign_rename.callback(context, "Campaign 0", "Moria"))
+    assert replies(context)[-1] == "Error: Renaming Campaign 0 failed (403 Missing Permissions), nothing was renamed."
+    assert registry.get(context.guild.id, "Moria") is None
+    assert campaign_names(context, "Campaign 0") == ("Campaign 0", "Campaign 0 Player", "Campaign 0 Dungeon Master")
+    # The category and the player role were renamed and changed back.
+    assert api.routes["channel.edit"] == 2 and api.routes["role.edit"] == 2
+
+
+def test_rename_that_cannot_be_undone_asks_to_run_it_again(context):
+    make_campaign_dm(context, "Campaign 0")
+    record = registry.get(context.guild.id, "Campaign 0")
+    refuse_after(context.guild.get_channel(record.category_id), 1)
+    refuse_after(context.guild.get_role(record.dm_role_id), 0)
+    asyncio.run(main.campaign_rename.callback(context, "Campaign 0", "Moria"))
+    assert replies(context)[-1].startswith("Error: Renaming Campaign 0 failed (403 Missing Permissions), and some "
+                                           "of its names could not be changed back.")
+    assert registry.get(context.guild.id, "Campaign 0") is not None
+    assert campaign_names(context, "Campaign 0") == ("Moria", "Campaign 0 Player", "Campaign 0 Dungeon Master")
@@ -0,0 +1,107 @@
+import asyncio
+
+import main
+from conftest import replies
+from fake_guild import FakeContext, FakeGuild
+from scheduler import GUILD_REQUEST_CONCURRENCY, MAX_QUEUED_JOBS, MAX_RUNNING_JOBS, GuildScheduler, scheduler
+
+
+def test_jobs_on_one_campaign_run_in_submission_order():
+    async def run():
+        guild_scheduler = GuildScheduler()
+        order = []
+
+        def operation(name):
+            async def run_operation():
+                order.append(f"{name} started")
+                await asyncio.sleep(0.01)
+                order.append(f"{name} finished")
+            return run_operation
+
+        jobs = [guild_scheduler.submit(("Campaign",), name, name, operation(name)) for name in ("a", "b", "c")]
+        await asyncio.gather(*(job.wait() for job in jobs))
+        return order
+
+    assert asyncio.run(run()) == ["a started", "a finished", "b started", "b finished", "c started", "c finished"]
+
+
+def test_jobs_on_different_campaigns_run_concurrently_up_to_the_limit():
+    async def run():
+        guild_scheduler = GuildScheduler()
+        running = peak = 0
+
+        async def operation():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        jobs = [guild_scheduler.submit((f"Campaign {index}",), str(index), index, operation) for index in range(6)]
+        await asyncio.gather(*(job.wait() for job in jobs))
+        return peak
+
+    assert asyncio.run(run()) == MAX_RUNNING_JOBS
+
+
+def test_identical_jobs_are_merged_and_the_queue_is_bounded():
+    async def run():
+        guild_scheduler = GuildScheduler()
+        runs = 0
+        release = asyncio.Event()
+
+        async def operation():
+            nonlocal runs
+            runs += 1
+            await release.wait()
+
+        first = guild_scheduler.submit(("Campaign",), "same", "same", operation)
+        merged = guild_scheduler.submit(("Campaign",), "same", "same", operation)
+        others = [guild_scheduler.submit(("Campaign",), str(index), index, operation)
+                  for index in range(MAX_QUEUED_JOBS)]
+        release.set()
+        await asyncio.gather(*(job.wait() for job in [first] + others if job is not None))
+        return first, merged, others, runs, guild_scheduler
+
+    first, merged, others, runs, guild_scheduler = asyncio.run(run())
+    assert merged is first and first.merged == 1
+    assert others[-1] is None
+    assert runs == MAX_QUEUED_JOBS
+    assert not guild_scheduler.jobs and not guild_scheduler.locks
+
+
+def test_request_limits_share_the_guild_budget():
+    async def run():
+        server = FakeGuild()
+        running = peak = 0
+
+        async def call(limit):
+            nonlocal running, peak
+            async with limit:
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        limits = [scheduler.request_limit(server, 5) for _ in range(3)]
+        await asyncio.gather(*(call(limit) for limit in limits for _ in range(10)))
+        return peak
+
+    assert asyncio.run(run()) == GUILD_REQUEST_CONCURRENCY
+
+
+def test_only_the_same_command_of_the_same_author_is_merged(context):
+    other_dm = context.guild.add_member("other dm")
+    other_dm.roles.append(next(role for role in context.guild.roles if role.name == "Dungeon Master"))
+    other = FakeContext(context.guild, other_dm, context.channel)
+
+    async def run():
+        await asyncio.gather(main.campaign_create.callback(context, "Moria"),
+                             main.campaign_create.callback(context, "Moria"),
+                             main.campaign_create.callback(other, "Moria"))
+
+    asyncio.run(run())
+    assert replies(context).count("The same command is already waiting or running, it will only be done once.") == 1
+    # The second DM's command is not dropped: it runs after the first and learns the name is taken.
+    assert replies(context)[-1] == "Error: A category named Moria already exists."
+    assert len([category for category in context.guild.categories if category.name == "Moria"]) == 1
@@ -0,0 +1,80 @@
+import asyncio
+import os
+
+import pytest
+
+import main
+import templates
+from conftest import replies
+from templates import DEFAULT_TEMPLATE, TemplateCache, TemplateError, load_template, parse_document, parse_template
+
+CHANNEL = {"name": "general"}
+
+
+@pytest.mark.parametrize("data, message", [
+    ([], "A template must be a table/mapping."),
+    ({"roles": [], "channels": [CHANNEL]}, "roles must be a table/mapping."),
+    ({"roles": {"player": ["speak"]}, "channels": [CHANNEL]}, "roles.player must be a table/mapping."),
+    ({"roles": {"player": {"permissions": "speak"}}, "channels": [CHANNEL]},
+     "roles.player.permissions must be a list of permission names."),
+    ({"roles": {"dungeon_master": {"permissions": ["fly"]}}, "channels": [CHANNEL]},
+     "roles.dungeon_master.permissions contains unknown permissions: fly."),
+    ({"channels": []}, "channels must be a non-empty list."),
+    ({"channels": ["general"]}, "channels[0] needs a name."),
+    ({"channels": [{"name": "  "}]}, "channels[0] needs a name."),
+    ({"channels": [{"name": "general", "type": "stage"}]}, "channels[0].type must be \"text\" or \"voice\"."),
+    ({"channels": [{"name": "general", "type": ["voice"]}]}, "channels[0].type must be \"text\" or \"voice\"."),
+    ({"channels": [{"name": "general", "player_read": "yes"}]},
+     "channels[0].player_read and player_write must be true or false."),
+    ({"channels": [{"name": "General Chat"}, {"name": "general-chat"}]}, "Channel names must be unique."),
+])
+def test_invalid_templates_raise_template_errors(data, message):
+    with pytest.raises(TemplateError) as error:
+        parse_template("test.toml", data)
+    assert str(error.value) == message
+
+
+def test_unreadable_documents_raise_template_errors():
+    with pytest.raises(TemplateError, match="could not be parsed"):
+        parse_document("test.toml", b"channels = [")
+    with pytest.raises(TemplateError, match="could not be parsed"):
+        parse_document("test.json", b"\xff")
+    with pytest.raises(TemplateError, match="must be a .toml"):
+        parse_document("test.ini", b"")
+
+
+def test_example_template_matches_the_built_in_one():
+    example = load_template(os.path.join(os.path.dirname(templates.__file__), "campaign_templates", "example.toml"))
+    assert example.player_permissions == DEFAULT_TEMPLATE.player_permissions
+    assert example.dm_permissions == DEFAULT_TEMPLATE.dm_permissions
+    assert [channel.name for channel in example.channels] == [channel.name for channel in DEFAULT_TEMPLATE.channels]
+
+
+def test_templates_are_compiled_once_and_reloaded_when_changed(context, tmp_path, monkeypatch):
+    monkeypatch.setattr(templates, "TEMPLATE_DIRECTORY", str(tmp_path))
+    cache = TemplateCache()
+    assert cache.template_for(context.guild) is DEFAULT_TEMPLATE
+
+    path = tmp_path / "default.toml"
+    path.write_text('[[channels]]\nname = "tavern"\n')
+    first = cache.template_for(context.guild)
+    assert [channel.name for channel in first.channels] == ["tavern"]
+    assert cache.template_for(context.guild) is first
+
+    guild_path = tmp_path / f"{context.guild.id}.toml"
+    guild_path.write_text('[[channels]]\nname = "Dungeon Entrance"\n')
+    assert [channel.name for channel in cache.template_for(context.guild).channels] == ["dungeon-entrance"]
+
+    guild_path.write_text('[[channels]]\nname = "keep"\n')
+    os.utime(guild_path, ns=(1, 1))
+    assert [channel.name for channel in cache.template_for(context.guild).channels] == ["keep"]
+
+
+def test_invalid_template_stops_campaign_create_before_any_change(context, api, tmp_path, monkeypatch):
+    monkeypatch.setattr(templates, "TEMPLATE_DIRECTORY", str(tmp_path))
+    (tmp_path / "default.toml").write_text('[[channels]]\nname = "tavern"\ntype = "stage"\n')
+
+    asyncio.run(main.campaign_create.callback(context, "Moria"))
+    assert replies(context)[-1] == ("Error: The campaign template of this server could not be loaded. "
+                                    "channels[0].type must be \"text\" or \"voice\".")
+    assert set(api.routes) == {"channel.send"}